@@ -0,0 +1,82 @@
+import time
+
+try:
+    import cantools
+except ImportError:  # cantools为可选依赖，未安装时不提供DBC解码
+    cantools = None
+
+
+class DBCDecoder:
+    """基于DBC的信号解码器
+
+    加载时为DBC中的每个报文预先生成解码函数（包括信号单位等格式化信息），
+    按CAN ID放入查找表；只解码订阅的ID，由接收流水线的工作线程整批调用。
+    """
+    def __init__(self, path):
+        if cantools is None:
+            raise RuntimeError("未安装cantools，无法加载DBC（pip install cantools）")
+        self.path = path
+        self.database = cantools.database.load_file(path)
+        self.table = {}  # CAN ID → 解码函数(bytes) -> str
+        for message in self.database.messages:
+            self.table[message.frame_id] = self._compile(message)
+        self.subscribed = None  # None 表示解码DBC中的全部报文
+        self.active = dict(self.table)  # 当前订阅的查找表，整体替换以便工作线程无锁读取
+
+        # 吞吐统计
+        self.decoded = 0
+        self.failed = 0
+        self.decode_time = 0.0
+
+    @staticmethod
+    def _compile(message):
+        """为单个报文生成解码函数，单位字符串等在此一次性准备好"""
+        decode = message.decode
+        name = message.name
+        units = {signal.name: signal.unit or "" for signal in message.signals}
+
+        def decode_frame(data):
+            values = decode(data, decode_choices=True, scaling=True)
+            signals = " ".join(f"{key}={value}{units.get(key, '')}" for key, value in values.items())
+            return f"{name}: {signals}"
+        return decode_frame
+
+    def subscribe(self, can_ids):
+        """设置需要解码的CAN ID集合，None或空表示全部"""
+        self.subscribed = set(can_ids) if can_ids else None
+        if self.subscribed is None:
+            self.active = dict(self.table)
+        else:
+            self.active = {can_id: func for can_id, func in self.table.items() if can_id in self.subscribed}
+
+    def decode_batch(self, messages):
+        """整批解码，返回与messages等长的列表，未订阅或解码失败的位置为None"""
+        active = self.active
+        start = time.perf_counter()
+        results = []
+        decoded = failed = 0
+        for message in messages:
+            func = active.get(message.arbitration_id)
+            if func is None:
+                results.append(None)
+                continue
+            try:
+                results.append(func(message.data))
+                decoded += 1
+            except Exception:
+                results.append(None)
+                failed += 1
+        self.decode_time += time.perf_counter() - start
+        self.decoded += decoded
+        self.failed += failed
+        return results
+
+    def stats(self):
+        rate = self.decoded / self.decode_time if self.decode_time > 0 else 0.0
+        return {
+            'messages': len(self.table),
+            'subscribed': len(self.active),
+            'decoded': self.decoded,
+            'failed': self.failed,
+            'frames_per_s': round(rate)
+        }
@@ -0,0 +1,267 @@
+"""CAN采集数据导出为列式格式（Parquet/Arrow 或 NPZ）
+
+按块流式读取日志并写出 timestamp、id、is_extended_id、is_fd、bitrate_switch、channel、dlc、data 列，
+可按CAN ID分区（扩展帧的分区名以x结尾，与同号的标准帧分开）：
+    out/id=0x123/part-00000.parquet
+    out/id=0x18FF50E5x/part-00000.parquet
+下游只需读取需要的列和ID分区。内存中最多缓存max_buffered帧，与采集文件大小无关；
+缓存满时只写出最大的几个分区，帧少的ID留到最后一次写出，不会产生大量很小的row group/文件。
+同时打开的ParquetWriter不超过max_open_writers个，超过时关闭最久未写的，该分区之后写入新文件。
+
+示例：
+    python can_export.py log/20240101_received.log --out export --format parquet --partition-by-id
+    python can_export.py log/*.log --out export --format npz
+"""
+import os
+import sys
+import time
+import glob
+import argparse
+import collections
+from can_replay import iter_log_frames
+from can_format import iter_chunks
+from can_search import expand_paths
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖
+    np = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 可选依赖
+    pa = None
+    pq = None
+
+COLUMNS = ('timestamp', 'id', 'is_extended_id', 'is_fd', 'bitrate_switch', 'channel', 'dlc', 'data')
+
+
+def partition_name(can_id, extended=False):
+    return f"id=0x{can_id:X}{'x' if extended else ''}"
+
+
+class _Partition:
+    """单个输出分区的列缓冲区"""
+    def __init__(self, path):
+        self.path = path
+        self.clear()
+        self.parts = 0
+        self.writer = None  # ParquetWriter，分区内多次写入合并为一个文件的多个row group
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def append(self, message):
+        self.timestamp.append(message.timestamp)
+        self.id.append(message.arbitration_id)
+        self.is_extended_id.append(message.is_extended_id)
+        self.is_fd.append(message.is_fd)
+        self.bitrate_switch.append(message.bitrate_switch)
+        self.channel.append(str(message.channel) if message.channel is not None else None)
+        self.dlc.append(message.dlc)
+        self.data.append(bytes(message.data))
+
+    def clear(self):
+        self.timestamp = []
+        self.id = []
+        self.is_extended_id = []
+        self.is_fd = []
+        self.bitrate_switch = []
+        self.channel = []
+        self.dlc = []
+        self.data = []
+
+
+class ColumnarExporter:
+    """流式列式导出器
+
+    format='parquet' 需要pyarrow，每个分区一个Parquet文件，每次刷新写入一个row group；
+    format='npz' 需要NumPy，每次刷新写出一个 part-NNNNN.npz，data列为定长uint8矩阵，
+    宽度为max_len；max_len为None时取本次写出的最长数据（至少8），CAN FD帧不会被截断。
+    channel列为文本，未知通道在Parquet中为null、在NPZ中为空字符串。
+    """
+    def __init__(self, out_dir, format='parquet', partition_by_id=False,
+                 chunk_rows=100000, max_buffered=500000, max_len=None, max_open_writers=64):
+        if format == 'parquet' and pa is None:
+            raise RuntimeError("未安装pyarrow，无法导出Parquet（pip install pyarrow）")
+        if format == 'npz' and np is None:
+            raise RuntimeError("未安装NumPy，无法导出NPZ（pip install numpy）")
+        if format not in ('parquet', 'npz'):
+            raise ValueError(f"不支持的导出格式: {format}")
+        self.out_dir = out_dir
+        self.format = format
+        self.partition_by_id = partition_by_id
+        self.chunk_rows = chunk_rows      # 单个分区缓冲到多少行写一次
+        self.max_buffered = max_buffered  # 所有分区缓冲总行数上限
+        self.max_len = max_len            # NPZ中data列的固定宽度，None为自动
+        self.max_open_writers = max_open_writers
+        self.open_writers = collections.OrderedDict()  # 打开了ParquetWriter的分区，按最近写入排序
+        self.partitions = {}
+        self.buffered = 0
+        self.rows = 0
+        self.files = set()
+
+    def _partition(self, can_id, extended):
+        key = (extended, can_id) if self.partition_by_id else None
+        partition = self.partitions.get(key)
+        if partition is None:
+            if self.partition_by_id:
+                path = os.path.join(self.out_dir, partition_name(can_id, extended))
+            else:
+                path = self.out_dir
+            partition = _Partition(path)
+            self.partitions[key] = partition
+        return partition
+
+    def write(self, messages):
+        """写入一批帧（可来自任意迭代器分块）"""
+        for message in messages:
+            partition = self._partition(message.arbitration_id, message.is_extended_id)
+            partition.append(message)
+            self.buffered += 1
+            if len(partition) >= self.chunk_rows:
+                self._flush_partition(partition)
+        if self.buffered >= self.max_buffered:
+            self._flush_largest()
+
+    def _flush_largest(self):
+        """从最大的分区开始写出，直到缓存降到上限的一半"""
+        for partition in sorted(self.partitions.values(), key=len, reverse=True):
+            if self.buffered <= self.max_buffered // 2 or not len(partition):
+                break
+            self._flush_partition(partition)
+
+    def flush(self):
+        for partition in self.partitions.values():
+            if len(partition):
+                self._flush_partition(partition)
+
+    def close(self):
+        self.flush()
+        for partition in list(self.open_writers):
+            self._close_writer(partition)
+
+    def _close_writer(self, partition):
+        self.open_writers.pop(partition, None)
+        if partition.writer:
+            partition.writer.close()
+            partition.writer = None
+
+    def _flush_partition(self, partition):
+        os.makedirs(partition.path, exist_ok=True)
+        count = len(partition)
+        if self.format == 'parquet':
+            table = pa.table({
+                'timestamp': pa.array(partition.timestamp, type=pa.float64()),
+                'id': pa.array(partition.id, type=pa.uint32()),
+                'is_extended_id': pa.array(partition.is_extended_id, type=pa.bool_()),
+                'is_fd': pa.array(partition.is_fd, type=pa.bool_()),
+                'bitrate_switch': pa.array(partition.bitrate_switch, type=pa.bool_()),
+                'channel': pa.array(partition.channel, type=pa.string()),
+                'dlc': pa.array(partition.dlc, type=pa.uint8()),
+                'data': pa.array(partition.data, type=pa.binary()),
+            })
+            if partition.writer is None:
+                while len(self.open_writers) >= self.max_open_writers:
+                    self._close_writer(next(iter(self.open_writers)))
+                path = self._next_path(partition, '.parquet')
+                partition.writer = pq.ParquetWriter(path, table.schema)
+            partition.writer.write_table(table)
+            self.open_writers[partition] = None
+            self.open_writers.move_to_end(partition)
+        else:
+            longest = max(map(len, partition.data))
+            width = self.max_len or max(8, longest)
+            if longest > width:
+                raise ValueError(f"数据长度{longest}字节超过max_len={width}（CAN FD帧请使用64或不指定）")
+            padding = bytes(width)
+            block = b"".join((data + padding)[:width] for data in partition.data)
+            path = self._next_path(partition, '.npz')
+            np.savez(
+                path,
+                timestamp=np.array(partition.timestamp, dtype=np.float64),
+                id=np.array(partition.id, dtype=np.uint32),
+                is_extended_id=np.array(partition.is_extended_id, dtype=bool),
+                is_fd=np.array(partition.is_fd, dtype=bool),
+                bitrate_switch=np.array(partition.bitrate_switch, dtype=bool),
+                channel=np.array([channel or "" for channel in partition.channel], dtype=str),
+                dlc=np.array(partition.dlc, dtype=np.uint8),
+                data=np.frombuffer(block, dtype=np.uint8).reshape(count, width)
+            )
+        self.rows += count
+        self.buffered -= count
+        partition.clear()
+
+    def _next_path(self, partition, suffix):
+        # 跳过已存在的分段，多次导出到同一目录时不会覆盖
+        while True:
+            path = os.path.join(partition.path, f"part-{partition.parts:05d}{suffix}")
+            partition.parts += 1
+            if not os.path.exists(path):
+                self.files.add(path)
+                return path
+
+
+def load_partition(out_dir, can_id=None, columns=COLUMNS, extended=False):
+    """读取导出结果中某个ID分区（can_id为None时读取未分区的导出）的指定列，返回 列名 → 数组"""
+    directory = os.path.join(out_dir, partition_name(can_id, extended)) if can_id is not None else out_dir
+    parquet_files = sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+    if parquet_files:
+        if pq is None:
+            raise RuntimeError("未安装pyarrow，无法读取Parquet")
+        tables = [pq.read_table(path, columns=list(columns)) for path in parquet_files]
+        table = pa.concat_tables(tables)
+        return {name: table.column(name).to_pylist() for name in columns}
+    npz_files = sorted(glob.glob(os.path.join(directory, "part-*.npz")))
+    if np is None:
+        raise RuntimeError("未安装NumPy，无法读取NPZ")
+    result = {name: [] for name in columns}
+    for path in npz_files:
+        with np.load(path) as part:
+            for name in columns:
+                result[name].append(part[name])
+    if len(result.get('data', ())) > 1:
+        # 各分段的data宽度可能不同（自动宽度），补齐到最宽的一段
+        width = max(array.shape[1] for array in result['data'])
+        result['data'] = [np.pad(array, ((0, 0), (0, width - array.shape[1]))) for array in result['data']]
+    return {name: np.concatenate(arrays) if arrays else np.array([]) for name, arrays in result.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CAN采集数据列式导出")
+    parser.add_argument("logs", nargs='+', help="日志文件（文本日志或python-can支持的格式），可使用通配符")
+    parser.add_argument("--out", required=True, help="输出目录")
+    parser.add_argument("--format", choices=['parquet', 'npz'], default='parquet', help="导出格式")
+    parser.add_argument("--partition-by-id", action="store_true", help="按CAN ID分区")
+    parser.add_argument("--chunk", type=int, default=100000, help="每个分区每次写入的行数")
+    parser.add_argument("--max-buffered", type=int, default=500000, help="内存中最多缓存的帧数")
+    parser.add_argument("--max-len", type=int, default=0, help="NPZ中data列的固定宽度，0为按最长数据自动确定")
+    parser.add_argument("--max-open-files", type=int, default=64, help="同时打开的Parquet文件数上限")
+    args = parser.parse_args(argv)
+
+    try:
+        exporter = ColumnarExporter(
+            args.out, args.format, args.partition_by_id,
+            chunk_rows=args.chunk, max_buffered=args.max_buffered, max_len=args.max_len or None,
+            max_open_writers=args.max_open_files
+        )
+    except Exception as e:
+        print(f"导出失败：{str(e)}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    try:
+        for path in expand_paths(args.logs):
+            for chunk in iter_chunks(iter_log_frames(path), 10000):
+                exporter.write(chunk)
+    finally:
+        exporter.close()
+    elapsed = time.perf_counter() - start
+    print(f"导出完成：{exporter.rows} 帧，{len(exporter.partitions)} 个分区，"
+          f"{len(exporter.files)} 个文件，耗时 {elapsed:.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,284 @@
+"""CAN帧批量格式化与导出
+
+整批帧的数据先拼接成一个bytes，用一次bytes.hex(' ')得到全部十六进制文本再按偏移切片，
+时间戳同一秒内只做一次strftime；可导出为十六进制文本、CSV或NumPy结构化数组。
+
+示例：
+    python can_format.py log/20240101_received.log --csv out.csv
+    python can_format.py --bench 200000
+"""
+import io
+import sys
+import csv
+import time
+import argparse
+
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖，仅列式数组导出需要
+    np = None
+
+# 早于该时间（2000-01-01）的时间戳视为设备相对时间，需要换算到墙钟时间
+EPOCH_THRESHOLD = 946684800
+
+CSV_HEADER = ['timestamp', 'id', 'dlc', 'data', 'flags', 'channel']
+
+# CAN FD帧允许的数据长度（8字节以上只能是这几个值）
+FD_LENGTHS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64)
+
+
+class TimestampFormatter:
+    """把总线时间戳格式化为字符串，同一秒内只调用一次strftime"""
+    def __init__(self):
+        self._second = None
+        self._prefix = ""
+        self._offset = None
+
+    def __call__(self, ts):
+        if ts < EPOCH_THRESHOLD:
+            # 接口给出的是相对时间，以首帧为锚点换算成墙钟时间
+            if self._offset is None:
+                self._offset = time.time() - ts
+            ts += self._offset
+        # 先取整到微秒再拆分，避免 .438 这类小数因浮点误差截断成 .437
+        second, micros = divmod(int(round(ts * 1000000)), 1000000)
+        if second != self._second:
+            self._second = second
+            self._prefix = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(second))
+        return f"{self._prefix}.{micros // 1000:03d}"
+
+
+def hex_payloads(messages):
+    """一次性把整批帧的数据转换为十六进制文本，返回与messages等长的字符串列表"""
+    block = b"".join(bytes(message.data) for message in messages)
+    text = block.hex(' ').upper()
+    result = []
+    offset = 0
+    for message in messages:
+        length = len(message.data)
+        # 每字节占3个字符（两位十六进制加分隔空格），最后一个字节后没有空格
+        result.append(text[offset:offset + 3 * length - 1] if length else "")
+        offset += 3 * length
+    return result
+
+
+def check_payload_length(length, is_fd=False):
+    """校验数据长度：经典CAN最多8字节，CAN FD最多64字节且只能取FD_LENGTHS中的值"""
+    if not is_fd:
+        if length > 8:
+            raise ValueError(f"数据长度{length}字节超过8字节（经典CAN最大支持8字节，64字节需启用CAN FD）")
+    elif length not in FD_LENGTHS:
+        raise ValueError(f"CAN FD数据长度{length}字节无效，可选长度：{', '.join(map(str, FD_LENGTHS))}")
+
+
+def frame_flags(message):
+    """帧类型标志：扩展帧EXT、CAN FD帧FD、比特率切换BRS，经典标准帧返回空字符串"""
+    flags = []
+    if message.is_extended_id:
+        flags.append("EXT")
+    if message.is_fd:
+        flags.append("FD")
+        if message.bitrate_switch:
+            flags.append("BRS")
+    return "|".join(flags)
+
+
+def format_message(message, ts_text, data_hex=None, channel=False):
+    """把一帧CAN消息格式化为一行日志文本
+
+    经典标准帧保持原有格式；扩展帧和CAN FD帧在末尾追加 ", 标志=EXT|FD|BRS"，
+    channel=True（多通道采集）时再追加 ", 通道=名称"。
+    """
+    if data_hex is None:
+        data_hex = message.data.hex(' ').upper() if message.data else ""
+    direction = "接收" if message.is_rx else "发送"
+    line = f"[{ts_text}] {direction}: ID=0x{message.arbitration_id:X}, 数据={data_hex}, 长度={message.dlc}字节"
+    flags = frame_flags(message)
+    if flags:
+        line += f", 标志={flags}"
+    if channel:
+        line += f", 通道={message.channel}"
+    return line
+
+
+def format_frames(messages, format_timestamp=None, channel=False):
+    """批量格式化为日志文本行"""
+    if format_timestamp is None:
+        format_timestamp = TimestampFormatter()
+    return [format_message(message, format_timestamp(message.timestamp), data_hex, channel)
+            for message, data_hex in zip(messages, hex_payloads(messages))]
+
+
+def write_csv(messages, fileobj, write_header=True):
+    """批量写CSV：timestamp(秒), id(十六进制), dlc, data(十六进制), flags(EXT|FD|BRS), channel"""
+    writer = csv.writer(fileobj)
+    if write_header:
+        writer.writerow(CSV_HEADER)
+    writer.writerows(
+        (f"{message.timestamp:.6f}", f"{message.arbitration_id:X}", message.dlc, data_hex, frame_flags(message),
+         message.channel if message.channel is not None else "")
+        for message, data_hex in zip(messages, hex_payloads(messages))
+    )
+
+
+def frames_to_array(messages, max_len=None):
+    """转换为NumPy结构化数组，数据不足max_len补0
+
+    字段：timestamp, id, dlc, is_rx, is_extended_id, is_fd, bitrate_switch, channel, data[max_len]，
+    帧类型标志和通道与文本日志一致，array_to_hex_lines可还原出相同的行。
+    max_len为None时取本批最长数据（至少8字节），指定的max_len小于某帧数据长度时抛ValueError。
+    """
+    if np is None:
+        raise RuntimeError("未安装NumPy，无法导出列式数组（pip install numpy）")
+    count = len(messages)
+    longest = max((len(message.data) for message in messages), default=0)
+    if max_len is None:
+        max_len = max(8, longest)
+    elif longest > max_len:
+        raise ValueError(f"数据长度{longest}字节超过max_len={max_len}")
+    channels = ["" if message.channel is None else str(message.channel) for message in messages]
+    array = np.zeros(count, dtype=frame_dtype(max_len, max((len(channel) for channel in channels), default=1)))
+    array['timestamp'] = [message.timestamp for message in messages]
+    array['id'] = [message.arbitration_id for message in messages]
+    array['dlc'] = [message.dlc for message in messages]
+    array['is_rx'] = [message.is_rx for message in messages]
+    array['is_extended_id'] = [message.is_extended_id for message in messages]
+    array['is_fd'] = [message.is_fd for message in messages]
+    array['bitrate_switch'] = [message.bitrate_switch for message in messages]
+    array['channel'] = channels
+    # 先把数据补齐到定长再一次性拷入，避免逐帧写numpy数组
+    padding = bytes(max_len)
+    block = b"".join((bytes(message.data) + padding)[:max_len] for message in messages)
+    array['data'] = np.frombuffer(block, dtype=np.uint8).reshape(count, max_len)
+    return array
+
+
+def frame_dtype(max_len=8, channel_len=1):
+    return np.dtype([('timestamp', 'f8'), ('id', 'u4'), ('dlc', 'u1'), ('is_rx', '?'), ('is_extended_id', '?'),
+                     ('is_fd', '?'), ('bitrate_switch', '?'), ('channel', f'U{max(channel_len, 1)}'),
+                     ('data', 'u1', (max_len,))])
+
+
+def array_to_hex_lines(array, format_timestamp=None, channel=False):
+    """把结构化数组批量格式化回日志文本行，格式与format_message相同（含标志，channel=True时含通道）"""
+    if format_timestamp is None:
+        format_timestamp = TimestampFormatter()
+    max_len = array['data'].shape[1]
+    text = array['data'].tobytes().hex(' ').upper()
+    width = 3 * max_len
+    lines = []
+    columns = zip(array['timestamp'].tolist(), array['id'].tolist(), array['dlc'].tolist(),
+                  array['is_rx'].tolist(), array['is_extended_id'].tolist(), array['is_fd'].tolist(),
+                  array['bitrate_switch'].tolist(), array['channel'].tolist())
+    for i, (ts, can_id, dlc, is_rx, extended, is_fd, brs, name) in enumerate(columns):
+        length = min(dlc, max_len)
+        data_hex = text[i * width:i * width + 3 * length - 1] if length else ""
+        direction = "接收" if is_rx else "发送"
+        line = f"[{format_timestamp(ts)}] {direction}: ID=0x{can_id:X}, 数据={data_hex}, 长度={dlc}字节"
+        flags = [flag for flag, on in (("EXT", extended), ("FD", is_fd), ("BRS", is_fd and brs)) if on]
+        if flags:
+            line += f", 标志={'|'.join(flags)}"
+        if channel:
+            line += f", 通道={name}"
+        lines.append(line)
+    return lines
+
+
+def iter_chunks(frames, chunk_size=50000):
+    """把帧迭代器切成固定大小的块"""
+    chunk = []
+    for frame in frames:
+        chunk.append(frame)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def legacy_format(message):
+    """原有的逐帧格式化方式（逐字节f-string拼接 + 每帧strftime），仅用于基准对比"""
+    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+    can_id = f"0x{message.arbitration_id:X}"
+    data_hex = " ".join([f"{b:02X}" for b in message.data])
+    return f"[{timestamp}] 接收: ID={can_id}, 数据={data_hex}, 长度={message.dlc}字节"
+
+
+def benchmark(count=200000, chunk_size=5000):
+    """对比逐帧格式化与批量格式化的耗时，返回结果dict"""
+    import can
+    start_ts = time.time()
+    messages = [
+        can.Message(timestamp=start_ts + i * 0.0001, arbitration_id=i % 0x7FF,
+                    data=bytes((i + j) & 0xFF for j in range(8)), is_extended_id=False)
+        for i in range(count)
+    ]
+    results = {}
+
+    start = time.perf_counter()
+    for message in messages:
+        legacy_format(message)
+    results['legacy_per_frame'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    formatter = TimestampFormatter()
+    for chunk in iter_chunks(messages, chunk_size):
+        format_frames(chunk, formatter)
+    results['batch_text'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    buffer = io.StringIO()
+    for i, chunk in enumerate(iter_chunks(messages, chunk_size)):
+        write_csv(chunk, buffer, write_header=i == 0)
+    results['batch_csv'] = time.perf_counter() - start
+
+    if np is not None:
+        start = time.perf_counter()
+        for chunk in iter_chunks(messages, chunk_size):
+            frames_to_array(chunk)
+        results['batch_numpy'] = time.perf_counter() - start
+
+    return {name: {'seconds': round(seconds, 3), 'frames_per_s': round(count / seconds)}
+            for name, seconds in results.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CAN帧批量格式化/导出")
+    parser.add_argument("log", nargs='?', help="要导出的日志文件（文本日志或python-can支持的格式）")
+    parser.add_argument("--csv", help="导出CSV文件路径")
+    parser.add_argument("--text", help="导出十六进制文本日志路径")
+    parser.add_argument("--chunk", type=int, default=50000, help="每批处理的帧数")
+    parser.add_argument("--bench", type=int, default=0, help="运行格式化基准测试，参数为帧数")
+    args = parser.parse_args(argv)
+
+    if args.bench:
+        for name, result in benchmark(args.bench).items():
+            print(f"{name:18s} {result['seconds']:8.3f} 秒  {result['frames_per_s']:>10} 帧/秒")
+        return 0
+    if not args.log or not (args.csv or args.text):
+        parser.error("需要指定日志文件以及 --csv 或 --text")
+
+    from can_replay import iter_log_frames
+    start = time.perf_counter()
+    total = 0
+    formatter = TimestampFormatter()
+    csv_file = open(args.csv, 'w', newline='', encoding='utf-8') if args.csv else None
+    text_file = open(args.text, 'w', encoding='utf-8') if args.text else None
+    try:
+        for i, chunk in enumerate(iter_chunks(iter_log_frames(args.log), args.chunk)):
+            if csv_file:
+                write_csv(chunk, csv_file, write_header=i == 0)
+            if text_file:
+                text_file.write("\n".join(format_frames(chunk, formatter)) + "\n")
+            total += len(chunk)
+    finally:
+        for f in (csv_file, text_file):
+            if f:
+                f.close()
+    elapsed = time.perf_counter() - start
+    print(f"导出完成：{total} 帧，耗时 {elapsed:.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
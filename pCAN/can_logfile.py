@@ -0,0 +1,105 @@
+import os
+import time
+import datetime
+
+DAY_SECONDS = 86400
+
+
+class RotatingLogFile:
+    """按时间/大小滚动的日志文件，文件句柄在两次滚动之间保持打开
+
+    文件名为 {时间}_{name}.log（按天滚动时与原有的 20240101_received.log 一致），
+    同一时间段内因大小滚动产生的后续分段命名为 {时间}_{序号}_{name}.log。
+    close()后在同一时间段内再次写入时同样换新序号，已关闭的分段（可能正在上传）不再追加。
+    滚动时刻在打开文件时计算一次，写入时只做一次浮点比较。
+    """
+    def __init__(self, directory, name, max_bytes=0, interval=DAY_SECONDS,
+                 encoding='utf-8', on_rotate=None):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes  # 0 表示不按大小滚动
+        self.interval = interval    # 按时间滚动的周期（秒），0 表示不按时间滚动
+        self.encoding = encoding
+        self.on_rotate = on_rotate  # 分段关闭后回调，参数为已关闭文件的路径
+        if interval and interval % DAY_SECONDS == 0:
+            self.time_format = "%Y%m%d"
+        else:
+            self.time_format = "%Y%m%d_%H%M%S"
+        self.file = None
+        self.path = None
+        self.size = 0
+        self.next_rollover = None
+        self.segment_base = None
+        self.segment_index = 0
+
+    def _period_start(self, now):
+        """当前时间段的起点（按本地时间对齐）"""
+        if not self.interval:
+            return now
+        local = datetime.datetime.fromtimestamp(now)
+        midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+        elapsed = (local - midnight).total_seconds()
+        return midnight.timestamp() + elapsed // self.interval * self.interval
+
+    def _segment_path(self, index):
+        if index:
+            return os.path.join(self.directory, f"{self.segment_base}_{index:03d}_{self.name}.log")
+        return os.path.join(self.directory, f"{self.segment_base}_{self.name}.log")
+
+    def _open(self, now, new_period, reopen=False):
+        os.makedirs(self.directory, exist_ok=True)
+        if new_period:
+            start = self._period_start(now)
+            self.segment_base = time.strftime(self.time_format, time.localtime(start))
+            self.segment_index = 0
+            self.next_rollover = start + self.interval if self.interval else None
+        else:
+            self.segment_index += 1
+        # 程序重启时续写已有分段，已写满的分段跳过；close()后重新打开时跳过全部已有分段
+        while os.path.exists(self._segment_path(self.segment_index)) and (
+                reopen or (self.max_bytes and os.path.getsize(self._segment_path(self.segment_index)) >= self.max_bytes)):
+            self.segment_index += 1
+        self.path = self._segment_path(self.segment_index)
+        self.file = open(self.path, 'a', encoding=self.encoding)
+        self.size = self.file.tell()
+
+    def _close_segment(self):
+        if not self.file:
+            return None
+        self.file.close()
+        self.file = None
+        closed = self.path
+        if self.on_rotate:
+            self.on_rotate(closed)
+        return closed
+
+    def write_lines(self, lines, now=None):
+        """写入多行文本（不含换行符）"""
+        if not lines:
+            return
+        self.write("\n".join(lines) + "\n", now)
+
+    def write(self, text, now=None):
+        if now is None:
+            now = time.time()
+        if self.file is None:
+            if self.segment_base is not None and (self.next_rollover is None or now < self.next_rollover):
+                self._open(now, new_period=False, reopen=True)
+            else:
+                self._open(now, new_period=True)
+        elif self.next_rollover is not None and now >= self.next_rollover:
+            self._close_segment()
+            self._open(now, new_period=True)
+        elif self.max_bytes and self.size >= self.max_bytes:
+            self._close_segment()
+            self._open(now, new_period=False)
+        self.file.write(text)
+        self.size += len(text.encode(self.encoding)) if not text.isascii() else len(text)
+
+    def flush(self):
+        if self.file:
+            self.file.flush()
+
+    def close(self):
+        """关闭当前分段（同样会触发on_rotate）"""
+        return self._close_segment()
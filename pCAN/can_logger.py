@@ -0,0 +1,211 @@
+"""CAN命令行记录器：无界面长时间采集，复用GUI的接收流水线和日志服务
+
+示例：
+    python can_logger.py --interface pcan --channel PCAN_USBBUS1 --bitrate 500000
+    python can_logger.py --interface socketcan --channel vcan0 --max-mb 100
+    python can_logger.py --interface virtual --channel test --generate 2000 --duration 10
+
+启动时不导入tkinter，可在无图形环境的主机上运行。
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import can
+from can_pipeline import CANReceivePipeline, open_bus
+from can_multibus import parse_channels
+from can_logservice import LogService
+from can_stats import parse_can_filters
+from can_metrics import CANMetrics, MetricsCSVDumper
+from can_uploader import LogUploadService, load_ftp_config
+from can_trigger import TriggerCapture, parse_triggers
+
+
+def generate_traffic(interface, channel, rate, stop_event, fd=False):
+    """测试模式：在同一虚拟通道上以指定帧率发送模拟数据，fd=True时发送64字节扩展ID的FD帧"""
+    bus = can.interface.Bus(interface=interface, channel=channel, fd=fd)
+    period = 1.0 / rate
+    counter = 0
+    next_send = time.perf_counter()
+    try:
+        while not stop_event.is_set():
+            if fd:
+                data = counter.to_bytes(4, 'big') + bytes([counter & 0xFF] * 60)
+                message = can.Message(arbitration_id=0x18FF5000 + counter % 16, data=data,
+                                      is_extended_id=True, is_fd=True, bitrate_switch=True)
+            else:
+                data = counter.to_bytes(4, 'big') + bytes([counter & 0xFF] * 4)
+                message = can.Message(arbitration_id=0x100 + counter % 16, data=data, is_extended_id=False)
+            bus.send(message)
+            counter += 1
+            next_send += period
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    finally:
+        bus.shutdown()
+
+
+def print_stats(pipeline, metrics, elapsed, last):
+    """打印吞吐统计，返回本次的接收计数供下次计算速率"""
+    snapshot = pipeline.get_metrics()
+    interval = elapsed - last[1]
+    rate = (snapshot['received'] - last[0]) / interval if interval > 0 else 0.0
+    persist = snapshot['stages']['persist']
+    print(f"[{time.strftime('%H:%M:%S')}] 已接收 {snapshot['received']} 帧 | {rate:.0f} 帧/秒 | "
+          f"{metrics.summary()} | 日志入队平均 {persist['avg_ms']} ms/帧", flush=True)
+    return snapshot['received'], elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CAN命令行记录器")
+    parser.add_argument("--interface", default="pcan", help="接口类型，如 pcan/socketcan/virtual")
+    parser.add_argument("--channel", default="PCAN_USBBUS1",
+                        help="通道，如 PCAN_USBBUS1/vcan0；多通道用逗号分隔，如 vcan0,vcan1 或 socketcan:vcan0,kvaser:0")
+    parser.add_argument("--bitrate", default="500000", help="比特率（CAN FD时为仲裁段比特率）")
+    parser.add_argument("--fd", action="store_true", help="以CAN FD模式打开总线")
+    parser.add_argument("--data-bitrate", default="2000000", help="CAN FD数据段比特率")
+    parser.add_argument("--filters", default="", help="接收过滤器，格式 ID[:掩码]，逗号分隔")
+    parser.add_argument("--log-dir", default=os.path.join(os.getcwd(), "log"), help="日志目录")
+    parser.add_argument("--name", default="received", help="日志文件名后缀")
+    parser.add_argument("--max-mb", type=float, default=0, help="单个日志文件最大MB数，0表示不限")
+    parser.add_argument("--rotate", type=int, default=86400, help="按时间滚动的周期（秒），0表示不按时间滚动")
+    parser.add_argument("--stats-interval", type=float, default=5.0, help="统计信息打印间隔（秒）")
+    parser.add_argument("--metrics-csv", default="", help="统计快照CSV文件路径，留空不导出")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="统计CSV写入间隔（秒）")
+    parser.add_argument("--ftp-config", default="",
+                        help="FTP备份工具的配置文件（ftp_backup_config.json），指定后上传已关闭的日志分段")
+    parser.add_argument("--trigger", default="",
+                        help="触发条件，逗号分隔：ID、ID=01XXFF、ID=0100/FF00、*=数据、ERR，触发窗口写入trigger日志")
+    parser.add_argument("--pre-frames", type=int, default=10000, help="触发前环形缓冲的帧数")
+    parser.add_argument("--pre-seconds", type=float, default=5.0, help="触发前保留的时长（秒）")
+    parser.add_argument("--post-seconds", type=float, default=5.0, help="触发后记录的时长（秒）")
+    parser.add_argument("--trigger-only", action="store_true", help="只保存触发窗口，不写完整接收日志")
+    parser.add_argument("--duration", type=float, default=0, help="采集时长（秒），0表示直到Ctrl+C")
+    parser.add_argument("--generate", type=float, default=0,
+                        help="测试模式：在同一通道上以该帧率发送模拟数据（用于virtual/vcan）")
+    args = parser.parse_args(argv)
+
+    try:
+        triggers = parse_triggers(args.trigger)
+    except ValueError as e:
+        print(f"触发条件错误：{str(e)}", file=sys.stderr)
+        return 1
+    if args.trigger_only and not triggers:
+        print("--trigger-only 需要同时指定 --trigger", file=sys.stderr)
+        return 1
+
+    try:
+        can_filters = parse_can_filters(args.filters)
+        bus = open_bus(args.interface, args.channel, args.bitrate, can_filters=can_filters,
+                       fd=args.fd, data_bitrate=args.data_bitrate)
+    except Exception as e:
+        print(f"连接失败：{str(e)}", file=sys.stderr)
+        return 1
+
+    uploader = None
+    if args.ftp_config:
+        try:
+            config = load_ftp_config(args.ftp_config)
+            if not config:
+                raise FileNotFoundError(args.ftp_config)
+        except Exception as e:
+            print(f"FTP配置读取失败：{str(e)}", file=sys.stderr)
+            bus.shutdown()
+            return 1
+        uploader = LogUploadService(config['ftp_config'], config['remote_base_dir'])
+        uploader.start()
+
+    def on_rotate(path):
+        print(f"[{time.strftime('%H:%M:%S')}] 日志分段已关闭: {path}", flush=True)
+        if uploader:
+            uploader.submit(path)
+
+    log_service = LogService(
+        args.log_dir,
+        max_bytes=int(args.max_mb * 1024 * 1024),
+        interval=args.rotate,
+        on_rotate=on_rotate
+    )
+    log_service.error_callback = lambda text: print(text, file=sys.stderr, flush=True)
+    log_service.start()
+    pipeline = CANReceivePipeline(bus, persist_callback=lambda lines: log_service.write_lines(args.name, lines))
+    pipeline.display_enabled = False
+    capture = None
+    if triggers:
+        capture = TriggerCapture(
+            triggers,
+            persist_callback=lambda lines: log_service.write_lines('trigger', lines),
+            pre_frames=args.pre_frames,
+            pre_seconds=args.pre_seconds,
+            post_seconds=args.post_seconds,
+            channel_column=pipeline.channel_column
+        )
+        pipeline.add_sink(capture.update)
+        pipeline.add_idle_callback(capture.check_deadline)
+        if args.trigger_only:
+            pipeline.persist_callback = None
+    metrics = CANMetrics(args.bitrate, pipeline, log_service,
+                         data_bitrate=args.data_bitrate if args.fd else None)
+    pipeline.add_sink(metrics.update)
+    pipeline.start()
+    dumper = None
+    if args.metrics_csv:
+        dumper = MetricsCSVDumper(metrics, args.metrics_csv, args.metrics_interval)
+        dumper.start()
+    print(f"[{time.strftime('%H:%M:%S')}] 开始记录：{args.interface} | 通道：{args.channel} | "
+          f"比特率：{args.bitrate} bps{f' / 数据段 {args.data_bitrate} bps' if args.fd else ''} | "
+          f"日志目录：{args.log_dir}", flush=True)
+
+    stop_event = threading.Event()
+    generators = []
+    if args.generate > 0:
+        for _, interface, channel in parse_channels(args.interface, args.channel):
+            generator = threading.Thread(
+                target=generate_traffic,
+                args=(interface, channel, args.generate, stop_event, args.fd),
+                daemon=True
+            )
+            generator.start()
+            generators.append(generator)
+
+    start = time.time()
+    last = (0, 0.0)
+    next_stats = args.stats_interval
+    try:
+        while not args.duration or time.time() - start < args.duration:
+            time.sleep(0.2)
+            elapsed = time.time() - start
+            if args.stats_interval and elapsed >= next_stats:
+                last = print_stats(pipeline, metrics, elapsed, last)
+                next_stats += args.stats_interval
+            # 把状态信息（接收错误等）输出到标准错误
+            _, statuses = pipeline.drain_display()
+            for status in statuses:
+                print(status, file=sys.stderr, flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for generator in generators:
+            generator.join(timeout=1.0)
+        pipeline.stop()
+        if capture:
+            capture.flush()
+            stats = capture.stats()
+            print(f"[{time.strftime('%H:%M:%S')}] 触发 {stats['triggers']} 次，"
+                  f"保存 {stats['saved']}/{stats['seen']} 帧（{stats['saved_pct']}%）", flush=True)
+        if dumper:
+            dumper.stop()
+        bus.shutdown()
+        log_service.close()
+        if uploader:
+            uploader.stop(timeout=30.0)
+        print_stats(pipeline, metrics, time.time() - start, last)
+        print(f"[{time.strftime('%H:%M:%S')}] 记录结束", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import time
+import queue
+import threading
+from can_logfile import RotatingLogFile, DAY_SECONDS
+
+
+class LogService:
+    """异步日志服务：调用方只入队，后台写线程负责所有文件I/O
+
+    每个日志流（received、status等）对应一个常驻打开的RotatingLogFile，
+    累计未刷新的数据超过flush_bytes或距上次刷新超过flush_interval才flush；
+    滚动时刻在分段打开时计算一次。队列满时按调用方选择阻塞等待或丢弃，并计入统计；
+    写入延迟从调用write/write_lines算到写入文件（不含之后的批量flush）。
+    """
+    def __init__(self, directory, max_bytes=0, interval=DAY_SECONDS, on_rotate=None,
+                 queue_size=20000, flush_bytes=64 * 1024, flush_interval=1.0, block_timeout=1.0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.on_rotate = on_rotate
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.streams = {}  # 日志名 → RotatingLogFile，仅在写线程中写入（open_paths只读取路径）
+        self.error_callback = None  # 写文件失败时回调（在写线程中调用）
+        self.thread = None
+        self.running = False
+        self.stop_event = threading.Event()
+
+        # 背压统计
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.blocked = 0       # 因队列满而阻塞等待的次数
+        self.blocked_time = 0.0
+        self.write_latency = 0.0      # 按行累计：调用write/write_lines到写入文件的时间
+        self.max_write_latency = 0.0
+        self.max_depth = 0
+        self.flushes = 0
+
+    def start(self):
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self, timeout=5.0):
+        """写完队列中的剩余数据并关闭所有日志文件"""
+        if not self.running:
+            return
+        self.running = False
+        # 停止标记不受block_timeout限制：队列满时放不进去，写线程取空队列后按stop_event退出
+        self.stop_event.set()
+        try:
+            self.queue.put_nowait(('stop', None, None, 0.0))
+        except queue.Full:
+            pass
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+    def write(self, stream, text, block=False):
+        """写入一行文本（不含换行符），默认不阻塞，适合在GUI线程中调用"""
+        return self._put(('lines', stream, [text], time.perf_counter()), block)
+
+    def write_lines(self, stream, lines, block=True):
+        """写入多行文本，默认队列满时阻塞等待，适合接收流水线等不能丢数据的场景"""
+        return self._put(('lines', stream, lines, time.perf_counter()), block)
+
+    def open_paths(self):
+        """当前打开（仍会续写）的分段路径，供启动时补传历史分段时跳过"""
+        return [log_file.path for log_file in list(self.streams.values()) if log_file.file]
+
+    def close_stream(self, stream):
+        """关闭某个日志流的当前分段（触发on_rotate），下次写入时重新打开"""
+        return self._put(('close', stream, None, 0.0), block=True)
+
+    def _put(self, item, block):
+        if not self.running:
+            # 服务已关闭，数据同样计为丢弃
+            self.dropped += len(item[2] or ())
+            return False
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            if not block:
+                self.dropped += len(item[2] or ())
+                return False
+            start = time.perf_counter()
+            self.blocked += 1
+            try:
+                self.queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self.dropped += len(item[2] or ())
+                return False
+            finally:
+                self.blocked_time += time.perf_counter() - start
+        if item[0] == 'lines':
+            self.enqueued += len(item[2])
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def _stream(self, name):
+        log_file = self.streams.get(name)
+        if log_file is None:
+            log_file = RotatingLogFile(
+                self.directory, name,
+                max_bytes=self.max_bytes,
+                interval=self.interval,
+                on_rotate=self.on_rotate
+            )
+            self.streams[name] = log_file
+        return log_file
+
+    def _flush_all(self):
+        for log_file in self.streams.values():
+            log_file.flush()
+        self.flushes += 1
+
+    def _run(self):
+        pending_bytes = 0
+        last_flush = time.monotonic()
+        last_error = None
+        while True:
+            try:
+                kind, name, lines, queued = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    break
+                kind = None
+            try:
+                if kind == 'lines':
+                    text = "\n".join(lines) + "\n"
+                    self._stream(name).write(text)
+                    self.written += len(lines)
+                    latency = time.perf_counter() - queued
+                    self.write_latency += latency * len(lines)
+                    if latency > self.max_write_latency:
+                        self.max_write_latency = latency
+                    pending_bytes += len(text)
+                elif kind == 'close':
+                    # 保留RotatingLogFile对象：同一时间段内再次写入时换新分段，不续写已提交上传的文件
+                    if name in self.streams:
+                        self.streams[name].close()
+                elif kind == 'stop':
+                    break
+
+                now = time.monotonic()
+                if pending_bytes >= self.flush_bytes or (pending_bytes and now - last_flush >= self.flush_interval):
+                    self._flush_all()
+                    pending_bytes = 0
+                    last_flush = now
+            except Exception as e:
+                # 同一错误只报告一次，避免状态日志写失败时反复报错
+                error_msg = f"日志保存失败: {str(e)}"
+                if self.error_callback and error_msg != last_error:
+                    self.error_callback(error_msg)
+                last_error = error_msg
+
+        for log_file in self.streams.values():
+            try:
+                log_file.close()
+            except Exception:
+                pass
+        self.streams.clear()
+
+    def stats(self):
+        """返回背压统计快照"""
+        return {
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_depth,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'blocked': self.blocked,
+            'blocked_ms': round(self.blocked_time * 1000, 1),
+            'write_avg_ms': round(self.write_latency * 1000 / self.written, 3) if self.written else 0.0,
+            'write_max_ms': round(self.max_write_latency * 1000, 3),
+            'flushes': self.flushes
+        }
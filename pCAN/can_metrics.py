@@ -0,0 +1,157 @@
+import os
+import csv
+import time
+import threading
+import collections
+
+
+def frame_bits(is_extended_id, dlc, is_fd=False, bitrate_switch=False, data_ratio=1.0):
+    """一帧CAN在总线上占用的位数（含帧间隔，按最坏情况位填充估算）
+
+    dlc为数据字节数。CAN FD帧开启BRS时数据段按data_ratio（数据段/仲裁段比特率）
+    折算成仲裁段位时间，返回值可直接与仲裁段比特率比较得出负载。
+    """
+    data_bits = 8 * dlc
+    if not is_fd:
+        if is_extended_id:
+            return data_bits + 67 + (54 + data_bits - 1) // 4
+        return data_bits + 47 + (34 + data_bits - 1) // 4
+    # 仲裁段：SOF+ID+控制位到BRS为止；数据段：ESI+DLC+数据+填充计数+CRC(含固定填充位)+CRC界定符
+    arbitration_bits = 36 if is_extended_id else 17
+    crc_bits = 17 if dlc <= 16 else 21
+    data_phase_bits = 1 + 4 + data_bits + 4 + crc_bits + (crc_bits + 4 + 3) // 4 + 1
+    stuff_bits = (arbitration_bits + 5 + data_bits - 1) // 4
+    if bitrate_switch and data_ratio > 1:
+        data_phase_bits /= data_ratio
+    # 末尾ACK(2) + EOF(7) + 帧间隔(3) 固定按仲裁段速率
+    return arbitration_bits + data_phase_bits + stuff_bits + 12
+
+
+class CANMetrics:
+    """CAN总线负载与延迟统计
+
+    作为接收流水线的sink整批更新，按秒分桶统计帧数和占用位数，
+    snapshot()合并流水线的队列深度和延迟，供状态栏、命令行和CSV导出使用。
+    """
+    CSV_FIELDS = [
+        'time', 'frames_per_s', 'bits_per_s', 'bus_load_pct', 'error_frames', 'received',
+        'dropped', 'queue_depth', 'max_queue_depth', 'handoff_avg_ms', 'handoff_max_ms',
+        'log_queue_depth', 'log_dropped', 'log_blocked_ms', 'log_write_avg_ms', 'log_write_max_ms'
+    ]
+
+    def __init__(self, bitrate, pipeline=None, log_service=None, window=2, data_bitrate=None):
+        self.bitrate = int(bitrate)
+        # CAN FD数据段比特率与仲裁段比特率之比，用于折算BRS帧的数据段位时间
+        self.data_ratio = int(data_bitrate) / self.bitrate if data_bitrate and self.bitrate else 1.0
+        self.pipeline = pipeline
+        self.log_service = log_service
+        self.window = window  # 统计速率使用的完整秒数
+        self.buckets = collections.deque(maxlen=window + 1)  # [秒, 帧数, 位数]
+        self.error_frames = 0
+        self.total_frames = 0
+        self.total_bits = 0
+        self.lock = threading.Lock()
+
+    def update(self, messages):
+        bits = 0.0
+        errors = 0
+        for message in messages:
+            if message.is_error_frame:
+                errors += 1
+                continue
+            bits += frame_bits(message.is_extended_id, message.dlc, message.is_fd,
+                               message.bitrate_switch, self.data_ratio)
+        second = int(time.monotonic())
+        with self.lock:
+            if not self.buckets or self.buckets[-1][0] != second:
+                self.buckets.append([second, 0, 0])
+            bucket = self.buckets[-1]
+            bucket[1] += len(messages)
+            bucket[2] += bits
+            self.error_frames += errors
+            self.total_frames += len(messages)
+            self.total_bits += bits
+
+    def rates(self):
+        """最近window个完整秒内的(帧/秒, 位/秒)"""
+        now = int(time.monotonic())
+        with self.lock:
+            complete = [b for b in self.buckets if now - self.window <= b[0] < now]
+        frames = sum(b[1] for b in complete)
+        bits = sum(b[2] for b in complete)
+        return frames / self.window, bits / self.window
+
+    def snapshot(self):
+        """返回当前统计快照（dict）"""
+        frames_per_s, bits_per_s = self.rates()
+        snapshot = {
+            'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+            'frames_per_s': round(frames_per_s, 1),
+            'bits_per_s': round(bits_per_s),
+            'bus_load_pct': round(bits_per_s * 100 / self.bitrate, 2) if self.bitrate else 0.0,
+            'error_frames': self.error_frames,
+        }
+        if self.pipeline:
+            metrics = self.pipeline.get_metrics()
+            latency = metrics['stages']['handoff']
+            snapshot.update({
+                'received': metrics['received'],
+                'dropped': metrics['dropped'],
+                'queue_depth': metrics['queue_depth'],
+                'max_queue_depth': metrics['max_queue_depth'],
+                'handoff_avg_ms': latency['avg_ms'],
+                'handoff_max_ms': latency['max_ms'],
+            })
+        if self.log_service:
+            stats = self.log_service.stats()
+            snapshot.update({
+                'log_queue_depth': stats['queue_depth'],
+                'log_dropped': stats['dropped'],
+                'log_blocked_ms': stats['blocked_ms'],
+                'log_write_avg_ms': stats['write_avg_ms'],
+                'log_write_max_ms': stats['write_max_ms'],
+            })
+        return snapshot
+
+    def summary(self, snapshot=None):
+        """状态栏用的单行摘要"""
+        s = snapshot or self.snapshot()
+        text = f"负载 {s['bus_load_pct']}% | {s['frames_per_s']:.0f} 帧/秒 | 错误帧 {s['error_frames']}"
+        if 'handoff_avg_ms' in s:
+            text += f" | 入队延迟 {s['handoff_avg_ms']}/{s['handoff_max_ms']} ms | 队列 {s['queue_depth']} | 丢弃 {s['dropped']}"
+        if 'log_queue_depth' in s:
+            text += f" | 日志队列 {s['log_queue_depth']}，写入 {s['log_write_avg_ms']}/{s['log_write_max_ms']} ms"
+            if s['log_dropped']:
+                text += f"（丢弃 {s['log_dropped']}）"
+        return text
+
+
+class MetricsCSVDumper:
+    """后台线程按固定间隔把统计快照追加到CSV文件"""
+    def __init__(self, metrics, path, interval=10.0):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=CANMetrics.CSV_FIELDS, extrasaction='ignore')
+            if write_header:
+                writer.writeheader()
+            while not self.stop_event.wait(self.interval):
+                writer.writerow(self.metrics.snapshot())
+                f.flush()
+            writer.writerow(self.metrics.snapshot())
@@ -0,0 +1,140 @@
+import time
+import heapq
+import threading
+import collections
+import can
+from can_format import EPOCH_THRESHOLD
+
+
+def parse_channels(interface, channel_text):
+    """解析通道配置，返回[(通道名, 接口类型, 通道)]
+
+    多个通道用逗号分隔；不同接口类型混用时写成 接口:通道，如
+    "PCAN_USBBUS1, PCAN_USBBUS2" 或 "socketcan:vcan0, kvaser:0"。
+    """
+    channels = []
+    for item in channel_text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        prefix, _, rest = item.partition(':')
+        if rest and prefix in can.interfaces.VALID_INTERFACES:
+            channels.append((item, prefix, rest))
+        else:
+            channels.append((item, interface, item))
+    if not channels:
+        raise ValueError("未配置CAN通道")
+    names = [name for name, _, _ in channels]
+    if len(set(names)) != len(names):
+        raise ValueError(f"通道重复：{channel_text}")
+    return channels
+
+
+class MultiChannelBus(can.BusABC):
+    """把多个通道合并成一个按时间戳排序的总线
+
+    每个通道一个接收线程，帧进入各自的队列；recv()对各队列队首做k路归并，
+    取时间戳最小的一帧。某个通道暂时没有数据时，队首帧最多等待merge_delay秒
+    再输出，以便晚到的其他通道的更早帧能排到前面。接收到的帧的channel字段为通道名，
+    send()按message.channel选择通道发送，未指定时发到第一个通道。
+    """
+    multi_channel = True
+
+    def __init__(self, buses, merge_delay=0.05, queue_size=20000):
+        self.names = [name for name, _ in buses]
+        self.buses = [bus for _, bus in buses]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.merge_delay = merge_delay
+        self.queue_size = queue_size
+        self.pending = [collections.deque() for _ in self.buses]  # 各通道待归并的(帧, 到达时刻)
+        self.heads = []  # 各非空通道队首的(时间戳, 通道序号)
+        self.cond = threading.Condition()
+        self.offsets = [None] * len(self.buses)  # 设备相对时间 → 墙钟时间的偏移
+        self.errors = collections.deque()
+        self.received = [0] * len(self.buses)
+        self.dropped = [0] * len(self.buses)
+        super().__init__(channel=", ".join(self.names))
+        self.channel_info = f"多通道：{', '.join(self.names)}"
+
+        self.running = True
+        self.threads = []
+        for i in range(len(self.buses)):
+            thread = threading.Thread(target=self._reader, args=(i,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _reader(self, i):
+        bus = self.buses[i]
+        name = self.names[i]
+        while self.running:
+            try:
+                message = bus.recv(0.2)
+            except Exception as e:
+                if self.running:
+                    with self.cond:
+                        self.errors.append(f"{name}: {str(e)}")
+                        self.cond.notify()
+                time.sleep(1)
+                continue
+            if message is None:
+                continue
+            message.channel = name
+            if message.timestamp < EPOCH_THRESHOLD:
+                # 各接口的设备时间起点不同，统一换算到墙钟时间后才能对齐
+                if self.offsets[i] is None:
+                    self.offsets[i] = time.time() - message.timestamp
+                message.timestamp += self.offsets[i]
+            with self.cond:
+                queue = self.pending[i]
+                if len(queue) >= self.queue_size:
+                    self.dropped[i] += 1
+                    continue
+                queue.append((message, time.monotonic()))
+                self.received[i] += 1
+                if len(queue) == 1:
+                    heapq.heappush(self.heads, (message.timestamp, i))
+                    self.cond.notify()
+
+    def _recv_internal(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.cond:
+            while True:
+                if self.errors:
+                    raise can.CanOperationError(self.errors.popleft())
+                wait = None
+                if self.heads:
+                    _, i = self.heads[0]
+                    queue = self.pending[i]
+                    wait = queue[0][1] + self.merge_delay - time.monotonic()
+                    # 所有通道都有待处理帧时队首一定是全局最早的，可以立即输出
+                    if wait <= 0 or len(self.heads) == len(self.buses):
+                        heapq.heappop(self.heads)
+                        message, _ = queue.popleft()
+                        if queue:
+                            heapq.heappush(self.heads, (queue[0][0].timestamp, i))
+                        return message, True
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None, True
+                    wait = remaining if wait is None else min(wait, remaining)
+                self.cond.wait(wait)
+
+    def send(self, msg, timeout=None):
+        self.buses[self.index.get(msg.channel, 0)].send(msg, timeout)
+
+    def shutdown(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join(timeout=1.0)
+        for bus in self.buses:
+            bus.shutdown()
+        super().shutdown()
+
+    def stats(self):
+        """各通道的接收/丢弃计数和当前待归并帧数"""
+        with self.cond:
+            return {
+                name: {'received': self.received[i], 'dropped': self.dropped[i], 'pending': len(self.pending[i])}
+                for i, name in enumerate(self.names)
+            }
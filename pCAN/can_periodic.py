@@ -0,0 +1,235 @@
+import time
+import heapq
+import threading
+import can
+from can_format import check_payload_length
+
+# 软件调度器在到期前多少秒结束sleep，改为忙等以获得亚毫秒精度
+SPIN_THRESHOLD = 0.002
+# 软件发送连续失败多少次后停止该项（避免每个周期都报告同一个错误）
+MAX_FAILURES = 10
+
+
+class JitterStats:
+    """周期发送的抖动统计（相对计划发送时刻的偏差，Welford算法）"""
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_abs = 0.0
+
+    def record(self, error):
+        self.count += 1
+        delta = error - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (error - self.mean)
+        if abs(error) > self.max_abs:
+            self.max_abs = abs(error)
+
+    def snapshot(self):
+        std = (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+        return {
+            'count': self.count,
+            'mean_us': round(self.mean * 1e6, 1),
+            'std_us': round(std * 1e6, 1),
+            'max_us': round(self.max_abs * 1e6, 1)
+        }
+
+
+def apply_checksum(data, index, method='sum'):
+    """计算除校验字节外其余字节的校验值并写入index位置"""
+    value = 0
+    for i, b in enumerate(data):
+        if i == index:
+            continue
+        if method == 'xor':
+            value ^= b
+        else:
+            value += b
+    data[index] = value & 0xFF
+
+
+class PeriodicEntry:
+    """周期发送表中的一项"""
+    def __init__(self, can_id, data, period, count=0, counter_index=None,
+                 checksum_index=None, checksum_method='sum', is_extended_id=False,
+                 is_fd=False, bitrate_switch=False, channel=None):
+        if period <= 0:
+            raise ValueError("周期必须大于0")
+        data = bytearray(data)
+        check_payload_length(len(data), is_fd)
+        for index in (counter_index, checksum_index):
+            if index is not None and not 0 <= index < len(data):
+                raise ValueError(f"字节位置{index}超出数据长度{len(data)}")
+        self.can_id = can_id
+        self.data = data
+        self.period = period
+        self.count = count  # 0 表示无限次
+        self.counter_index = counter_index
+        self.checksum_index = checksum_index
+        self.checksum_method = checksum_method
+        self.is_extended_id = is_extended_id
+        self.is_fd = is_fd
+        self.bitrate_switch = bitrate_switch
+        self.channel = channel  # 多通道总线上的发送通道名，None为第一个通道
+        self.sent = 0  # 硬件模式由驱动定时发送，发送次数未知，为None
+        self.failures = 0  # 连续发送失败次数
+        self.error = ""  # 因连续失败而停止时的错误信息
+        self.mode = None  # 'hardware' 或 'software'
+        self.task = None  # 硬件/驱动周期任务
+        self.stats = JitterStats()
+
+    @property
+    def mutating(self):
+        return self.counter_index is not None or self.checksum_index is not None
+
+    def build_message(self):
+        return can.Message(
+            arbitration_id=self.can_id,
+            data=self.data,
+            is_extended_id=self.is_extended_id,
+            is_fd=self.is_fd,
+            bitrate_switch=self.bitrate_switch,
+            channel=self.channel
+        )
+
+    def next_payload(self):
+        """更新计数器/校验字节，返回本次要发送的数据"""
+        if self.counter_index is not None:
+            self.data[self.counter_index] = (self.data[self.counter_index] + 1) & 0xFF
+        if self.checksum_index is not None:
+            apply_checksum(self.data, self.checksum_index, self.checksum_method)
+        return self.data
+
+    def finished(self):
+        return self.count and self.sent is not None and self.sent >= self.count
+
+    def describe(self):
+        data_hex = self.data.hex(' ').upper()
+        return f"ID=0x{self.can_id:X}, 数据={data_hex}, 周期={self.period * 1000:g}ms"
+
+
+def supports_hardware_periodic(bus):
+    """接口驱动是否自己实现了周期发送（如socketcan BCM），而非python-can的通用线程"""
+    return type(bus)._send_periodic_internal is not can.BusABC._send_periodic_internal
+
+
+class PeriodicScheduler:
+    """CAN周期发送调度器
+
+    不需要修改数据的项优先交给驱动的send_periodic（硬件/内核定时），
+    其余项由一个高精度软件调度线程统一发送，并记录相对计划时刻的抖动。
+    """
+    def __init__(self, bus, error_callback=None):
+        self.bus = bus
+        self.error_callback = error_callback
+        self.entries = []
+        self.heap = []  # (计划发送时刻, 序号, entry)
+        self.seq = 0
+        self.lock = threading.Condition()
+        self.running = False
+        self.thread = None
+
+    def add(self, entry, prefer_hardware=True):
+        """加入一项并立即开始发送"""
+        if prefer_hardware and not entry.mutating and supports_hardware_periodic(self.bus):
+            duration = entry.period * entry.count if entry.count else None
+            entry.task = self.bus.send_periodic(entry.build_message(), entry.period, duration=duration)
+            entry.mode = 'hardware'
+            entry.sent = None
+            with self.lock:
+                self.entries.append(entry)
+            return entry
+
+        entry.mode = 'software'
+        with self.lock:
+            self.entries.append(entry)
+            heapq.heappush(self.heap, (time.perf_counter(), self.seq, entry))
+            self.seq += 1
+            self.lock.notify()
+        self._ensure_thread()
+        return entry
+
+    def remove(self, entry):
+        with self.lock:
+            if entry in self.entries:
+                self.entries.remove(entry)
+            self.heap = [item for item in self.heap if item[2] is not entry]
+            heapq.heapify(self.heap)
+            self.lock.notify()
+        if entry.task:
+            entry.task.stop()
+            entry.task = None
+
+    def stop(self):
+        """停止全部周期发送"""
+        for entry in list(self.entries):
+            self.remove(entry)
+        with self.lock:
+            self.running = False
+            self.lock.notify()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+    def _report(self, text):
+        if self.error_callback:
+            self.error_callback(text)
+
+    def _ensure_thread(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        """软件调度线程：sleep到临近到期，再忙等到精确时刻发送"""
+        while True:
+            with self.lock:
+                while self.running and not self.heap:
+                    self.lock.wait()
+                if not self.running:
+                    return
+                due, seq, entry = self.heap[0]
+                remaining = due - time.perf_counter()
+                if remaining > SPIN_THRESHOLD:
+                    self.lock.wait(remaining - SPIN_THRESHOLD)
+                    continue
+                heapq.heappop(self.heap)
+
+            while time.perf_counter() < due:
+                pass
+            now = time.perf_counter()
+            try:
+                message = can.Message(
+                    arbitration_id=entry.can_id,
+                    data=entry.next_payload(),
+                    is_extended_id=entry.is_extended_id,
+                    is_fd=entry.is_fd,
+                    bitrate_switch=entry.bitrate_switch,
+                    channel=entry.channel
+                )
+                self.bus.send(message)
+                entry.sent += 1
+                entry.failures = 0
+                entry.stats.record(now - due)
+            except Exception as e:
+                # 只报告连续失败的第一次，连续失败MAX_FAILURES次后停止该项
+                entry.failures += 1
+                if entry.failures >= MAX_FAILURES:
+                    entry.error = str(e)
+                    with self.lock:
+                        if entry in self.entries:
+                            self.entries.remove(entry)
+                    self._report(f"周期发送连续失败 {entry.failures} 次，已停止 {entry.describe()}: {str(e)}")
+                elif entry.failures == 1:
+                    self._report(f"周期发送失败 {entry.describe()}: {str(e)}")
+
+            with self.lock:
+                if entry in self.entries and not entry.finished():
+                    # 以计划时刻而不是实际发送时刻累加，避免误差累积
+                    next_due = due + entry.period
+                    if next_due < now:
+                        next_due = now
+                    heapq.heappush(self.heap, (next_due, seq, entry))
@@ -0,0 +1,257 @@
+import time
+import queue
+import threading
+import can
+from can_format import TimestampFormatter, format_frames
+from can_multibus import MultiChannelBus, parse_channels
+
+def open_bus(interface, channel, bitrate, can_filters=None, fd=False, data_bitrate=None):
+    """按配置打开CAN总线（GUI和命令行记录器共用）
+
+    fd=True 时以CAN FD模式打开，data_bitrate为数据段比特率（BRS帧的数据段使用该速率）。
+    channel中用逗号分隔多个通道时返回按时间戳合并的MultiChannelBus。
+    """
+    kwargs = {}
+    if fd:
+        kwargs['fd'] = True
+        if data_bitrate:
+            kwargs['data_bitrate'] = int(data_bitrate)
+    channels = parse_channels(interface, str(channel))
+    buses = []
+    try:
+        for name, bus_interface, bus_channel in channels:
+            bus = can.interface.Bus(
+                interface=bus_interface,
+                channel=bus_channel,
+                bitrate=int(bitrate),
+                can_filters=can_filters,
+                **kwargs
+            )
+            buses.append((name, bus))
+    except Exception:
+        for _, bus in buses:
+            bus.shutdown()
+        raise
+    if len(buses) == 1:
+        return buses[0][1]
+    return MultiChannelBus(buses)
+
+
+class StageMetrics:
+    """单个流水线阶段的统计：处理数量、平均/最大延迟"""
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, latency, count=1):
+        """记录一次（或一批）处理的延迟，单位秒"""
+        with self.lock:
+            self.count += count
+            self.total_latency += latency * count
+            if latency > self.max_latency:
+                self.max_latency = latency
+
+    def snapshot(self):
+        with self.lock:
+            avg = self.total_latency / self.count if self.count else 0.0
+            return {
+                'count': self.count,
+                'avg_ms': round(avg * 1000, 3),
+                'max_ms': round(self.max_latency * 1000, 3)
+            }
+
+
+class CANReceivePipeline:
+    """CAN接收流水线：接收线程 → 有界队列 → 格式化/持久化线程 → 显示队列
+
+    接收线程只负责从总线取帧并入队，格式化、写日志等慢操作在工作线程中批量完成，
+    显示由GUI主循环通过drain_display()定时取走，避免任何一个慢阶段导致丢帧。
+    """
+    def __init__(self, bus, persist_callback=None, queue_size=20000,
+                 display_queue_size=5000, batch_size=500):
+        self.bus = bus
+        self.persist_callback = persist_callback  # 接收一批文本行，在工作线程中调用
+        self.batch_size = batch_size
+        self.rx_queue = queue.Queue(maxsize=queue_size)
+        self.display_queue = queue.Queue(maxsize=display_queue_size)
+        self.running = False
+        self.receive_thread = None
+        self.worker_thread = None
+        self.format_timestamp = TimestampFormatter()
+        self.channel_column = getattr(bus, 'multi_channel', False)  # 多通道时日志行带通道字段
+        self.sinks = []  # 额外的批处理阶段（如按ID统计），在工作线程中以帧列表调用
+        self.idle_callbacks = []  # 接收队列空闲时在工作线程中调用（如结束到期的触发窗口）
+        self.display_enabled = True  # 关闭后不再生成显示行（如GUI切换到统计视图）
+        self.decoder = None  # 可选的信号解码器（如DBCDecoder），解码结果附加在显示行后
+
+        # 统计信息
+        self.received = 0
+        self.dropped = 0          # 接收队列满时丢弃的帧数
+        self.display_dropped = 0  # 显示队列满时丢弃的行数（日志仍完整）
+        self.max_queue_depth = 0
+        self.stages = {
+            'queue': StageMetrics('queue'),      # 入队到被工作线程取出
+            'format': StageMetrics('format'),    # 格式化
+            'persist': StageMetrics('persist'),  # 调用persist_callback（交给LogService时为入队）
+            'decode': StageMetrics('decode'),    # 信号解码
+            'display': StageMetrics('display'),  # 接收到显示
+            'handoff': StageMetrics('handoff'),  # 接收到persist_callback返回（LogService只是入队，写盘延迟见其统计）
+        }
+
+    def start(self):
+        """启动接收线程和工作线程"""
+        self.running = True
+        self.receive_thread = threading.Thread(target=self._receive_loop, daemon=True)
+        self.worker_thread = threading.Thread(target=self._worker_loop, daemon=True)
+        self.worker_thread.start()
+        self.receive_thread.start()
+
+    def stop(self, timeout=2.0):
+        """停止流水线，工作线程会先处理完队列中剩余的帧"""
+        self.running = False
+        if self.receive_thread and self.receive_thread.is_alive():
+            self.receive_thread.join(timeout=timeout)
+        if self.worker_thread and self.worker_thread.is_alive():
+            self.worker_thread.join(timeout=timeout)
+
+    def add_sink(self, callback):
+        """注册一个批处理阶段，callback(messages)在工作线程中调用"""
+        self.sinks.append(callback)
+
+    def remove_sink(self, callback):
+        """移除批处理阶段（整体替换列表，工作线程正在遍历的旧列表不受影响）"""
+        self.sinks = [sink for sink in self.sinks if sink != callback]
+
+    def add_idle_callback(self, callback):
+        """注册空闲回调，callback()在工作线程等待新帧超时（约0.2秒）时调用"""
+        self.idle_callbacks.append(callback)
+
+    def remove_idle_callback(self, callback):
+        """移除空闲回调（整体替换列表，同remove_sink）"""
+        self.idle_callbacks = [item for item in self.idle_callbacks if item != callback]
+
+    def post_status(self, text):
+        """投递一条状态信息给显示阶段（线程安全，可从任意线程调用）"""
+        try:
+            self.display_queue.put_nowait(('status', text, None))
+        except queue.Full:
+            self.display_dropped += 1
+
+    def _receive_loop(self):
+        """接收阶段：只做recv和入队"""
+        while self.running:
+            try:
+                message = self.bus.recv(0.5)
+            except Exception as e:
+                if self.running:
+                    self.post_status(f"[{time.strftime('%H:%M:%S')}] 接收错误: {str(e)}")
+                time.sleep(1)
+                continue
+            if message is None:
+                continue
+            self.received += 1
+            try:
+                self.rx_queue.put_nowait((message, time.perf_counter()))
+            except queue.Full:
+                self.dropped += 1
+                continue
+            depth = self.rx_queue.qsize()
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+
+    def _next_batch(self):
+        """从接收队列取出一批帧，队列为空时最多等待0.2秒"""
+        try:
+            batch = [self.rx_queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.rx_queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        """格式化/持久化阶段：批量处理，整批写日志"""
+        while self.running or not self.rx_queue.empty():
+            batch = self._next_batch()
+            if not batch:
+                for callback in self.idle_callbacks:
+                    try:
+                        callback()
+                    except Exception as e:
+                        self.post_status(f"[{time.strftime('%H:%M:%S')}] 处理阶段错误: {str(e)}")
+                continue
+
+            start = time.perf_counter()
+            for _, enqueued in batch:
+                self.stages['queue'].record(start - enqueued)
+
+            lines = format_frames([message for message, _ in batch], self.format_timestamp, self.channel_column)
+            formatted = time.perf_counter()
+            self.stages['format'].record((formatted - start) / len(batch), len(batch))
+
+            if self.persist_callback:
+                try:
+                    self.persist_callback(lines)
+                except Exception as e:
+                    self.post_status(f"[{time.strftime('%H:%M:%S')}] 日志保存失败: {str(e)}")
+                persisted = time.perf_counter()
+                self.stages['persist'].record((persisted - formatted) / len(batch), len(batch))
+                for _, enqueued in batch:
+                    self.stages['handoff'].record(persisted - enqueued)
+
+            if self.sinks:
+                messages = [message for message, _ in batch]
+                for sink in self.sinks:
+                    try:
+                        sink(messages)
+                    except Exception as e:
+                        self.post_status(f"[{time.strftime('%H:%M:%S')}] 处理阶段错误: {str(e)}")
+
+            if not self.display_enabled:
+                continue
+            decoder = self.decoder
+            if decoder:
+                decode_start = time.perf_counter()
+                decoded = decoder.decode_batch([message for message, _ in batch])
+                self.stages['decode'].record((time.perf_counter() - decode_start) / len(batch), len(batch))
+                lines = [f"{line} | {text}" if text else line for line, text in zip(lines, decoded)]
+            for line, (_, enqueued) in zip(lines, batch):
+                try:
+                    self.display_queue.put_nowait(('message', line, enqueued))
+                except queue.Full:
+                    self.display_dropped += 1
+
+    def drain_display(self, max_items=2000):
+        """显示阶段：由GUI主循环调用，返回(消息行列表, 状态行列表)"""
+        messages = []
+        statuses = []
+        now = time.perf_counter()
+        for _ in range(max_items):
+            try:
+                kind, text, enqueued = self.display_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'message':
+                messages.append(text)
+                self.stages['display'].record(now - enqueued)
+            else:
+                statuses.append(text)
+        return messages, statuses
+
+    def get_metrics(self):
+        """返回流水线统计快照"""
+        return {
+            'received': self.received,
+            'dropped': self.dropped,
+            'display_dropped': self.display_dropped,
+            'queue_depth': self.rx_queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'display_queue_depth': self.display_queue.qsize(),
+            'stages': {name: stage.snapshot() for name, stage in self.stages.items()}
+        }
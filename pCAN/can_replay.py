@@ -0,0 +1,209 @@
+"""CAN日志回放：流式读取采集日志并按原始帧间隔、N倍速或最快速度重新发送
+
+示例：
+    python can_replay.py log/20240101_received.log --interface pcan --channel PCAN_USBBUS1 --speed 2
+    python can_replay.py capture.blf --interface socketcan --channel vcan0 --speed 0
+
+文本日志逐行解析，其他格式（.asc/.blf/.trc/.csv等）使用python-can的LogReader流式读取，
+不会把整个文件读入内存。
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import threading
+import can
+from can_periodic import JitterStats, SPIN_THRESHOLD
+from can_pipeline import open_bus
+
+TEXT_SUFFIXES = ('.log', '.txt')
+
+# [2024-01-01 12:00:00.123] 接收: ID=0x123, 数据=01 02, 长度=2字节
+# [2024-01-01 12:00:00.123] 接收: ID=0x18FF50E5, 数据=01 02 ..., 长度=12字节, 标志=EXT|FD|BRS, 通道=CAN2
+LINE_PATTERN = re.compile(
+    r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.(\d+))?\] (接收|发送): "
+    r"ID=0x([0-9A-Fa-f]+), 数据=([0-9A-Fa-f ]*), 长度=(\d+)字节(?:, 标志=([A-Z|]*))?(?:, 通道=([^,\s]+))?"
+)
+
+
+def parse_data_hex(text):
+    """日志中的数据字段 → bytes
+
+    旧版本的发送记录按用户输入原样写入（如 "1 2 3"），fromhex失败时逐个token按一字节解析，
+    token超过0xFF时抛ValueError。
+    """
+    try:
+        return bytes.fromhex(text)
+    except ValueError:
+        return bytes(int(token, 16) for token in text.split())
+
+
+class TextLogParser:
+    """解析文本日志行，同一秒内的时间前缀只做一次mktime"""
+    def __init__(self, directions=('接收', '发送')):
+        self.directions = directions
+        self._prefix = None
+        self._second = 0.0
+        self.invalid = 0  # 格式匹配但数据无法解析而跳过的行数
+
+    def parse(self, line):
+        """解析一行，非帧记录或被过滤的方向返回None"""
+        match = LINE_PATTERN.match(line)
+        if not match:
+            return None
+        prefix, fraction, direction, id_hex, data_hex, _, flags, channel = match.groups()
+        if direction not in self.directions:
+            return None
+        try:
+            data = parse_data_hex(data_hex)
+        except ValueError:
+            self.invalid += 1
+            return None
+        if prefix != self._prefix:
+            self._prefix = prefix
+            self._second = time.mktime(time.strptime(prefix, "%Y-%m-%d %H:%M:%S"))
+        timestamp = self._second + (int(fraction) / 10 ** len(fraction) if fraction else 0.0)
+        can_id = int(id_hex, 16)
+        flags = flags.split('|') if flags else ()
+        return can.Message(
+            timestamp=timestamp,
+            arbitration_id=can_id,
+            data=data,
+            # 旧日志没有标志字段，按ID范围判断是否扩展帧
+            is_extended_id='EXT' in flags or can_id > 0x7FF,
+            is_fd='FD' in flags,
+            bitrate_switch='BRS' in flags,
+            is_rx=direction == '接收',
+            channel=channel
+        )
+
+
+def iter_log_frames(path, directions=('接收', '发送')):
+    """流式读取日志文件，逐帧生成can.Message"""
+    if path.lower().endswith(TEXT_SUFFIXES):
+        parser = TextLogParser(directions)
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                message = parser.parse(line)
+                if message is not None:
+                    yield message
+    else:
+        for message in can.LogReader(path):
+            if not message.is_error_frame:
+                yield message
+
+
+class CANReplayer:
+    """按日志时间戳回放CAN帧
+
+    speed=1 按原始间隔回放，speed=N 为N倍速，speed=0 尽可能快地发送。
+    发送时刻先sleep到临近目标再忙等，timing_stats记录实际发送相对目标时刻的偏差。
+    """
+    def __init__(self, bus, speed=1.0, progress_callback=None):
+        self.bus = bus
+        self.speed = speed
+        self.progress_callback = progress_callback  # 每发送1000帧回调一次，参数为已发送帧数
+        self.stop_event = threading.Event()
+        self.timing_stats = JitterStats()
+        self.sent = 0
+        self.errors = 0
+        self.duration = 0.0
+
+    def stop(self):
+        self.stop_event.set()
+
+    def replay(self, frames):
+        """回放一个帧迭代器（以第一帧为时间起点），返回累计统计结果"""
+        start = time.perf_counter()
+        base_ts = None
+        try:
+            for message in frames:
+                if self.stop_event.is_set():
+                    break
+                if self.speed > 0:
+                    if base_ts is None:
+                        base_ts = message.timestamp
+                    target = start + (message.timestamp - base_ts) / self.speed
+                    remaining = target - time.perf_counter()
+                    if remaining > SPIN_THRESHOLD:
+                        if self.stop_event.wait(remaining - SPIN_THRESHOLD):
+                            break
+                    while time.perf_counter() < target:
+                        pass
+                    self.timing_stats.record(time.perf_counter() - target)
+                try:
+                    self.bus.send(message)
+                    self.sent += 1
+                except can.CanError:
+                    self.errors += 1
+                if self.progress_callback and self.sent % 1000 == 0:
+                    self.progress_callback(self.sent)
+        finally:
+            self.duration += time.perf_counter() - start
+        return self.result()
+
+    def result(self):
+        rate = self.sent / self.duration if self.duration > 0 else 0.0
+        return {
+            'sent': self.sent,
+            'errors': self.errors,
+            'duration_s': round(self.duration, 3),
+            'frames_per_s': round(rate, 1),
+            'timing': self.timing_stats.snapshot()
+        }
+
+
+def format_result(result):
+    timing = result['timing']
+    text = (f"回放完成：发送 {result['sent']} 帧，失败 {result['errors']} 帧，"
+            f"耗时 {result['duration_s']} 秒，{result['frames_per_s']} 帧/秒")
+    if timing['count']:
+        text += (f"，时序误差 平均 {timing['mean_us']} us / 标准差 {timing['std_us']} us"
+                 f" / 最大 {timing['max_us']} us")
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CAN日志回放")
+    parser.add_argument("logs", nargs='+', help="日志文件（文本日志或python-can支持的格式）")
+    parser.add_argument("--interface", default="pcan", help="接口类型，如 pcan/socketcan/virtual")
+    parser.add_argument("--channel", default="PCAN_USBBUS1", help="通道")
+    parser.add_argument("--bitrate", default="500000", help="比特率")
+    parser.add_argument("--fd", action="store_true", help="以CAN FD模式打开总线（回放FD帧时需要）")
+    parser.add_argument("--data-bitrate", default="2000000", help="CAN FD数据段比特率")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0表示尽可能快")
+    parser.add_argument("--rx-only", action="store_true", help="只回放文本日志中的接收记录")
+    args = parser.parse_args(argv)
+
+    for path in args.logs:
+        if not os.path.exists(path):
+            print(f"文件不存在：{path}", file=sys.stderr)
+            return 1
+    try:
+        bus = open_bus(args.interface, args.channel, args.bitrate, fd=args.fd, data_bitrate=args.data_bitrate)
+    except Exception as e:
+        print(f"连接失败：{str(e)}", file=sys.stderr)
+        return 1
+
+    directions = ('接收',) if args.rx_only else ('接收', '发送')
+    replayer = CANReplayer(
+        bus, speed=args.speed,
+        progress_callback=lambda n: print(f"\r已发送 {n} 帧", end='', flush=True)
+    )
+
+    try:
+        # 每个文件以自己的第一帧为时间起点，跨天的多个日志之间不会空等
+        for path in args.logs:
+            replayer.replay(iter_log_frames(path, directions))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.shutdown()
+    print()
+    print(format_result(replayer.result()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+"""CAN文本日志离线检索
+
+首次查询时为每个日志文件建立索引（ID → 行偏移，每BLOCK_FRAMES帧一个时间块，记录块内最早/最晚时间和起始偏移），
+保存在同目录的 <日志>.idx 中，以文件大小、修改时间和文件头校验判断是否有效；
+正在写入的日志只对新增部分补建索引。查询通过mmap按偏移直接读取候选行。
+时间范围按块的最早/最晚时间筛选，不假设时间单调（多通道合并、设备时钟、同一文件追加多次会话）。
+
+示例：
+    python can_search.py log/*_received.log --id 18FF50E5
+    python can_search.py log/20240101_received.log --id 123 --data 01XXFF --start "2024-01-01 12:00:00"
+"""
+import os
+import re
+import sys
+import json
+import glob
+import mmap
+import time
+import heapq
+import zlib
+import bisect
+import argparse
+from array import array
+from can_replay import TextLogParser
+from can_trigger import parse_payload_pattern, compile_match
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.idx'
+BLOCK_FRAMES = 4096  # 每隔多少帧记录一个时间块
+HEAD_BYTES = 4096    # 用于识别文件是否被替换/覆盖的文件头长度
+
+# 只取时间前缀和ID，完整解析留给命中的行
+FRAME_PATTERN = re.compile(
+    r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:\.(\d+))?\] (?:接收|发送): ID=0x([0-9A-Fa-f]+),".encode('utf-8'),
+    re.M
+)
+
+
+def parse_time(text):
+    """把 "YYYY-mm-dd HH:MM:SS[.fff]" 解析为时间戳"""
+    if not text:
+        return None
+    second, _, fraction = text.partition('.')
+    value = time.mktime(time.strptime(second.strip(), "%Y-%m-%d %H:%M:%S"))
+    return value + (int(fraction) / 10 ** len(fraction) if fraction else 0.0)
+
+
+class LogIndex:
+    """单个日志文件的索引"""
+    def __init__(self, path):
+        self.path = path
+        self.size = 0        # 已索引到的字节位置（总在行边界上）
+        self.mtime_ns = 0
+        self.head = 0
+        self.ids = {}        # CAN ID → array('Q') 行偏移（升序）
+        self.blocks = []     # [[最早时间戳, 最晚时间戳, 起始偏移]]，每BLOCK_FRAMES帧一项
+        self.frames = 0
+        self._second_cache = (None, 0.0)
+
+    @property
+    def index_path(self):
+        return self.path + INDEX_SUFFIX
+
+    def _timestamp(self, prefix, fraction):
+        cached_prefix, second = self._second_cache
+        if prefix != cached_prefix:
+            second = time.mktime(time.strptime(prefix.decode('ascii'), "%Y-%m-%d %H:%M:%S"))
+            self._second_cache = (prefix, second)
+        return second + (int(fraction) / 10 ** len(fraction) if fraction else 0.0)
+
+    def update(self, mm, start):
+        """从start位置开始索引到最后一个完整行"""
+        end = mm.rfind(b'\n') + 1
+        if end <= start:
+            return
+        ids = self.ids
+        for match in FRAME_PATTERN.finditer(mm, start, end):
+            offset = match.start()
+            can_id = int(match.group(3), 16)
+            offsets = ids.get(can_id)
+            if offsets is None:
+                offsets = ids[can_id] = array('Q')
+            offsets.append(offset)
+            timestamp = self._timestamp(match.group(1), match.group(2))
+            if self.frames % BLOCK_FRAMES == 0:
+                self.blocks.append([timestamp, timestamp, offset])
+            else:
+                block = self.blocks[-1]
+                if timestamp < block[0]:
+                    block[0] = timestamp
+                elif timestamp > block[1]:
+                    block[1] = timestamp
+            self.frames += 1
+        self.size = end
+
+    def save(self):
+        """索引文件：一行JSON头，后接全部偏移（uint64）"""
+        header = {
+            'version': INDEX_VERSION,
+            'size': self.size,
+            'mtime_ns': self.mtime_ns,
+            'head': self.head,
+            'frames': self.frames,
+            'blocks': self.blocks,
+            'ids': {}
+        }
+        body = array('Q')
+        for can_id, offsets in self.ids.items():
+            header['ids'][f"{can_id:X}"] = [len(body), len(offsets)]
+            body.extend(offsets)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(json.dumps(header).encode('utf-8') + b'\n')
+            body.tofile(f)
+        os.replace(tmp_path, self.index_path)
+
+    def load(self):
+        with open(self.index_path, 'rb') as f:
+            header = json.loads(f.readline())
+            if header.get('version') != INDEX_VERSION:
+                raise ValueError("索引版本不匹配")
+            body = array('Q')
+            body.frombytes(f.read())
+        self.size = header['size']
+        self.mtime_ns = header['mtime_ns']
+        self.head = header['head']
+        self.frames = header['frames']
+        self.blocks = [list(block) for block in header['blocks']]
+        self.ids = {int(can_id, 16): body[start:start + count] for can_id, (start, count) in header['ids'].items()}
+
+    def ranges(self, start=None, end=None):
+        """与时间范围有交集的块对应的字节区间[(起, 止)]，相邻块合并"""
+        if (start is None and end is None) or not self.blocks:
+            return [(0, self.size)]
+        ranges = []
+        for i, (earliest, latest, offset) in enumerate(self.blocks):
+            if (start is not None and latest < start) or (end is not None and earliest > end):
+                continue
+            stop = self.blocks[i + 1][2] if i + 1 < len(self.blocks) else self.size
+            if ranges and ranges[-1][1] == offset:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((offset, stop))
+        return ranges
+
+    def offsets(self, can_ids=None, start=None, end=None):
+        """按ID和时间范围返回(候选行偏移（升序，未指定ID时为None）, 字节区间列表)"""
+        ranges = self.ranges(start, end)
+        if can_ids is None:
+            return None, ranges
+        lists = []
+        for can_id in can_ids:
+            offsets = self.ids.get(can_id)
+            if offsets:
+                for low, high in ranges:
+                    lists.append(offsets[bisect.bisect_left(offsets, low):bisect.bisect_left(offsets, high)])
+        return heapq.merge(*lists), ranges
+
+
+def open_index(path, rebuild=False):
+    """加载或建立日志的索引，返回(LogIndex, 状态)，状态为 'cached'/'extended'/'built'"""
+    stat = os.stat(path)
+    index = LogIndex(path)
+    with open(path, 'rb') as f:
+        if stat.st_size == 0:
+            return index, 'built'
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            state = 'built'
+            if not rebuild and os.path.exists(index.index_path):
+                try:
+                    index.load()
+                    if index.size == stat.st_size and index.mtime_ns == stat.st_mtime_ns:
+                        return index, 'cached'
+                    # 日志只追加写入：文件头未变且变长时，只索引新增部分
+                    if index.size < stat.st_size and index.head == zlib.crc32(mm[:min(HEAD_BYTES, index.size)]):
+                        state = 'extended'
+                    else:
+                        index = LogIndex(path)
+                except Exception:
+                    index = LogIndex(path)
+            index.update(mm, index.size)
+            index.head = zlib.crc32(mm[:min(HEAD_BYTES, index.size)])
+    index.mtime_ns = stat.st_mtime_ns
+    try:
+        index.save()
+    except OSError:
+        pass  # 日志目录不可写时只在内存中使用
+    return index, state
+
+
+def search(path, can_ids=None, start=None, end=None, pattern=None, directions=('接收', '发送'),
+           limit=0, index=None):
+    """检索单个日志文件，逐条生成(行文本, can.Message)；index为None时自动加载/建立索引"""
+    if index is None:
+        index, _ = open_index(path)
+    offsets, ranges = index.offsets(can_ids, start, end)
+    match = compile_match(None, *parse_payload_pattern(pattern)) if pattern else None
+    parser = TextLogParser(directions)
+    found = 0
+    with open(path, 'rb') as f:
+        if index.size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if offsets is None:
+                # 未指定ID时按时间块确定的区间顺序扫描
+                offsets = (m.start() for low, high in ranges for m in FRAME_PATTERN.finditer(mm, low, high))
+            for offset in offsets:
+                line = mm[offset:mm.find(b'\n', offset)].decode('utf-8', errors='replace')
+                message = parser.parse(line)
+                if message is None:
+                    continue
+                if start is not None and message.timestamp < start:
+                    continue
+                if end is not None and message.timestamp > end:
+                    continue
+                if match and not match(message):
+                    continue
+                yield line.rstrip('\r'), message
+                found += 1
+                if limit and found >= limit:
+                    return
+
+
+def expand_paths(patterns):
+    """展开通配符（Windows命令行不会自动展开），按文件名排序"""
+    paths = []
+    for pattern in patterns:
+        matched = glob.glob(pattern)
+        paths.extend(sorted(matched) if matched else [pattern])
+    return [path for path in paths if not path.endswith(INDEX_SUFFIX)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="CAN文本日志离线检索")
+    parser.add_argument("logs", nargs='+', help="日志文件，可使用通配符")
+    parser.add_argument("--id", default="", help="CAN ID（十六进制，逗号分隔）")
+    parser.add_argument("--start", default="", help="起始时间，如 \"2024-01-01 12:00:00\"")
+    parser.add_argument("--end", default="", help="结束时间")
+    parser.add_argument("--data", default="", help="数据模式：01XXFF（XX为任意字节）或 0100/FF00（值/掩码）")
+    parser.add_argument("--rx-only", action="store_true", help="只检索接收记录")
+    parser.add_argument("--count", action="store_true", help="只输出匹配数量")
+    parser.add_argument("--limit", type=int, default=0, help="每个文件最多输出的条数，0表示不限")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有索引，重新建立")
+    args = parser.parse_args(argv)
+
+    try:
+        can_ids = [int(item, 16) for item in args.id.replace(',', ' ').split()] or None
+        start = parse_time(args.start)
+        end = parse_time(args.end)
+        if args.data:
+            parse_payload_pattern(args.data.replace(' ', ''))
+    except ValueError as e:
+        print(f"参数错误：{str(e)}", file=sys.stderr)
+        return 1
+    directions = ('接收',) if args.rx_only else ('接收', '发送')
+
+    total = 0
+    begin = time.perf_counter()
+    for path in expand_paths(args.logs):
+        if not os.path.exists(path):
+            print(f"文件不存在：{path}", file=sys.stderr)
+            continue
+        index_start = time.perf_counter()
+        index, state = open_index(path, args.rebuild)
+        index_time = time.perf_counter() - index_start
+        count = 0
+        for line, _ in search(path, can_ids, start, end, args.data.replace(' ', ''), directions,
+                              limit=args.limit, index=index):
+            count += 1
+            if not args.count:
+                print(line)
+        total += count
+        state_text = {'cached': '使用缓存索引', 'extended': '补建索引', 'built': '建立索引'}[state]
+        print(f"{path}: {count} 条（{state_text} {index_time * 1000:.0f} ms）", file=sys.stderr)
+    print(f"共 {total} 条，耗时 {time.perf_counter() - begin:.2f} 秒", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
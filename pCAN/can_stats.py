@@ -0,0 +1,91 @@
+import threading
+
+# 每个ID统计记录的字段下标，记录本身是一个定长list，比对象更省内存
+COUNT, FIRST_TS, LAST_TS, MIN_IV, MAX_IV, LAST_DATA = range(6)
+
+
+def parse_can_filters(text):
+    """解析过滤器配置，返回python-can的can_filters列表，空配置返回None
+
+    格式：以逗号或空格分隔的 ID[:MASK]（十六进制），例如 "100:7F0, 18FF50E5"。
+    省略MASK表示精确匹配；ID大于0x7FF或以x结尾时按扩展帧处理。
+    """
+    filters = []
+    for item in text.replace(',', ' ').split():
+        extended = item.lower().endswith('x')
+        if extended:
+            item = item[:-1]
+        if ':' in item:
+            id_text, mask_text = item.split(':', 1)
+        else:
+            id_text, mask_text = item, None
+        can_id = int(id_text, 16)
+        extended = extended or can_id > 0x7FF
+        max_id = 0x1FFFFFFF if extended else 0x7FF
+        can_mask = int(mask_text, 16) if mask_text else max_id
+        if can_id > max_id or can_mask > max_id:
+            raise ValueError(f"过滤器超出范围: {item}")
+        filters.append({"can_id": can_id, "can_mask": can_mask, "extended": extended})
+    return filters or None
+
+
+def format_can_filters(filters):
+    """把can_filters列表格式化回配置文本"""
+    if not filters:
+        return ""
+    items = []
+    for f in filters:
+        suffix = "x" if f.get("extended") and f["can_id"] <= 0x7FF else ""
+        items.append(f"{f['can_id']:X}:{f['can_mask']:X}{suffix}")
+    return ", ".join(items)
+
+
+class CANIdStatistics:
+    """按CAN ID统计：帧数、速率、最后数据、最小/最大帧间隔
+
+    以(通道, 是否扩展帧, ID)区分：标准帧0x100和扩展帧0x100、不同通道上的同一ID分别统计，
+    帧间隔不会跨通道计算。作为接收流水线的sink在工作线程中整批更新，GUI定时调用snapshot()读取。
+    """
+    def __init__(self):
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def update(self, messages):
+        with self.lock:
+            records = self.records
+            for message in messages:
+                ts = message.timestamp
+                key = (message.channel, message.is_extended_id, message.arbitration_id)
+                record = records.get(key)
+                if record is None:
+                    records[key] = [1, ts, ts, None, None, bytes(message.data)]
+                    continue
+                interval = ts - record[LAST_TS]
+                if record[MIN_IV] is None or interval < record[MIN_IV]:
+                    record[MIN_IV] = interval
+                if record[MAX_IV] is None or interval > record[MAX_IV]:
+                    record[MAX_IV] = interval
+                record[COUNT] += 1
+                record[LAST_TS] = ts
+                record[LAST_DATA] = bytes(message.data)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+    def snapshot(self):
+        """返回按通道、ID排序的统计行：
+        (通道, 是否扩展帧, id, 帧数, 速率fps, 最后数据, 最小间隔ms, 最大间隔ms)
+        """
+        with self.lock:
+            items = [(key, list(record)) for key, record in self.records.items()]
+        # 通道可能是None、编号或名称，按文本排序
+        items.sort(key=lambda item: ("" if item[0][0] is None else str(item[0][0]), item[0][1], item[0][2]))
+        rows = []
+        for (channel, extended, can_id), record in items:
+            span = record[LAST_TS] - record[FIRST_TS]
+            rate = (record[COUNT] - 1) / span if span > 0 else 0.0
+            min_iv = record[MIN_IV] * 1000 if record[MIN_IV] is not None else None
+            max_iv = record[MAX_IV] * 1000 if record[MAX_IV] is not None else None
+            rows.append((channel, extended, can_id, record[COUNT], rate, record[LAST_DATA], min_iv, max_iv))
+        return rows
@@ -0,0 +1,211 @@
+import time
+import threading
+from can_format import TimestampFormatter, format_frames
+
+
+def parse_triggers(text):
+    """解析触发条件，逗号分隔，返回[(名称, 匹配函数)]
+
+    支持的写法（十六进制）：
+        123             ID匹配
+        123=01XXFF      ID加数据匹配，XX为任意字节
+        123=0100/FF00   ID加数据按位掩码匹配（数据值/掩码）
+        *=XX01          任意ID，只按数据匹配
+        ERR             错误帧
+    """
+    triggers = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        if item.upper() == 'ERR':
+            triggers.append((item, lambda message: message.is_error_frame))
+            continue
+        id_text, _, pattern = item.partition('=')
+        id_text = id_text.strip()
+        can_id = None if id_text == '*' else int(id_text, 16)
+        value, mask = parse_payload_pattern(pattern.replace(' ', '')) if pattern else (b"", b"")
+        triggers.append((item, compile_match(can_id, value, mask)))
+    return triggers
+
+
+def parse_payload_pattern(pattern):
+    """把数据模式解析为(值, 掩码)两个等长bytes"""
+    if '/' in pattern:
+        value_text, mask_text = pattern.split('/', 1)
+        value = bytes.fromhex(value_text)
+        mask = bytes.fromhex(mask_text)
+        if len(value) != len(mask):
+            raise ValueError(f"数据值与掩码长度不一致：{pattern}")
+        return value, mask
+    if len(pattern) % 2:
+        raise ValueError(f"数据模式需为完整字节：{pattern}")
+    value = bytearray()
+    mask = bytearray()
+    for i in range(0, len(pattern), 2):
+        byte = pattern[i:i + 2]
+        if byte.upper() == 'XX':
+            value.append(0)
+            mask.append(0)
+        else:
+            value.append(int(byte, 16))
+            mask.append(0xFF)
+    return bytes(value), bytes(mask)
+
+
+def compile_match(can_id, value, mask):
+    """生成匹配函数：can_id为None时不限ID，数据按掩码比较前len(mask)个字节"""
+    length = len(mask)
+    mask_int = int.from_bytes(mask, 'big')
+    value_int = int.from_bytes(value, 'big') & mask_int
+
+    def match(message):
+        if can_id is not None and message.arbitration_id != can_id:
+            return False
+        if not length:
+            return True
+        data = message.data
+        if len(data) < length:
+            return False
+        return int.from_bytes(data[:length], 'big') & mask_int == value_int
+    return match
+
+
+class TriggerCapture:
+    """触发式采集：环形缓冲保留触发前的帧，触发后再记录一段时间，只保存触发窗口
+
+    作为接收流水线的sink在工作线程中整批调用。环形缓冲在创建时按pre_frames预分配，
+    触发时取出其中pre_seconds内的帧，之后post_seconds（按帧时间戳）或post_frames内的帧
+    直接写出；窗口内再次触发则延长窗口。persist_callback接收一批文本行。
+    触发后总线安静下来时没有新帧推动窗口结束，由流水线空闲时调用check_deadline()按本机时钟结束。
+    """
+    def __init__(self, triggers, persist_callback, pre_frames=10000, pre_seconds=5.0,
+                 post_seconds=5.0, post_frames=0, channel_column=False):
+        if pre_frames <= 0:
+            raise ValueError("触发前缓冲帧数必须大于0")
+        self.triggers = triggers
+        self.persist_callback = persist_callback
+        self.pre_frames = pre_frames
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.post_frames = post_frames  # 0 表示只按时间结束
+        self.channel_column = channel_column
+        self.format_timestamp = TimestampFormatter()
+        self.ring = [None] * pre_frames
+        self.pos = 0
+        self.filled = 0
+        self.lock = threading.Lock()
+        self.manual_reason = None
+
+        # 当前触发窗口
+        self.active = False
+        self.deadline = 0.0
+        self.wall_deadline = 0.0  # 与deadline对应的本机单调时钟，供空闲检查使用
+        self.post_count = 0
+        self.window = []
+
+        # 统计
+        self.seen = 0
+        self.saved = 0
+        self.trigger_count = 0
+        self.last_trigger = ""
+
+    def trigger(self, reason="手动触发"):
+        """手动触发（线程安全），在下一批帧到达时生效"""
+        with self.lock:
+            self.manual_reason = reason
+
+    def update(self, messages):
+        with self.lock:
+            manual = self.manual_reason
+            self.manual_reason = None
+            for message in messages:
+                self.seen += 1
+                reason = manual or self._match(message)
+                manual = None
+                if self.active:
+                    self.window.append(message)
+                    self.post_count += 1
+                    if reason:
+                        self._extend(reason, message)
+                    if message.timestamp >= self.deadline or (self.post_frames and self.post_count >= self.post_frames):
+                        self._finish()
+                    elif len(self.window) >= 1000:
+                        self._write_window()
+                elif reason:
+                    self._start(reason, message)
+                else:
+                    self.ring[self.pos] = message
+                    self.pos = (self.pos + 1) % self.pre_frames
+                    if self.filled < self.pre_frames:
+                        self.filled += 1
+
+    def check_deadline(self):
+        """总线空闲时由流水线调用：触发窗口已到期但没有新帧到达时也结束窗口"""
+        with self.lock:
+            if self.active and time.monotonic() >= self.wall_deadline:
+                self._finish()
+
+    def flush(self):
+        """结束正在进行的触发窗口（断开连接或停止触发采集时调用）"""
+        with self.lock:
+            if self.active:
+                self._finish()
+
+    def _match(self, message):
+        for name, match in self.triggers:
+            if match(message):
+                return name
+        return None
+
+    def _start(self, reason, message):
+        # 从环形缓冲中按时间顺序取出触发前的帧
+        start = (self.pos - self.filled) % self.pre_frames
+        pre = [self.ring[(start + i) % self.pre_frames] for i in range(self.filled)]
+        if self.pre_seconds:
+            earliest = message.timestamp - self.pre_seconds
+            pre = [m for m in pre if m.timestamp >= earliest]
+        # 缓冲区不重新分配，只重置计数，旧引用会被后续帧覆盖
+        self.pos = 0
+        self.filled = 0
+
+        self.trigger_count += 1
+        self.last_trigger = reason
+        self.active = True
+        self.post_count = 0
+        self.deadline = message.timestamp + self.post_seconds
+        self.wall_deadline = time.monotonic() + self.post_seconds
+        self._emit([f"=== 触发 #{self.trigger_count}：{reason}，触发前 {len(pre)} 帧 ==="])
+        self.window = pre
+        self.window.append(message)
+
+    def _extend(self, reason, message):
+        self.deadline = message.timestamp + self.post_seconds
+        self.wall_deadline = time.monotonic() + self.post_seconds
+        self.post_count = 0
+        self.last_trigger = reason
+
+    def _finish(self):
+        self._write_window()
+        self._emit([f"=== 触发 #{self.trigger_count} 结束 ==="])
+        self.active = False
+
+    def _write_window(self):
+        if self.window:
+            self._emit(format_frames(self.window, self.format_timestamp, self.channel_column))
+            self.saved += len(self.window)
+            self.window = []
+
+    def _emit(self, lines):
+        self.persist_callback(lines)
+
+    def stats(self):
+        return {
+            'seen': self.seen,
+            'saved': self.saved,
+            'triggers': self.trigger_count,
+            'active': self.active,
+            'last_trigger': self.last_trigger,
+            'buffered': self.filled,
+            'saved_pct': round(self.saved * 100 / self.seen, 2) if self.seen else 0.0
+        }
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import queue
+import ftplib
+import threading
+from ftplib import FTP
+
+UPLOADED_MANIFEST = ".uploaded"  # 每个日志目录下记录已上传文件名和大小的清单
+
+
+def load_ftp_config(config_file):
+    """读取FTP备份工具（fileupload/file_upload.py）的配置文件，不存在时返回None"""
+    if not os.path.exists(config_file):
+        return None
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return {
+        'ftp_config': config['ftp_config'],
+        'remote_base_dir': config.get('remote_base_dir', '/')
+    }
+
+
+class LogUploadService:
+    """日志分段上传服务：单个后台线程 + 有界队列
+
+    只上传已经关闭（滚动或断开时关闭）的日志分段，不会与接收线程争用正在写入的文件。
+    上传逻辑沿用fileupload/file_upload.py的做法（主动模式、超时、失败重试），
+    FTP连接在连续上传之间复用，已上传的文件记录在目录下的.uploaded清单中实现增量上传。
+    """
+    def __init__(self, ftp_config, remote_base_dir="/", log_queue=None,
+                 max_pending=256, max_retries=3, idle_timeout=60):
+        self.ftp_config = ftp_config
+        self.remote_base_dir = remote_base_dir.rstrip('/')
+        self.log_queue = log_queue
+        self.max_retries = max_retries
+        self.idle_timeout = idle_timeout  # 空闲多久后断开FTP连接（秒）
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.queued = set()  # 已在队列中的路径，避免重复入队
+        self.lock = threading.Lock()
+        self.ftp = None
+        self.remote_dir = None
+        self.thread = None
+        self.running = False
+        self.uploaded_count = 0
+        self.failed_count = 0
+        self.rejected_count = 0  # 队列满时未入队的分段（下次scan_directory时补传）
+
+    def log(self, message):
+        message = f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {message}"
+        if self.log_queue:
+            self.log_queue.put(message)
+        else:
+            print(message)
+
+    def start(self):
+        """启动上传线程（重复调用不会创建多个线程）"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5.0):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+        self._disconnect()
+
+    def submit(self, path):
+        """提交一个已关闭的日志分段，队列满时返回False"""
+        with self.lock:
+            if path in self.queued:
+                return True
+            try:
+                self.pending.put_nowait(path)
+            except queue.Full:
+                self.rejected_count += 1
+                self.log(f"上传队列已满，稍后补传: {path}")
+                return False
+            self.queued.add(path)
+        return True
+
+    def scan_directory(self, directory, suffix=".log", skip_paths=()):
+        """把目录中未上传或上传后又有变化的分段加入队列
+
+        skip_paths为当前正在写入的分段，它们在滚动关闭时再提交。
+        """
+        if not os.path.isdir(directory):
+            return 0
+        uploaded = self._load_manifest(directory)
+        skip = {os.path.abspath(path) for path in skip_paths}
+        count = 0
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if not name.endswith(suffix) or os.path.abspath(path) in skip:
+                continue
+            if uploaded.get(name) == os.path.getsize(path):
+                continue
+            if self.submit(path):
+                count += 1
+        return count
+
+    def _load_manifest(self, directory):
+        """读取清单，返回 文件名 → 上传时的大小"""
+        manifest = os.path.join(directory, UPLOADED_MANIFEST)
+        uploaded = {}
+        if not os.path.exists(manifest):
+            return uploaded
+        with open(manifest, 'r', encoding='utf-8') as f:
+            for line in f:
+                name, _, size = line.rstrip("\n").rpartition("\t")
+                if name and size.isdigit():
+                    uploaded[name] = int(size)
+        return uploaded
+
+    def _mark_uploaded(self, path, size):
+        manifest = os.path.join(os.path.dirname(path), UPLOADED_MANIFEST)
+        with open(manifest, 'a', encoding='utf-8') as f:
+            f.write(f"{os.path.basename(path)}\t{size}\n")
+
+    def _connect(self):
+        ftp = FTP()
+        ftp.connect(self.ftp_config['host'], int(self.ftp_config['port']), timeout=60)
+        ftp.login(self.ftp_config['username'], self.ftp_config['password'])
+        ftp.set_pasv(False)  # 与备份工具一致，使用主动模式
+        ftp.sock.settimeout(300)
+        self.ftp = ftp
+        self.remote_dir = None
+        self.log(f"已连接FTP服务器: {self.ftp_config['host']}:{self.ftp_config['port']}")
+
+    def _disconnect(self):
+        if self.ftp:
+            try:
+                self.ftp.quit()
+            except Exception:
+                pass
+            self.ftp = None
+            self.remote_dir = None
+
+    def _change_remote_dir(self, remote_dir):
+        if self.remote_dir == remote_dir:
+            return
+        try:
+            self.ftp.cwd(remote_dir)
+        except ftplib.error_perm:
+            self.ftp.mkd(remote_dir)
+            self.ftp.cwd(remote_dir)
+            self.log(f"创建远程目录: {remote_dir}")
+        self.remote_dir = remote_dir
+
+    def _upload(self, path):
+        """上传单个文件，失败时重连并重试，成功返回上传的字节数，失败返回None"""
+        folder_name = os.path.basename(os.path.dirname(path))
+        remote_dir = f"{self.remote_base_dir}/{folder_name}"
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if not self.ftp:
+                    self._connect()
+                self._change_remote_dir(remote_dir)
+                with open(path, 'rb') as f:
+                    size = os.fstat(f.fileno()).st_size
+                    self.ftp.storbinary(f'STOR {os.path.basename(path)}', f)
+                return size
+            except ftplib.all_errors as e:
+                self._disconnect()
+                if attempt >= self.max_retries:
+                    self.log(f"上传文件 {path} 失败，已达最大重试次数: {str(e)}")
+                    return None
+                self.log(f"上传文件 {path} 失败，正在重试 ({attempt}/{self.max_retries}): {str(e)}")
+                time.sleep(2)
+        return None
+
+    def _run(self):
+        last_activity = time.time()
+        while self.running or not self.pending.empty():
+            try:
+                path = self.pending.get(timeout=1.0)
+            except queue.Empty:
+                if self.ftp and time.time() - last_activity > self.idle_timeout:
+                    self._disconnect()
+                continue
+            with self.lock:
+                self.queued.discard(path)
+            if not os.path.exists(path):
+                continue
+            size = self._upload(path)
+            if size is not None:
+                self._mark_uploaded(path, size)
+                self.uploaded_count += 1
+                self.log(f"已上传文件: {path}")
+            else:
+                self.failed_count += 1
+            last_activity = time.time()
@@ -3,10 +3,20 @@ import can
 import sys  # 用于获取程序默认路径
 import time
 import datetime
+import queue
 import threading
-import uploadftp
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, filedialog
+from can_pipeline import CANReceivePipeline, open_bus
+from can_logservice import LogService
+from can_periodic import PeriodicEntry, PeriodicScheduler
+from can_stats import CANIdStatistics, parse_can_filters
+from can_metrics import CANMetrics, MetricsCSVDumper
+from can_replay import CANReplayer, iter_log_frames, format_result
+from can_uploader import LogUploadService, load_ftp_config
+from can_dbc import DBCDecoder
+from can_format import format_frames, check_payload_length
+from can_trigger import TriggerCapture, parse_triggers
+from tkinter import ttk, scrolledtext, messagebox, filedialog, simpledialog
 
 class CAN_GUI:
     def __init__(self, root):
@@ -25,16 +35,57 @@ class CAN_GUI:
         # 初始化核心变量
         self.running = False  # CAN总线运行状态
         self.can_bus = None   # CAN总线实例
-        self.receive_thread = None  # 接收线程
+        self.pipeline = None  # 接收流水线（接收线程+格式化/持久化线程）
+        self.poll_after_id = None  # 显示阶段定时任务
+        self.metrics_after_id = None  # 状态栏统计刷新定时任务
+        self.periodic_scheduler = None  # 周期发送调度器
+        self.replayer = None  # 日志回放
+        self.dbc_decoder = None  # DBC信号解码器（可选，需要cantools）
+        
+        # 触发采集：环形缓冲保留触发前的帧，只把触发窗口写入trigger日志
+        self.trigger_capture = None
+        self.received_persist = None  # 接收日志的持久化回调，"仅保存触发窗口"时从流水线摘下
+        self.trigger_var = tk.StringVar(value="")
+        self.pre_frames_var = tk.StringVar(value="10000")
+        self.pre_seconds_var = tk.StringVar(value="5")
+        self.post_seconds_var = tk.StringVar(value="5")
+        self.trigger_only_var = tk.BooleanVar(value=True)
+        
+        # 后台线程（上传、日志写入）产生的状态信息，由Tk主循环取出显示
+        self.status_queue = queue.Queue()
+        
+        # 日志上传服务（整个程序只有一个上传线程，不随连接/断开重复创建）
+        self.uploader = None
+        
+        # 异步日志服务：状态日志和接收日志都只入队，文件I/O在后台写线程中完成
+        self.log_service = None
         
         # 通信参数配置变量
         self.interface_var = tk.StringVar(value="pcan")
         self.channel_var = tk.StringVar(value="PCAN_USBBUS1")
         self.bitrate_var = tk.StringVar(value="100000")
+        self.filter_var = tk.StringVar(value="")  # 驱动层接收过滤器，如 "100:7F0, 18FF50E5"
+        self.fd_var = tk.BooleanVar(value=False)  # CAN FD模式
+        self.data_bitrate_var = tk.StringVar(value="2000000")  # CAN FD数据段比特率
+        self.brs_var = tk.BooleanVar(value=True)  # CAN FD帧数据段切换到数据段比特率
+        self.bus_fd = False  # 当前连接是否以CAN FD模式打开
+        self.send_channel_var = tk.StringVar(value="")  # 多通道连接时手动/周期发送使用的通道
+        
+        # 按ID统计
+        self.id_stats = CANIdStatistics()
+        self.id_view_var = tk.BooleanVar(value=False)
+        self.id_table_after_id = None
+        
+        # 总线负载/延迟统计
+        self.metrics = None
+        self.metrics_dumper = None
+        self.metrics_csv_var = tk.BooleanVar(value=False)
+        self.conn_info = ""
         
         # 发送参数变量
         self.can_id_var = tk.StringVar(value="00F")
         self.data_var = tk.StringVar(value="24 24 00 00 00 01 24 24")
+        self.extended_var = tk.BooleanVar(value=False)  # 29位扩展帧（ID大于0x7FF时自动使用）
         
         # 创建菜单栏
         self.create_menu()
@@ -42,6 +93,10 @@ class CAN_GUI:
         # 创建主界面组件
         self.create_widgets()
         
+        self.start_log_service()
+        self.init_uploader()
+        self.root.after(500, self.poll_status_queue)
+        
         self.root.protocol("WM_DELETE_WINDOW", self.on_close) # 窗口关闭时的资源清理
     
     def _get_default_program_dir(self):
@@ -63,6 +118,7 @@ class CAN_GUI:
         
         if selected_dir:
             self.local_path_var.set(selected_dir)
+            self.start_log_service()
             timestamp = time.strftime("%H:%M:%S")
             success_msg = f"[{timestamp}] 本地路径已设置为：{selected_dir}"
             self.running_status_display(success_msg)
@@ -85,6 +141,23 @@ class CAN_GUI:
         setting_menu.add_command(label="本地路径设置", command=self.show_path_settings)
         menubar.add_cascade(label="设置", menu=setting_menu)
         
+        tool_menu = tk.Menu(menubar, tearoff=0)
+        tool_menu.add_command(label="周期发送", command=self.show_periodic_send)
+        tool_menu.add_command(label="日志回放", command=self.start_replay)
+        tool_menu.add_command(label="停止回放", command=self.stop_replay)
+        tool_menu.add_separator()
+        tool_menu.add_command(label="加载DBC", command=self.load_dbc)
+        tool_menu.add_command(label="DBC解码ID订阅", command=self.set_dbc_subscription)
+        tool_menu.add_command(label="卸载DBC", command=self.unload_dbc)
+        tool_menu.add_separator()
+        tool_menu.add_command(label="接收流水线统计", command=self.show_pipeline_metrics)
+        tool_menu.add_checkbutton(label="定时导出统计CSV", variable=self.metrics_csv_var, command=self.toggle_metrics_csv)
+        tool_menu.add_separator()
+        tool_menu.add_command(label="触发采集设置", command=self.show_trigger_settings)
+        tool_menu.add_command(label="手动触发", command=self.manual_trigger)
+        tool_menu.add_command(label="停止触发采集", command=self.stop_trigger_capture)
+        menubar.add_cascade(label="工具", menu=tool_menu)
+        
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="关于", command=self.show_about)
         menubar.add_cascade(label="帮助", menu=help_menu)
@@ -95,7 +168,7 @@ class CAN_GUI:
         """弹出通信设置对话框"""
         dialog = tk.Toplevel(self.root)
         dialog.title("通信设置")
-        dialog.geometry("400x200")
+        dialog.geometry("420x360")
         dialog.resizable(False, False)
         dialog.transient(self.root)
         dialog.grab_set()
@@ -114,15 +187,28 @@ class CAN_GUI:
         interface_combo.grid(row=0, column=1, sticky=tk.W, pady=5, padx=5)
         
         ttk.Label(frame, text="通道:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        ttk.Entry(frame,textvariable=self.channel_var,width=15).grid(row=1, column=1, sticky=tk.W, pady=5, padx=5)
+        ttk.Entry(frame,textvariable=self.channel_var,width=30).grid(row=1, column=1, sticky=tk.W, pady=5, padx=5)
+        ttk.Label(frame, text="多通道用逗号分隔，混用接口写成 接口:通道").grid(row=7, column=0, columnspan=2, sticky=tk.W)
         
         ttk.Label(frame, text="比特率:").grid(row=2, column=0, sticky=tk.W, pady=5)
         bitrate_combo = ttk.Combobox(frame,textvariable=self.bitrate_var,width=10,state="readonly")
         bitrate_combo['values'] = ["100000", "125000", "250000", "500000", "1000000"]
         bitrate_combo.grid(row=2, column=1, sticky=tk.W, pady=5, padx=5)
         
+        ttk.Checkbutton(frame, text="CAN FD", variable=self.fd_var).grid(row=3, column=0, sticky=tk.W, pady=5)
+        ttk.Checkbutton(frame, text="比特率切换(BRS)", variable=self.brs_var).grid(row=3, column=1, sticky=tk.W, pady=5, padx=5)
+        
+        ttk.Label(frame, text="数据段比特率:").grid(row=4, column=0, sticky=tk.W, pady=5)
+        data_bitrate_combo = ttk.Combobox(frame,textvariable=self.data_bitrate_var,width=10)
+        data_bitrate_combo['values'] = ["1000000", "2000000", "4000000", "5000000", "8000000"]
+        data_bitrate_combo.grid(row=4, column=1, sticky=tk.W, pady=5, padx=5)
+        
+        ttk.Label(frame, text="过滤器:").grid(row=5, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(frame,textvariable=self.filter_var,width=30).grid(row=5, column=1, sticky=tk.W, pady=5, padx=5)
+        ttk.Label(frame, text="ID[:掩码]，十六进制，逗号分隔，留空接收全部").grid(row=6, column=0, columnspan=2, sticky=tk.W)
+        
         btn_frame = ttk.Frame(frame)
-        btn_frame.grid(row=3, column=0, columnspan=2, pady=10)
+        btn_frame.grid(row=8, column=0, columnspan=2, pady=10)
         ttk.Button(btn_frame, text="确定", command=dialog.destroy).pack(pady=5)
         
         dialog.update_idletasks()
@@ -148,6 +234,13 @@ class CAN_GUI:
         
         self.connect_btn = ttk.Button(conn_frame,text="连接",command=self.toggle_connection)
         self.connect_btn.pack(side=tk.LEFT, padx=10, pady=5)
+        
+        ttk.Checkbutton(
+            conn_frame,
+            text="按ID统计视图",
+            variable=self.id_view_var,
+            command=self.toggle_id_view
+        ).pack(side=tk.LEFT, padx=10, pady=5)
 
         # 消息显示区
         transfer_display_frame = ttk.LabelFrame(main_frame, text="消息显示", padding="10")
@@ -162,6 +255,15 @@ class CAN_GUI:
         self.message_display.pack(fill=tk.BOTH, expand=True)
         self.message_display.config(state=tk.DISABLED)
         
+        # 按ID统计表（与消息显示区二选一）
+        columns = ("id", "count", "rate", "data", "min_iv", "max_iv")
+        self.id_table = ttk.Treeview(transfer_display_frame, columns=columns, show="headings", height=15)
+        for column, text, width in zip(columns, ("ID", "帧数", "速率(帧/秒)", "最后数据", "最小间隔(ms)", "最大间隔(ms)"),
+                                       (130, 80, 90, 240, 90, 90)):
+            self.id_table.heading(column, text=text)
+            self.id_table.column(column, width=width, anchor=tk.W)
+        self.id_table_items = {}
+        
         self.running_status = scrolledtext.ScrolledText(
             transfer_display_frame, 
             wrap=tk.WORD, 
@@ -189,11 +291,25 @@ class CAN_GUI:
             width=40
         ).grid(row=0, column=3, sticky=tk.W, pady=5, padx=5)
         
+        ttk.Checkbutton(
+            send_frame,
+            text="扩展帧",
+            variable=self.extended_var
+        ).grid(row=0, column=4, sticky=tk.W, pady=5)
+        
+        self.send_channel_combo = ttk.Combobox(
+            send_frame,
+            textvariable=self.send_channel_var,
+            width=14,
+            state="readonly"
+        )
+        self.send_channel_combo.grid(row=0, column=5, sticky=tk.W, pady=5)
+        
         ttk.Button(
             send_frame, 
             text="发送", 
             command=self.can_send_guimessage
-        ).grid(row=0, column=4, padx=10, pady=5)
+        ).grid(row=0, column=6, padx=10, pady=5)
         
         # 状态栏
         self.status_var = tk.StringVar(
@@ -208,40 +324,66 @@ class CAN_GUI:
         status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
         # 配置发送区网格自适应
-        for col in range(5):
+        for col in range(7):
             send_frame.grid_columnconfigure(col, weight=1)
     
     def toggle_connection(self):
         """切换CAN总线连接状态：连接/断开"""
         if not self.running:
             try:
-                self.can_bus = can.interface.Bus(
-                    interface=self.interface_var.get(),
-                    channel=self.channel_var.get(),
-                    bitrate=int(self.bitrate_var.get())
+                can_filters = parse_can_filters(self.filter_var.get())
+                fd = self.fd_var.get()
+                self.can_bus = open_bus(
+                    self.interface_var.get(),
+                    self.channel_var.get(),
+                    self.bitrate_var.get(),
+                    can_filters=can_filters,
+                    fd=fd,
+                    data_bitrate=self.data_bitrate_var.get()
                 )
+                self.bus_fd = fd
+                channel_names = getattr(self.can_bus, 'names', [self.channel_var.get()])
+                self.send_channel_combo['values'] = channel_names
+                self.send_channel_var.set(channel_names[0])
                 
                 self.running = True
                 self.connect_btn.config(text="断开")
                 timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                conn_info = f"已连接：{self.interface_var.get()} | 通道：{self.channel_var.get()} | 比特率：{self.bitrate_var.get()} bps"
+                conn_info = f"已连接：{self.interface_var.get()} | 通道：{', '.join(channel_names)} | 比特率：{self.bitrate_var.get()} bps"
+                if fd:
+                    conn_info += f" | CAN FD 数据段：{self.data_bitrate_var.get()} bps"
+                if can_filters:
+                    conn_info += f" | 过滤器：{len(can_filters)}条"
+                self.conn_info = conn_info
                 self.status_var.set(
                     f"状态：{conn_info} | 本地路径：{self.local_path_var.get()[:50]}"
                 )
                 self.running_status_display(f"[{timestamp}] {conn_info}")
                 
-                self.receive_thread = threading.Thread(
-                    target=self.can_receive_messages,
-                    daemon=True
-                )
-                self.receive_thread.start()
+                # 每次调用时取当前的日志服务：连接期间修改本地路径会重启日志服务
+                self.received_persist = lambda lines: self.log_service.write_lines('received', lines)
+                self.pipeline = CANReceivePipeline(self.can_bus, persist_callback=self.received_persist)
+                self.id_stats.clear()
+                self.id_table.delete(*self.id_table.get_children())
+                self.id_table_items.clear()
+                self.pipeline.add_sink(self.id_stats.update)
+                self.metrics = CANMetrics(self.bitrate_var.get(), self.pipeline, self.log_service,
+                                          data_bitrate=self.data_bitrate_var.get() if fd else None)
+                self.pipeline.add_sink(self.metrics.update)
+                self.pipeline.display_enabled = not self.id_view_var.get()
+                self.pipeline.decoder = self.dbc_decoder
+                if self.trigger_capture:
+                    self.attach_trigger_capture()
+                self.pipeline.start()
+                self.poll_after_id = self.root.after(50, self.poll_pipeline)
+                self.metrics_after_id = self.root.after(1000, self.update_metrics_status)
+                self.toggle_metrics_csv()
                 
-                self.upload_thread = threading.Thread(
-                    target=uploadftp.upload,
-                    daemon=True
+                pipeline = self.pipeline
+                self.periodic_scheduler = PeriodicScheduler(
+                    self.can_bus,
+                    error_callback=lambda text: pipeline.post_status(f"[{time.strftime('%H:%M:%S')}] {text}")
                 )
-                self.upload_thread.start()
-                
                 
             except Exception as e:
                 timestamp = time.strftime("%H:%M:%S")
@@ -251,9 +393,16 @@ class CAN_GUI:
         
         else:
             self.running = False
+            self.stop_replay()
+            self.stop_periodic_send()
+            self.stop_pipeline()
+            self.stop_metrics_csv()
             if self.can_bus:
                 self.can_bus.shutdown()
                 self.can_bus = None
+            self.bus_fd = False
+            self.send_channel_combo['values'] = []
+            self.send_channel_var.set("")
             
             self.connect_btn.config(text="连接")
             self.status_var.set(
@@ -262,23 +411,493 @@ class CAN_GUI:
             timestamp = time.strftime("%H:%M:%S")
             self.running_status_display(f"[{timestamp}] CAN总线已断开")
     
-    def can_receive_messages(self):
-        """接收CAN数据线程：持续接收并显示"""
-        while self.running and self.can_bus:
+    def init_uploader(self):
+        """读取FTP备份工具的配置，启动日志上传服务并补传未上传的历史分段"""
+        config_file = os.path.join(self.default_program_dir, 'ftp_backup_config.json')
+        timestamp = time.strftime("%H:%M:%S")
+        try:
+            config = load_ftp_config(config_file)
+        except Exception as e:
+            self.running_status_display(f"[{timestamp}] FTP配置读取失败：{str(e)}，日志上传未启用")
+            return
+        if not config:
+            self.running_status_display(f"[{timestamp}] 未找到FTP配置 {config_file}，日志上传未启用")
+            return
+        
+        self.uploader = LogUploadService(
+            config['ftp_config'],
+            config['remote_base_dir'],
+            log_queue=self.status_queue
+        )
+        self.uploader.start()
+        # 只跳过正在写入的分段，留到滚动关闭时再上传；之前的会话当天已关闭的分段照常补传
+        self.uploader.scan_directory(
+            os.path.join(self.local_path_var.get(), 'log'),
+            skip_paths=self.log_service.open_paths() if self.log_service else ()
+        )
+    
+    def start_log_service(self):
+        """按当前本地路径（重新）启动日志服务"""
+        if self.log_service:
+            self.log_service.close()
+        self.log_service = LogService(
+            os.path.join(self.local_path_var.get(), 'log'),
+            on_rotate=self.submit_for_upload
+        )
+        self.log_service.error_callback = self.status_queue.put
+        self.log_service.start()
+        if self.metrics:
+            self.metrics.log_service = self.log_service
+    
+    def submit_for_upload(self, path):
+        """日志分段关闭后提交给上传服务（在日志写线程中调用）"""
+        if self.uploader:
+            self.uploader.submit(path)
+    
+    def poll_status_queue(self):
+        """把后台线程（上传、日志写入）的状态信息转到运行状态区"""
+        while True:
             try:
-                message = self.can_bus.recv(1.0)
-                if message:
-                    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                    can_id = f"0x{message.arbitration_id:X}"
-                    data_hex = " ".join([f"{b:02X}" for b in message.data])
-                    self.receive_messages_display(
-                        f"[{timestamp}] 接收: ID={can_id}, 数据={data_hex}, 长度={message.dlc}字节"
-                    )
+                message = self.status_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.running_status_display(message)
+        self.root.after(500, self.poll_status_queue)
+    
+    def poll_pipeline(self):
+        """显示阶段：在Tk主循环中批量取出接收流水线的结果并整批插入"""
+        if not self.pipeline:
+            return
+        messages, statuses = self.pipeline.drain_display()
+        if messages:
+            self.message_display.config(state=tk.NORMAL)
+            self.message_display.insert(tk.END, "\n".join(messages) + "\n")
+            self.message_display.see(tk.END)
+            self.message_display.config(state=tk.DISABLED)
+        for status in statuses:
+            self.running_status_display(status)
+        if self.running:
+            self.poll_after_id = self.root.after(50, self.poll_pipeline)
+    
+    def update_metrics_status(self):
+        """每秒在状态栏刷新总线负载、帧率、延迟和队列深度"""
+        self.metrics_after_id = None
+        if not self.running or not self.metrics:
+            return
+        self.status_var.set(f"状态：{self.conn_info} | {self.metrics.summary()}")
+        self.metrics_after_id = self.root.after(1000, self.update_metrics_status)
+    
+    def toggle_metrics_csv(self):
+        """按菜单勾选状态启动/停止统计CSV定时导出（写入log目录）"""
+        if self.metrics_csv_var.get() and self.running and self.metrics and not self.metrics_dumper:
+            log_timestamp = datetime.datetime.now().strftime("%Y%m%d")
+            path = os.path.join(self.local_path_var.get(), 'log', f"{log_timestamp}_metrics.csv")
+            self.metrics_dumper = MetricsCSVDumper(self.metrics, path)
+            self.metrics_dumper.start()
+            timestamp = time.strftime("%H:%M:%S")
+            self.running_status_display(f"[{timestamp}] 统计数据将每{self.metrics_dumper.interval:g}秒写入：{path}")
+        elif not self.metrics_csv_var.get():
+            self.stop_metrics_csv()
+    
+    def stop_metrics_csv(self):
+        if self.metrics_dumper:
+            self.metrics_dumper.stop()
+            self.metrics_dumper = None
+    
+    def toggle_id_view(self):
+        """在滚动消息显示和按ID统计表之间切换"""
+        if self.id_view_var.get():
+            self.message_display.pack_forget()
+            self.id_table.pack(fill=tk.BOTH, expand=True, before=self.running_status)
+            self.refresh_id_table()
+        else:
+            if self.id_table_after_id:
+                self.root.after_cancel(self.id_table_after_id)
+                self.id_table_after_id = None
+            self.id_table.pack_forget()
+            self.message_display.pack(fill=tk.BOTH, expand=True, before=self.running_status)
+        if self.pipeline:
+            # 统计视图下不再生成显示行，减轻工作线程和Tk主循环负担
+            self.pipeline.display_enabled = not self.id_view_var.get()
+    
+    def refresh_id_table(self):
+        """定时刷新按ID统计表，只更新已有行、按需插入新行"""
+        for index, row in enumerate(self.id_stats.snapshot()):
+            channel, extended, can_id, count, rate, data, min_iv, max_iv = row
+            id_text = f"0x{can_id:X}" + (" EXT" if extended else "")
+            if channel is not None:
+                id_text = f"{channel}: {id_text}"
+            values = (
+                id_text, count, f"{rate:.1f}", data.hex(' ').upper(),
+                f"{min_iv:.2f}" if min_iv is not None else "-",
+                f"{max_iv:.2f}" if max_iv is not None else "-"
+            )
+            key = (channel, extended, can_id)
+            item = self.id_table_items.get(key)
+            if item is None:
+                self.id_table_items[key] = self.id_table.insert("", index, values=values)
+            else:
+                self.id_table.item(item, values=values)
+        self.id_table_after_id = self.root.after(500, self.refresh_id_table)
+    
+    def stop_pipeline(self):
+        """停止接收流水线，显示剩余数据并输出统计摘要"""
+        if not self.pipeline:
+            return
+        if self.poll_after_id:
+            self.root.after_cancel(self.poll_after_id)
+            self.poll_after_id = None
+        if self.metrics_after_id:
+            self.root.after_cancel(self.metrics_after_id)
+            self.metrics_after_id = None
+        self.pipeline.stop()
+        pipeline = self.pipeline
+        self.poll_pipeline()
+        self.pipeline = None
+        # 关闭当前接收日志分段，使其可以被上传
+        self.log_service.close_stream('received')
+        if self.trigger_capture:
+            # 触发设置保留到下次连接，只结束当前窗口
+            self.trigger_capture.flush()
+            self.log_service.close_stream('trigger')
+        metrics = pipeline.get_metrics()
+        timestamp = time.strftime("%H:%M:%S")
+        self.running_status_display(
+            f"[{timestamp}] 接收统计：共{metrics['received']}帧，丢弃{metrics['dropped']}帧，"
+            f"最大队列深度{metrics['max_queue_depth']}"
+        )
+    
+    def load_dbc(self):
+        """加载DBC文件，解码结果显示在消息行后（解码在流水线工作线程中进行）"""
+        path = filedialog.askopenfilename(
+            title="选择DBC文件",
+            initialdir=self.local_path_var.get(),
+            filetypes=[("DBC文件", "*.dbc"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        try:
+            decoder = DBCDecoder(path)
+        except Exception as e:
+            timestamp = time.strftime("%H:%M:%S")
+            messagebox.showerror("DBC加载失败", str(e))
+            self.running_status_display(f"[{timestamp}] DBC加载失败：{str(e)}")
+            return
+        self.dbc_decoder = decoder
+        if self.pipeline:
+            self.pipeline.decoder = decoder
+        timestamp = time.strftime("%H:%M:%S")
+        self.running_status_display(f"[{timestamp}] 已加载DBC：{path}，共{len(decoder.table)}个报文")
+    
+    def set_dbc_subscription(self):
+        """设置需要解码的CAN ID（十六进制，逗号分隔，留空解码全部）"""
+        if not self.dbc_decoder:
+            messagebox.showwarning("DBC解码", "请先加载DBC文件")
+            return
+        current = ", ".join(f"{can_id:X}" for can_id in sorted(self.dbc_decoder.subscribed or ()))
+        text = simpledialog.askstring("DBC解码ID订阅", "需要解码的CAN ID（十六进制，逗号分隔，留空解码全部）：",
+                                      initialvalue=current, parent=self.root)
+        if text is None:
+            return
+        try:
+            can_ids = [int(item, 16) for item in text.replace(',', ' ').split()]
+        except ValueError as e:
+            messagebox.showerror("格式错误", f"CAN ID格式错误：{str(e)}")
+            return
+        self.dbc_decoder.subscribe(can_ids)
+        timestamp = time.strftime("%H:%M:%S")
+        self.running_status_display(f"[{timestamp}] DBC解码订阅：{len(self.dbc_decoder.active)}个报文")
+    
+    def unload_dbc(self):
+        self.dbc_decoder = None
+        if self.pipeline:
+            self.pipeline.decoder = None
+    
+    def show_trigger_settings(self):
+        """弹出触发采集设置对话框：触发条件、触发前后的窗口"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("触发采集设置")
+        dialog.geometry("460x330")
+        dialog.resizable(False, False)
+        dialog.transient(self.root)
+        dialog.grab_set()
+        
+        frame = ttk.Frame(dialog, padding="20")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text="触发条件:").grid(row=0, column=0, sticky=tk.W, pady=5)
+        ttk.Entry(frame,textvariable=self.trigger_var,width=32).grid(row=0, column=1, sticky=tk.W, pady=5, padx=5)
+        ttk.Label(frame, text="逗号分隔：ID、ID=01XXFF、ID=0100/FF00、*=数据、ERR(错误帧)").grid(row=1, column=0, columnspan=2, sticky=tk.W)
+        
+        fields = [("触发前帧数:", self.pre_frames_var), ("触发前时长(秒):", self.pre_seconds_var),
+                  ("触发后时长(秒):", self.post_seconds_var)]
+        for row, (label, var) in enumerate(fields, start=2):
+            ttk.Label(frame, text=label).grid(row=row, column=0, sticky=tk.W, pady=5)
+            ttk.Entry(frame,textvariable=var,width=10).grid(row=row, column=1, sticky=tk.W, pady=5, padx=5)
+        ttk.Checkbutton(frame, text="仅保存触发窗口（不再写完整接收日志）",
+                        variable=self.trigger_only_var).grid(row=5, column=0, columnspan=2, sticky=tk.W, pady=5)
+        
+        def start():
+            if self.start_trigger_capture():
+                dialog.destroy()
+        
+        btn_frame = ttk.Frame(frame)
+        btn_frame.grid(row=6, column=0, columnspan=2, pady=10)
+        ttk.Button(btn_frame, text="启动", command=start).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        
+        dialog.update_idletasks()
+        x = (self.root.winfo_width()//2 - dialog.winfo_width()//2) + self.root.winfo_x()
+        y = (self.root.winfo_height()//2 - dialog.winfo_height()//2) + self.root.winfo_y()
+        dialog.geometry(f"+{x}+{y}")
+        
+        self.root.wait_window(dialog)
+    
+    def start_trigger_capture(self):
+        """按当前设置创建触发采集，已连接时立即接入流水线"""
+        try:
+            triggers = parse_triggers(self.trigger_var.get())
+            capture = TriggerCapture(
+                triggers,
+                persist_callback=lambda lines: self.log_service.write_lines('trigger', lines),
+                pre_frames=int(self.pre_frames_var.get()),
+                pre_seconds=float(self.pre_seconds_var.get() or 0),
+                post_seconds=float(self.post_seconds_var.get())
+            )
+        except ValueError as e:
+            messagebox.showerror("触发条件错误", str(e))
+            return False
+        self.stop_trigger_capture()
+        self.trigger_capture = capture
+        if self.pipeline:
+            self.attach_trigger_capture()
+        timestamp = time.strftime("%H:%M:%S")
+        mode = "仅保存触发窗口" if self.trigger_only_var.get() else "同时保存完整日志"
+        self.running_status_display(
+            f"[{timestamp}] 触发采集已启动：{len(triggers)}个条件，触发前{capture.pre_frames}帧/"
+            f"{capture.pre_seconds:g}秒，触发后{capture.post_seconds:g}秒，{mode}"
+        )
+        return True
+    
+    def attach_trigger_capture(self):
+        self.trigger_capture.channel_column = self.pipeline.channel_column
+        self.pipeline.add_sink(self.trigger_capture.update)
+        self.pipeline.add_idle_callback(self.trigger_capture.check_deadline)
+        if self.trigger_only_var.get():
+            self.pipeline.persist_callback = None
+    
+    def manual_trigger(self):
+        if not self.trigger_capture:
+            messagebox.showwarning("手动触发", "请先启动触发采集")
+            return
+        self.trigger_capture.trigger()
+        timestamp = time.strftime("%H:%M:%S")
+        self.running_status_display(f"[{timestamp}] 已手动触发")
+    
+    def stop_trigger_capture(self):
+        """停止触发采集，恢复完整接收日志"""
+        capture = self.trigger_capture
+        if not capture:
+            return
+        self.trigger_capture = None
+        if self.pipeline:
+            self.pipeline.remove_sink(capture.update)
+            self.pipeline.remove_idle_callback(capture.check_deadline)
+            self.pipeline.persist_callback = self.received_persist
+        capture.flush()
+        self.log_service.close_stream('trigger')
+        stats = capture.stats()
+        timestamp = time.strftime("%H:%M:%S")
+        self.running_status_display(
+            f"[{timestamp}] 触发采集已停止：触发{stats['triggers']}次，保存{stats['saved']}/{stats['seen']}帧"
+        )
+    
+    def show_pipeline_metrics(self):
+        """弹窗显示接收流水线各阶段的延迟与队列深度"""
+        if not self.pipeline:
+            messagebox.showinfo("接收流水线统计", "CAN总线未连接")
+            return
+        metrics = self.pipeline.get_metrics()
+        lines = [
+            f"已接收：{metrics['received']} 帧",
+            f"丢弃（接收队列满）：{metrics['dropped']} 帧",
+            f"丢弃（显示队列满）：{metrics['display_dropped']} 行",
+            f"接收队列深度：{metrics['queue_depth']}（最大 {metrics['max_queue_depth']}）",
+            f"显示队列深度：{metrics['display_queue_depth']}",
+            ""
+        ]
+        for name, stage in metrics['stages'].items():
+            lines.append(f"{name}: {stage['count']} 次, 平均 {stage['avg_ms']} ms, 最大 {stage['max_ms']} ms")
+        if self.dbc_decoder:
+            stats = self.dbc_decoder.stats()
+            lines.append("")
+            lines.append(f"DBC解码：订阅 {stats['subscribed']}/{stats['messages']} 个报文，已解码 {stats['decoded']} 帧，"
+                         f"失败 {stats['failed']} 帧，吞吐 {stats['frames_per_s']} 帧/秒")
+        if self.log_service:
+            stats = self.log_service.stats()
+            lines.append("")
+            lines.append(f"日志服务：队列 {stats['queue_depth']}（最大 {stats['max_queue_depth']}），已写入 {stats['written']} 行，"
+                         f"丢弃 {stats['dropped']} 行，阻塞 {stats['blocked']} 次/{stats['blocked_ms']} ms，刷新 {stats['flushes']} 次")
+        if self.trigger_capture:
+            stats = self.trigger_capture.stats()
+            lines.append("")
+            lines.append(f"触发采集：触发 {stats['triggers']} 次（最近：{stats['last_trigger'] or '无'}），"
+                         f"已保存 {stats['saved']}/{stats['seen']} 帧（{stats['saved_pct']}%），缓冲 {stats['buffered']} 帧")
+        if getattr(self.can_bus, 'multi_channel', False):
+            lines.append("")
+            for name, stats in self.can_bus.stats().items():
+                lines.append(f"通道 {name}：已接收 {stats['received']} 帧，丢弃 {stats['dropped']} 帧，待归并 {stats['pending']} 帧")
+        messagebox.showinfo("接收流水线统计", "\n".join(lines))
+    
+    def show_periodic_send(self):
+        """弹出周期发送表：按ID/数据/周期/次数周期发送，可选计数器和校验字节"""
+        if not self.running or not self.periodic_scheduler:
+            messagebox.showwarning("未连接", "请先连接CAN总线！")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("周期发送")
+        dialog.geometry("820x380")
+        dialog.transient(self.root)
+        
+        form = ttk.Frame(dialog, padding="10")
+        form.pack(fill=tk.X)
+        
+        id_var = tk.StringVar(value=self.can_id_var.get())
+        data_var = tk.StringVar(value=self.data_var.get())
+        period_var = tk.StringVar(value="100")
+        count_var = tk.StringVar(value="0")
+        counter_var = tk.StringVar(value="")
+        checksum_var = tk.StringVar(value="")
+        fields = [
+            ("CANID:", id_var, 8), ("数据:", data_var, 26), ("周期(ms):", period_var, 6),
+            ("次数(0=无限):", count_var, 6), ("计数器字节:", counter_var, 4), ("校验字节:", checksum_var, 4)
+        ]
+        for col, (label, var, width) in enumerate(fields):
+            ttk.Label(form, text=label).grid(row=0, column=col * 2, sticky=tk.W)
+            ttk.Entry(form, textvariable=var, width=width).grid(row=0, column=col * 2 + 1, sticky=tk.W, padx=(0, 5))
+        
+        columns = ("id", "data", "period", "mode", "sent", "jitter")
+        tree = ttk.Treeview(dialog, columns=columns, show="headings", height=10)
+        for column, text, width in zip(columns, ("ID", "数据", "周期(ms)", "模式", "已发送", "抖动(平均/标准差/最大 us)"),
+                                       (80, 220, 70, 70, 70, 260)):
+            tree.heading(column, text=text)
+            tree.column(column, width=width, anchor=tk.W)
+        tree.pack(fill=tk.BOTH, expand=True, padx=10)
+        entries = {}
+        
+        def add_entry():
+            try:
+                data = bytes(int(b, 16) for b in data_var.get().split())
+                can_id = int(id_var.get().strip(), 16)
+                entry = PeriodicEntry(
+                    can_id,
+                    data,
+                    float(period_var.get()) / 1000,
+                    count=int(count_var.get() or 0),
+                    counter_index=int(counter_var.get()) if counter_var.get().strip() else None,
+                    checksum_index=int(checksum_var.get()) if checksum_var.get().strip() else None,
+                    is_extended_id=self.extended_var.get() or can_id > 0x7FF,
+                    is_fd=self.bus_fd,
+                    bitrate_switch=self.bus_fd and self.brs_var.get(),
+                    channel=self.send_channel_var.get() or None
+                )
+                self.periodic_scheduler.add(entry)
             except Exception as e:
-                if self.running:
-                    timestamp = time.strftime("%H:%M:%S")
-                    self.running_status_display(f"[{timestamp}] 接收错误: {str(e)}")
-                time.sleep(1)
+                messagebox.showerror("周期发送错误", str(e), parent=dialog)
+                return
+            item = tree.insert("", tk.END, values=(f"0x{entry.can_id:X}", "", f"{entry.period * 1000:g}", "", "", ""))
+            entries[item] = entry
+            timestamp = time.strftime("%H:%M:%S")
+            self.running_status_display(f"[{timestamp}] 周期发送已启动：{entry.describe()}（{entry.mode}）")
+        
+        def remove_selected():
+            for item in tree.selection():
+                entry = entries.pop(item)
+                if self.periodic_scheduler:
+                    self.periodic_scheduler.remove(entry)
+                tree.delete(item)
+        
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            for item, entry in entries.items():
+                if entry.mode == 'hardware':
+                    sent, jitter = "-", "驱动定时，无主机侧抖动"
+                else:
+                    stats = entry.stats.snapshot()
+                    sent = entry.sent
+                    jitter = f"{stats['mean_us']} / {stats['std_us']} / {stats['max_us']}"
+                mode = f"已停止：{entry.error}" if entry.error else entry.mode
+                tree.item(item, values=(f"0x{entry.can_id:X}", entry.data.hex(' ').upper(),
+                                        f"{entry.period * 1000:g}", mode, sent, jitter))
+            dialog.after(500, refresh)
+        
+        def close():
+            remove_all = messagebox.askyesno("周期发送", "关闭窗口时停止全部周期发送？", parent=dialog)
+            if remove_all:
+                for item in list(entries):
+                    tree.selection_set(item)
+                remove_selected()
+            dialog.destroy()
+        
+        btn_frame = ttk.Frame(dialog, padding="10")
+        btn_frame.pack(fill=tk.X)
+        ttk.Button(btn_frame, text="添加并启动", command=add_entry).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="停止选中", command=remove_selected).pack(side=tk.LEFT, padx=5)
+        ttk.Button(btn_frame, text="关闭", command=close).pack(side=tk.RIGHT, padx=5)
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+    
+    def stop_periodic_send(self):
+        """停止全部周期发送任务"""
+        if self.periodic_scheduler:
+            self.periodic_scheduler.stop()
+            self.periodic_scheduler = None
+    
+    def start_replay(self):
+        """选择日志文件，在后台线程中按原始时序/倍速回放到当前总线"""
+        if not self.running or not self.can_bus:
+            messagebox.showwarning("未连接", "请先连接CAN总线！")
+            return
+        if self.replayer:
+            messagebox.showwarning("日志回放", "已有回放正在进行")
+            return
+        path = filedialog.askopenfilename(
+            title="选择要回放的日志",
+            initialdir=os.path.join(self.local_path_var.get(), 'log'),
+            filetypes=[("CAN日志", "*.log *.txt *.asc *.blf *.trc *.csv"), ("所有文件", "*.*")]
+        )
+        if not path:
+            return
+        speed = simpledialog.askfloat("回放倍速", "回放倍速（1为原始速度，0为尽可能快）：",
+                                      initialvalue=1.0, minvalue=0.0, parent=self.root)
+        if speed is None:
+            return
+        
+        pipeline = self.pipeline
+        self.replayer = CANReplayer(self.can_bus, speed=speed)
+        replayer = self.replayer
+        
+        def run():
+            try:
+                result = replayer.replay(iter_log_frames(path))
+                pipeline.post_status(f"[{time.strftime('%H:%M:%S')}] {format_result(result)}")
+            except Exception as e:
+                pipeline.post_status(f"[{time.strftime('%H:%M:%S')}] 回放失败: {str(e)}")
+            finally:
+                if self.replayer is replayer:
+                    self.replayer = None
+        
+        threading.Thread(target=run, daemon=True).start()
+        timestamp = time.strftime("%H:%M:%S")
+        self.running_status_display(f"[{timestamp}] 开始回放：{path}（{speed:g}倍速）")
+    
+    def stop_replay(self):
+        """停止正在进行的日志回放"""
+        if self.replayer:
+            self.replayer.stop()
+            self.replayer = None
     
     def can_send_guimessage(self):
         """GUI手动发送：读取输入框的CAN ID和数据"""
@@ -305,19 +924,26 @@ class CAN_GUI:
         try:
             data = [int(byte.strip(), 16) for byte in can_data.split()] if can_data else []
             
-            if len(data) > 8:
-                raise ValueError("数据长度超过8字节（CAN标准帧最大支持8字节）")
+            is_extended_id = self.extended_var.get() or can_id > 0x7FF
+            if can_id > (0x1FFFFFFF if is_extended_id else 0x7FF) or can_id < 0:
+                raise ValueError(f"CAN ID 0x{can_id:X} 超出范围（标准帧最大0x7FF，扩展帧最大0x1FFFFFFF）")
+            check_payload_length(len(data), self.bus_fd)
             
             message = can.Message(
+                timestamp=time.time(),
                 arbitration_id=can_id,
                 data=data,
-                is_extended_id=False
+                is_extended_id=is_extended_id,
+                is_fd=self.bus_fd,
+                bitrate_switch=self.bus_fd and self.brs_var.get(),
+                is_rx=False,
+                channel=self.send_channel_var.get() or None
             )
             
             self.can_bus.send(message)
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            send_msg = f"[{timestamp}] 发送: ID=0x{can_id:X}, 数据={can_data}, 长度={len(data)}字节"
-            self.receive_messages_display(send_msg)
+            # 与接收日志使用相同格式（扩展帧/FD帧带标志字段），回放和检索工具可直接解析
+            multi_channel = getattr(self.can_bus, 'multi_channel', False)
+            self.receive_messages_display(format_frames([message], channel=multi_channel)[0])
             # 保存发送的消息到日志
         
         except ValueError as e:
@@ -352,51 +978,26 @@ class CAN_GUI:
         self.running_status.see(tk.END)
         self.running_status.config(state=tk.DISABLED)
     
-    def ensure_folder_exists(self, folder_name):
-        """确保文件夹存在，如果不存在则创建"""
-        try:
-            folder_path = os.path.join(self.local_path_var.get(), folder_name)
-            if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
-                self.running_status_display(f"已创建文件夹: {folder_path}")
-            return folder_path
-        except Exception as e:
-            error_msg = f"创建文件夹失败: {str(e)}"
-            self.running_status_display(f"{error_msg}")
-            return None
-        
     def save_to_log(self, log_name, content):
-        """保存内容到指定类型的日志文件"""  
-        try:
-            # 获取当前日期作为日志文件的一部分
-            log_timestamp = datetime.datetime.now().strftime("%Y%m%d")
-            # 确保log文件夹存在
-            log_path = self.ensure_folder_exists('log')
-            if not log_path:
-                return
-            
-            filename = os.path.join(log_path, f"{log_timestamp}_{log_name}.log") 
-                
-            # 添加详细时间戳
-            log_entry = f"{content}\n"
-            
-            # 写入文件
-            with open(filename, 'a', encoding='utf-8') as f:
-                f.write(log_entry)
-        except Exception as e:
-            error_msg = f"日志保存失败: {str(e)}"
-            self.running_status_display(f"{error_msg}")
+        """保存内容到指定类型的日志文件（只入队，由日志服务后台写入）"""
+        if self.log_service:
+            self.log_service.write(log_name, content)
 
     def on_close(self):
         """窗口关闭：清理资源"""
         self.running = False
-        if self.receive_thread and self.receive_thread.is_alive():
-            self.receive_thread.join(timeout=1.0)
+        self.stop_replay()
+        self.stop_periodic_send()
+        self.stop_pipeline()
+        self.stop_metrics_csv()
         if self.can_bus:
             self.can_bus.shutdown()
         timestamp = time.strftime("%H:%M:%S")
         exit_msg = f"[{timestamp}] 程序退出，当前本地路径：{self.local_path_var.get()}"
         self.running_status_display(exit_msg)
+        self.log_service.close()
+        if self.uploader:
+            self.uploader.stop()
         self.root.destroy()
 
 if __name__ == "__main__":
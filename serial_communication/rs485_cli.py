@@ -0,0 +1,391 @@
+"""RS485 命令行工具（无界面，适合长时间无人值守运行）
+
+子命令：
+    capture   采集并记录二进制日志（可同时打印）
+    monitor   多串口同时监视（一个事件循环，合并输出）
+    bridge    TCP ↔ 串口桥接（单个客户端）
+    serve     转发服务：多个TCP客户端/UDP目标同时接收，可写回串口
+    send      发送十六进制数据（可重复、等待应答）
+    script    执行请求/应答脚本（见 rs485_transact.py）
+    modbus    Modbus RTU 轮询（见 rs485_modbus.py）
+    sequence  按序列文件定时发送帧，用于压力测试（见 rs485_sequence.py）
+    export    二进制日志导出为十六进制文本（见 rs485_log.py）
+    selftest  用伪终端虚拟串口自检（仅Linux/macOS，不需要硬件）
+
+示例：
+    python rs485_cli.py capture --port /dev/ttyUSB0 --baud 9600 --log-dir /data/rs485
+    python rs485_cli.py monitor --ports "A=/dev/ttyUSB0,B=/dev/ttyUSB1" --baud 9600 --log-dir /data/rs485
+    python rs485_cli.py bridge --port /dev/ttyUSB0 --baud 115200 --listen 0.0.0.0:4001
+    python rs485_cli.py serve --port /dev/ttyUSB0 --baud 9600 --listen 0.0.0.0:4002 --udp 10.0.0.5:5000
+    python rs485_cli.py send --port COM3 --data "01 03 00 00 00 0A C5 CD" --repeat 10 --interval 100 --wait 200
+    python rs485_cli.py selftest
+
+各子命令在运行时才导入所需模块，启动不加载tkinter。
+"""
+import sys
+import time
+import signal
+import socket
+import argparse
+import threading
+from rs485_codec import parse_hex
+
+PARITIES = ('N', 'E', 'O', 'M', 'S')  # 无/偶/奇/标记/空格，与pyserial的PARITY_*一致
+
+
+def add_serial_args(parser, framing='silence'):
+    parser.add_argument("--port", required=True, help="串口，如 COM3 或 /dev/ttyUSB0")
+    parser.add_argument("--baud", type=int, default=9600, help="波特率")
+    parser.add_argument("--parity", choices=PARITIES, default='N', help="校验位")
+    parser.add_argument("--stopbits", type=float, choices=(1, 1.5, 2), default=1, help="停止位")
+    parser.add_argument("--bytesize", type=int, choices=(5, 6, 7, 8), default=8, help="数据位")
+    parser.add_argument("--framing", choices=('silence', 'delimiter', 'raw'), default=framing,
+                        help="分帧方式：静默超时/分隔符/不分帧")
+    parser.add_argument("--delimiter", default="0D 0A", help="分隔符（十六进制）")
+    parser.add_argument("--log-dir", default="", help="日志目录，默认为程序目录下的log")
+    parser.add_argument("--max-mb", type=float, default=100, help="单个日志文件上限（MB）")
+    parser.add_argument("--no-log", action="store_true", help="不记录日志")
+
+
+def open_terminal(args, gui_callback=None):
+    """按命令行参数创建并连接终端，失败时抛RuntimeError"""
+    from rs485_terminal import RS485Terminal
+
+    terminal = RS485Terminal(gui_callback=gui_callback, log_dir=args.log_dir or None, log_enabled=False)
+    terminal.log_max_bytes = int(args.max_mb * 1024 * 1024)
+    terminal.log_enabled = not args.no_log  # 连接时创建日志
+    terminal.framing = args.framing
+    terminal.delimiter = parse_hex(args.delimiter)
+    ok, message = terminal.connect(args.port, args.baud, parity=args.parity,
+                                   stopbits=args.stopbits, bytesize=args.bytesize)
+    print(message, file=sys.stderr)
+    if not ok:
+        raise RuntimeError(message)
+    return terminal
+
+
+def print_display(text, is_received=False, is_error=False):
+    (sys.stderr if is_error else sys.stdout).write(text)
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def wait(duration=0, report=None, interval=0):
+    """运行到duration秒或Ctrl+C/SIGTERM，每interval秒调用一次report"""
+    signal.signal(signal.SIGTERM, _terminate)
+    end = time.monotonic() + duration if duration else None
+    next_report = time.monotonic() + interval if interval else None
+    try:
+        while True:
+            now = time.monotonic()
+            if end is not None and now >= end:
+                break
+            if next_report is not None and now >= next_report:
+                report()
+                next_report += interval
+            time.sleep(min(0.2, end - now) if end is not None else 0.2)
+    except KeyboardInterrupt:
+        pass
+
+
+def capture_stats(engine, log_writer):
+    stats = engine.stats()
+    text = f"已接收 {stats['bytes']} 字节 / {stats['frames']} 帧"
+    if log_writer:
+        log = log_writer.stats()
+        text += f"，日志 {log['records']} 条（丢弃 {log['dropped']}）{log['path'] or ''}"
+    return text
+
+
+def run_capture(args):
+    terminal = open_terminal(args, print_display if args.print else None)
+    # close()会清空终端上的引用，统计在关闭后还要输出
+    engine, log_writer = terminal.engine, terminal.log_writer
+    try:
+        wait(args.duration, lambda: print(f"[{time.strftime('%H:%M:%S')}] {capture_stats(engine, log_writer)}",
+                                          file=sys.stderr), args.stats_interval)
+    finally:
+        terminal.close()
+    print(capture_stats(engine, log_writer), file=sys.stderr)
+    return 0
+
+
+def run_monitor(args):
+    from rs485_multiport import MultiPortMonitor, parse_ports, format_frame
+
+    try:
+        ports = parse_ports(args.ports, args.baud)
+        delimiter = parse_hex(args.delimiter)
+    except ValueError as e:
+        print(f"参数错误：{str(e)}", file=sys.stderr)
+        return 1
+    width = max(len(name) for name, _, _ in ports)
+    out = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+
+    def print_frames(frames):
+        if not args.quiet:
+            out.write("\n".join(format_frame(frame, width) for frame in frames) + "\n")
+            out.flush()
+
+    def port_error(name, error):
+        print(f"[{time.strftime('%H:%M:%S')}] 端口 {name} 接收错误：{str(error)}", file=sys.stderr)
+
+    def report():
+        stats = monitor.stats()
+        text = "，".join(f"{port['port']} {port['frames']} 帧" for port in stats['ports'])
+        print(f"[{time.strftime('%H:%M:%S')}] {text}", file=sys.stderr)
+
+    monitor = MultiPortMonitor(ports, print_frames, args.framing, delimiter, args.merge_delay / 1000,
+                               args.log_dir or None, port_error)
+    try:
+        monitor.start()
+    except Exception as e:
+        print(f"打开串口失败：{str(e)}", file=sys.stderr)
+        return 1
+    print(f"正在监视 {len(ports)} 个串口", file=sys.stderr)
+    try:
+        wait(args.duration, report, args.stats_interval)
+    finally:
+        monitor.close()
+        if out is not sys.stdout:
+            out.close()
+    report()
+    return 0
+
+
+class SerialBridge:
+    """TCP ↔ 串口桥接：同一时间只连接一个TCP客户端，新客户端连入时替换旧连接
+
+    串口收到的帧原样发给客户端，客户端发来的数据直接写串口（并记录TX日志）。
+    """
+    def __init__(self, terminal, host='127.0.0.1', port=4001):
+        self.terminal = terminal
+        self.server = socket.create_server((host, port))
+        self.server.settimeout(0.5)
+        self.address = self.server.getsockname()
+        self.client = None
+        self.running = True
+        self.sent = 0
+        self.received = 0
+        terminal.add_frame_listener(self.on_frames)
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _serve(self):
+        while self.running:
+            try:
+                conn, address = self.server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            old, self.client = self.client, conn
+            if old:
+                old.close()
+            print(f"客户端已连接：{address[0]}:{address[1]}", file=sys.stderr)
+            threading.Thread(target=self._pump, args=(conn,), daemon=True).start()
+
+    def _pump(self, conn):
+        """客户端 → 串口"""
+        while self.running:
+            try:
+                data = conn.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            self.received += len(data)
+            self.terminal.ser.write(data)
+            self.terminal.log_data('TX', data)
+        if self.client is conn:
+            self.client = None
+            print("客户端已断开", file=sys.stderr)
+        conn.close()
+
+    def on_frames(self, frames):
+        """串口 → 客户端（在接收线程中调用）"""
+        client = self.client
+        if client is None:
+            return
+        data = b"".join(frame.data for frame in frames)
+        try:
+            client.sendall(data)
+            self.sent += len(data)
+        except OSError:
+            pass
+
+    def close(self):
+        self.running = False
+        self.terminal.remove_frame_listener(self.on_frames)
+        self.server.close()
+        if self.client:
+            self.client.close()
+        self.thread.join(timeout=1.0)
+
+
+def parse_listen(text):
+    host, _, port = text.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+def run_bridge(args):
+    terminal = open_terminal(args, print_display if args.print else None)
+    try:
+        bridge = SerialBridge(terminal, *parse_listen(args.listen))
+    except OSError as e:
+        terminal.close()
+        print(f"监听失败：{str(e)}", file=sys.stderr)
+        return 1
+    print(f"桥接 {args.port} ↔ TCP {bridge.address[0]}:{bridge.address[1]}", file=sys.stderr)
+    try:
+        wait(args.duration)
+    finally:
+        bridge.close()
+        terminal.close()
+    print(f"串口→TCP {bridge.sent} 字节，TCP→串口 {bridge.received} 字节", file=sys.stderr)
+    return 0
+
+
+def run_serve(args):
+    host, port = parse_listen(args.listen)
+    udp_targets = [parse_listen(item.strip()) for item in args.udp.split(',') if item.strip()]
+    terminal = open_terminal(args, print_display if args.print else None)
+
+    def event(text):
+        print(f"[{time.strftime('%H:%M:%S')}] {text}", file=sys.stderr)
+
+    try:
+        server = terminal.start_stream(host, port, format=args.format, max_buffer=int(args.max_buffer * 1024),
+                                       accept_writes=not args.read_only, udp_targets=udp_targets,
+                                       event_callback=event)
+    except OSError as e:
+        terminal.close()
+        print(f"监听失败：{str(e)}", file=sys.stderr)
+        return 1
+    print(f"转发 {args.port} → TCP {server.address[0]}:{server.address[1]}"
+          + (f"，UDP {args.udp}" if udp_targets else ""), file=sys.stderr)
+
+    def report():
+        stats = server.stats()
+        event(f"已转发 {stats['frames']} 帧，客户端 {len(stats['clients'])} 个"
+              f"（断开慢客户端 {stats['dropped_clients']} 个），延迟 {stats['latency']}")
+
+    try:
+        wait(args.duration, report, args.stats_interval)
+    finally:
+        terminal.close()
+    report()
+    return 0
+
+
+def run_send(args):
+    try:
+        data = parse_hex(args.data)
+    except ValueError as e:
+        print(f"参数错误：{str(e)}", file=sys.stderr)
+        return 1
+    terminal = open_terminal(args, print_display)
+    try:
+        for i in range(args.repeat):
+            if i and args.interval:
+                time.sleep(args.interval / 1000)
+            terminal.ser.write(data)
+            terminal.log_data('TX', data)
+        terminal.ser.flush()
+        time.sleep(args.wait / 1000)
+    finally:
+        terminal.close()
+    print(f"已发送 {args.repeat} 次，每次 {len(data)} 字节", file=sys.stderr)
+    return 0
+
+
+def run_selftest(args):
+    from rs485_selftest import run_all
+    return run_all(verbose=args.verbose)
+
+
+# 直接转给各模块自己命令行的子命令
+DELEGATED = {'script': 'rs485_transact', 'modbus': 'rs485_modbus', 'sequence': 'rs485_sequence',
+             'export': 'rs485_log'}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in DELEGATED:
+        return __import__(DELEGATED[argv[0]]).main(argv[1:])
+
+    parser = argparse.ArgumentParser(description="RS485 命令行工具")
+    commands = parser.add_subparsers(dest="command", metavar="子命令")
+    commands.required = True
+
+    capture = commands.add_parser("capture", help="采集并记录日志")
+    add_serial_args(capture)
+    capture.add_argument("--duration", type=float, default=0, help="运行时间（秒），0表示直到Ctrl+C")
+    capture.add_argument("--print", action="store_true", help="打印收到的帧")
+    capture.add_argument("--stats-interval", type=float, default=60, help="统计输出间隔（秒），0表示不输出")
+    capture.set_defaults(handler=run_capture)
+
+    monitor = commands.add_parser("monitor", help="多串口同时监视")
+    monitor.add_argument("--ports", required=True, help="端口列表：[名称=]设备[@波特率]，逗号分隔")
+    monitor.add_argument("--baud", type=int, default=9600, help="默认波特率")
+    monitor.add_argument("--framing", choices=('silence', 'delimiter', 'raw'), default='silence', help="分帧方式")
+    monitor.add_argument("--delimiter", default="0D 0A", help="分隔符（十六进制）")
+    monitor.add_argument("--merge-delay", type=float, default=50, help="合并排序等待时间（毫秒）")
+    monitor.add_argument("--log-dir", default="", help="二进制日志目录（每个端口一个文件），默认不记录")
+    monitor.add_argument("--output", default="", help="合并后的文本输出文件，默认输出到标准输出")
+    monitor.add_argument("--duration", type=float, default=0, help="运行时间（秒），0表示直到Ctrl+C")
+    monitor.add_argument("--quiet", action="store_true", help="不输出数据，只输出统计")
+    monitor.add_argument("--stats-interval", type=float, default=60, help="统计输出间隔（秒），0表示不输出")
+    monitor.set_defaults(handler=run_monitor)
+
+    bridge = commands.add_parser("bridge", help="TCP ↔ 串口桥接")
+    add_serial_args(bridge, framing='raw')
+    bridge.add_argument("--listen", default="127.0.0.1:4001", help="监听地址，如 0.0.0.0:4001")
+    bridge.add_argument("--duration", type=float, default=0, help="运行时间（秒），0表示直到Ctrl+C")
+    bridge.add_argument("--print", action="store_true", help="打印收到的帧")
+    bridge.set_defaults(handler=run_bridge)
+
+    serve = commands.add_parser("serve", help="TCP/UDP转发服务")
+    add_serial_args(serve, framing='raw')
+    serve.add_argument("--listen", default="0.0.0.0:4002", help="TCP监听地址")
+    serve.add_argument("--udp", default="", help="UDP转发目标，如 10.0.0.5:5000，逗号分隔")
+    serve.add_argument("--format", choices=('raw', 'record'), default='raw',
+                       help="raw为原始字节流，record为带时间戳的帧记录（与二进制日志格式相同）")
+    serve.add_argument("--max-buffer", type=float, default=1024, help="每个客户端的发送缓冲上限（KB），超过则断开")
+    serve.add_argument("--read-only", action="store_true", help="忽略客户端发来的数据")
+    serve.add_argument("--duration", type=float, default=0, help="运行时间（秒），0表示直到Ctrl+C")
+    serve.add_argument("--print", action="store_true", help="打印收到的帧")
+    serve.add_argument("--stats-interval", type=float, default=60, help="统计输出间隔（秒），0表示不输出")
+    serve.set_defaults(handler=run_serve)
+
+    send = commands.add_parser("send", help="发送十六进制数据")
+    add_serial_args(send)
+    send.add_argument("--data", required=True, help="十六进制数据，如 \"01 03 00 00 00 0A C5 CD\"")
+    send.add_argument("--repeat", type=int, default=1, help="发送次数")
+    send.add_argument("--interval", type=float, default=0, help="发送间隔（毫秒）")
+    send.add_argument("--wait", type=float, default=200, help="发送完后等待并打印应答的时间（毫秒）")
+    send.set_defaults(handler=run_send)
+
+    # 只用于帮助信息，实际在上面直接转发
+    commands.add_parser("script", help="执行请求/应答脚本")
+    commands.add_parser("modbus", help="Modbus RTU 轮询")
+    commands.add_parser("sequence", help="按序列文件定时发送帧")
+    commands.add_parser("export", help="二进制日志导出为文本")
+
+    selftest = commands.add_parser("selftest", help="伪终端虚拟串口自检")
+    selftest.add_argument("--verbose", action="store_true", help="输出每项检查的详细信息")
+    selftest.set_defaults(handler=run_selftest)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except (RuntimeError, ValueError) as e:
+        print(f"错误：{str(e)}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
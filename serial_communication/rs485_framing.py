@@ -0,0 +1,298 @@
+import time
+import threading
+import collections
+
+# 接收到的一帧：data为完整帧数据，timestamp为首字节到达时的墙钟时间
+RxFrame = collections.namedtuple('RxFrame', ['data', 'timestamp'])
+
+
+class RawFramer:
+    """不分帧：每次读到的数据块作为一帧（原有行为）"""
+    poll_interval = 0.05
+
+    def feed(self, data, now):
+        return [(bytes(data), now)]
+
+    def poll(self, now):
+        return []
+
+    def reset(self):
+        pass
+
+
+class SilenceFramer:
+    """按字符间静默时间分帧（Modbus RTU 的3.5字符规则）
+
+    波特率高于19200时按Modbus规范固定使用1.75ms；也可直接指定gap（秒）。
+    分帧精度受USB转串口芯片的延迟定时器限制，同一次读取到的数据无法再按时间拆分。
+    """
+    def __init__(self, baudrate, chars=3.5, bits_per_char=11, gap=None, max_length=65536):
+        if gap is None:
+            gap = 0.00175 if baudrate > 19200 else chars * bits_per_char / baudrate
+        self.gap = gap
+        self.poll_interval = gap  # 串口读超时，读超时即视为静默超过gap
+        self.max_length = max_length
+        self.buffer = bytearray()
+        self.start = 0.0
+        self.last = 0.0
+
+    def feed(self, data, now):
+        frames = []
+        if self.buffer and now - self.last > self.gap:
+            frames.append(self._take())
+        if not self.buffer:
+            self.start = now
+        self.buffer += data
+        self.last = now
+        if len(self.buffer) >= self.max_length:
+            frames.append(self._take())
+        return frames
+
+    def poll(self, now):
+        if self.buffer and now - self.last >= self.gap:
+            return [self._take()]
+        return []
+
+    def _take(self):
+        frame = (bytes(self.buffer), self.start)
+        self.buffer.clear()
+        return frame
+
+    def reset(self):
+        self.buffer.clear()
+
+
+class DelimiterFramer:
+    """按分隔符分帧（如 \\r\\n），帧数据包含分隔符"""
+    poll_interval = 0.05
+
+    def __init__(self, delimiter=b'\n', max_length=65536):
+        if not delimiter:
+            raise ValueError("分隔符不能为空")
+        self.delimiter = bytes(delimiter)
+        self.max_length = max_length
+        self.buffer = bytearray()
+        self.start = 0.0
+
+    def feed(self, data, now):
+        if not self.buffer:
+            self.start = now
+        # 只从上次未匹配的位置附近开始查找，分隔符可能跨两次读取
+        search_from = max(0, len(self.buffer) - len(self.delimiter) + 1)
+        self.buffer += data
+        frames = []
+        while True:
+            index = self.buffer.find(self.delimiter, search_from)
+            if index < 0:
+                break
+            end = index + len(self.delimiter)
+            frames.append((bytes(self.buffer[:end]), self.start))
+            del self.buffer[:end]
+            self.start = now
+            search_from = 0
+        if len(self.buffer) >= self.max_length:
+            frames.append((bytes(self.buffer), self.start))
+            self.buffer.clear()
+        return frames
+
+    def poll(self, now):
+        return []
+
+    def reset(self):
+        self.buffer.clear()
+
+
+class LengthFramer:
+    """固定长度分帧（已知应答长度时使用）"""
+    poll_interval = 0.05
+
+    def __init__(self, length):
+        if length <= 0:
+            raise ValueError("帧长度必须大于0")
+        self.length = length
+        self.buffer = bytearray()
+        self.start = 0.0
+
+    def feed(self, data, now):
+        if not self.buffer:
+            self.start = now
+        self.buffer += data
+        frames = []
+        while len(self.buffer) >= self.length:
+            frames.append((bytes(self.buffer[:self.length]), self.start))
+            del self.buffer[:self.length]
+            self.start = now
+        return frames
+
+    def poll(self, now):
+        return []
+
+    def reset(self):
+        self.buffer.clear()
+
+
+class LengthPrefixFramer:
+    """按长度字段分帧
+
+    帧格式：[header][...][长度字段 length_size 字节][长度字段指示的字节数][extra 字节]，
+    长度字段位于length_offset处，帧总长 = length_offset + length_size + 长度值 + extra
+    （extra用于长度不包含的CRC等尾部）。指定header时，缓冲区不以header开头会丢弃字节重新同步。
+    """
+    poll_interval = 0.05
+
+    def __init__(self, length_offset=0, length_size=1, byteorder='big', extra=0, header=b'', max_length=65536):
+        self.length_offset = length_offset
+        self.length_size = length_size
+        self.byteorder = byteorder
+        self.extra = extra
+        self.header = bytes(header)
+        self.max_length = max_length
+        self.buffer = bytearray()
+        self.start = 0.0
+        self.discarded = 0  # 重新同步时丢弃的字节数
+
+    def feed(self, data, now):
+        if not self.buffer:
+            self.start = now
+        self.buffer += data
+        frames = []
+        field_end = self.length_offset + self.length_size
+        while True:
+            if self.header and not self.buffer.startswith(self.header):
+                index = self.buffer.find(self.header, 1)
+                drop = index if index > 0 else max(0, len(self.buffer) - len(self.header) + 1)
+                self.discarded += drop
+                del self.buffer[:drop]
+                if index < 0:
+                    break
+            if len(self.buffer) < field_end:
+                break
+            length = field_end + int.from_bytes(self.buffer[self.length_offset:field_end], self.byteorder) + self.extra
+            if length > self.max_length:
+                # 长度字段明显错误，丢弃一个字节后重新同步
+                self.discarded += 1
+                del self.buffer[:1]
+                continue
+            if len(self.buffer) < length:
+                break
+            frames.append((bytes(self.buffer[:length]), self.start))
+            del self.buffer[:length]
+            self.start = now
+        return frames
+
+    def poll(self, now):
+        return []
+
+    def reset(self):
+        self.buffer.clear()
+
+
+def make_framer(kind, baudrate, delimiter=b'\r\n'):
+    """按名称创建分帧器：'silence' / 'delimiter' / 'raw'"""
+    if kind == 'silence':
+        return SilenceFramer(baudrate)
+    if kind == 'delimiter':
+        return DelimiterFramer(delimiter)
+    if kind == 'raw':
+        return RawFramer()
+    raise ValueError(f"未知的分帧方式: {kind}")
+
+
+class ReceiveEngine:
+    """串口接收引擎
+
+    接收线程按块读取（一次读取缓冲区中已有的全部数据到可复用的bytearray，
+    没有数据时阻塞等待，不使用sleep轮询），交给分帧器拆成完整帧后整批回调
+    frame_callback(frames)，frames为RxFrame列表。串口读超时设为分帧器的poll_interval，
+    超时返回时检查静默分帧。raw_callback(data, now)在分帧之前收到每次读取的原始数据，
+    now为time.perf_counter()（请求/应答事务用它计算延迟，不必等显示用的分帧）。
+    """
+    def __init__(self, ser, framer, frame_callback, error_callback=None, block_size=65536, raw_callback=None):
+        self.ser = ser
+        self.framer = framer
+        self.frame_callback = frame_callback
+        self.error_callback = error_callback
+        self.raw_callback = raw_callback
+        self.block_size = block_size
+        self.running = False
+        self.thread = None
+        self.pending_framer = None  # set_framer()交给接收线程的新分帧器，在两次读取之间换上
+
+        # 统计
+        self.bytes = 0
+        self.frames = 0
+        self.reads = 0
+        self.max_block = 0
+
+    def start(self):
+        self.running = True
+        self.ser.timeout = self.framer.poll_interval
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+
+    def set_framer(self, framer):
+        """更换分帧器（线程安全，由接收线程在读取返回后换上并调整读超时，未完成的帧丢弃）
+
+        不在调用线程中直接改ser.timeout：pyserial设置超时会重新配置串口，
+        接收线程此时可能正阻塞在readinto中。
+        """
+        if self.running:
+            self.pending_framer = framer
+        else:
+            self.framer = framer
+
+    def _run(self):
+        buffer = bytearray(self.block_size)
+        view = memoryview(buffer)
+        # perf_counter换算为墙钟时间的偏移，帧时间戳精确到读取返回的时刻
+        wall_offset = time.time() - time.perf_counter()
+        ser = self.ser
+        while self.running and ser.is_open:
+            try:
+                size = min(max(ser.in_waiting, 1), self.block_size)
+                count = ser.readinto(view[:size])
+            except Exception as e:
+                if self.running and self.error_callback:
+                    self.error_callback(e)
+                break
+            now = time.perf_counter()
+            # 读取返回后再换分帧器，阻塞等待期间更换的分帧器也能收到这批数据
+            pending = self.pending_framer
+            if pending is not None:
+                self.pending_framer = None
+                self.framer = pending
+                try:
+                    ser.timeout = pending.poll_interval
+                except Exception as e:
+                    if self.running and self.error_callback:
+                        self.error_callback(e)
+                    break
+            framer = self.framer
+            if count:
+                self.reads += 1
+                self.bytes += count
+                if count > self.max_block:
+                    self.max_block = count
+                if self.raw_callback:
+                    self.raw_callback(bytes(view[:count]), now)
+                frames = framer.feed(view[:count], now)
+            else:
+                frames = framer.poll(now)
+            if frames:
+                self.frames += len(frames)
+                self.frame_callback([RxFrame(data, start + wall_offset) for data, start in frames])
+        self.running = False
+
+    def stats(self):
+        return {
+            'bytes': self.bytes,
+            'frames': self.frames,
+            'reads': self.reads,
+            'max_block': self.max_block,
+            'avg_block': round(self.bytes / self.reads, 1) if self.reads else 0.0
+        }
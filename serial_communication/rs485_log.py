@@ -0,0 +1,252 @@
+"""RS485二进制日志
+
+记录格式：文件头 MAGIC，之后每条记录为
+    <d 时间戳(秒)> <B 类型> <I 长度> <数据>
+类型为 RX/TX/ERROR/MARK（ERROR、MARK的数据为UTF-8文本）。
+写入由后台线程完成，队列中已有的记录合并为一次write（group commit），
+按字节数/时间间隔flush，按日期和文件大小滚动。
+
+导出为可读的十六进制文本：
+    python rs485_log.py log/20240101_rs485.bin -o 20240101_rs485.log
+"""
+import os
+import sys
+import time
+import queue
+import struct
+import argparse
+import threading
+from rs485_codec import format_hex
+
+MAGIC = b'R485LOG1'
+RECORD_HEADER = struct.Struct('<dBI')
+RECORD_TYPES = ('RX', 'TX', 'ERROR', 'MARK')
+TYPE_CODES = {name: code for code, name in enumerate(RECORD_TYPES)}
+
+
+class BinaryLogWriter:
+    """后台线程写二进制日志，文件名为 {日期}_{name}.bin，超过max_bytes时为 {日期}_{NNN}_{name}.bin"""
+    def __init__(self, directory, name='rs485', max_bytes=0, queue_size=100000,
+                 flush_bytes=64 * 1024, flush_interval=1.0):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes  # 0 表示只按日期滚动
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.file = None
+        self.path = None
+        self.date = None
+        self.part = 0
+        self.size = 0
+        self.running = False
+        self.thread = None
+        self.error_callback = None  # 写文件失败时回调（在写线程中调用）
+
+        # 统计
+        self.records = 0
+        self.bytes = 0
+        self.writes = 0
+        self.flushes = 0
+        self.dropped = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self, timeout=5.0):
+        """写完队列中的剩余记录并关闭文件"""
+        if not self.running:
+            return
+        self.running = False
+        self.queue.put(None)
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
+
+    def write(self, kind, data, timestamp=None):
+        """记录一条数据（不阻塞），kind为RX/TX/ERROR/MARK，data为bytes或文本"""
+        if not self.running:
+            return False
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            self.queue.put_nowait((time.time() if timestamp is None else timestamp, TYPE_CODES[kind], data))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _open(self, date):
+        if self.file:
+            self.file.close()
+        if date != self.date:
+            self.date = date
+            self.part = self._last_part(date)
+        while True:
+            suffix = f"_{self.part:03d}" if self.part else ""
+            path = os.path.join(self.directory, f"{date}{suffix}_{self.name}.bin")
+            if not self.max_bytes or not os.path.exists(path) or os.path.getsize(path) < self.max_bytes:
+                break
+            self.part += 1
+        self.path = path
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        self.size = self.file.tell()
+
+    def _last_part(self, date):
+        """同一天已存在的最大分段号（程序重启后继续追加到最后一个分段）"""
+        part = 0
+        prefix = f"{date}_"
+        suffix = f"_{self.name}.bin"
+        for filename in os.listdir(self.directory):
+            if filename.startswith(prefix) and filename.endswith(suffix):
+                number = filename[len(prefix):-len(suffix)]
+                if number.isdigit():
+                    part = max(part, int(number))
+        return part
+
+    def _run(self):
+        pending = 0
+        last_flush = time.monotonic()
+        stop = False
+        while not stop:
+            try:
+                batch = [self.queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                batch = []
+            # group commit：把队列里已有的记录一起写入
+            while len(batch) < 10000:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            # close()之前通过running检查的write()可能在停止标记之后入队，
+            # 标记之后的记录丢弃（close已返回给调用方，不能再无限等待）
+            if None in batch:
+                stop = True
+                batch = batch[:batch.index(None)]
+            records = batch
+            try:
+                if records:
+                    pending += self._write_records(records)
+                now = time.monotonic()
+                if self.file and (stop or pending >= self.flush_bytes or
+                                  (pending and now - last_flush >= self.flush_interval)):
+                    self.file.flush()
+                    self.flushes += 1
+                    pending = 0
+                    last_flush = now
+            except Exception as e:
+                if self.error_callback:
+                    self.error_callback(f"日志写入失败: {str(e)}")
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def _write_records(self, records):
+        parts = []
+        written = 0
+        pack = RECORD_HEADER.pack
+        for timestamp, code, data in records:
+            date = time.strftime("%Y%m%d", time.localtime(timestamp))
+            record_size = RECORD_HEADER.size + len(data)
+            if date != self.date or self.file is None or (self.max_bytes and self.size + record_size > self.max_bytes
+                                                          and self.size > len(MAGIC)):
+                if parts:
+                    written += self._flush_parts(parts)
+                    parts = []
+                if date == self.date and self.file is not None:
+                    self.part += 1
+                self._open(date)
+            parts.append(pack(timestamp, code, len(data)))
+            parts.append(data)
+            self.size += record_size
+        self.records += len(records)
+        if parts:
+            written += self._flush_parts(parts)
+        return written
+
+    def _flush_parts(self, parts):
+        block = b"".join(parts)
+        self.file.write(block)
+        self.writes += 1
+        self.bytes += len(block)
+        return len(block)
+
+    def stats(self):
+        return {
+            'records': self.records,
+            'bytes': self.bytes,
+            'writes': self.writes,
+            'flushes': self.flushes,
+            'dropped': self.dropped,
+            'queue_depth': self.queue.qsize(),
+            'path': self.path
+        }
+
+
+def iter_records(path):
+    """逐条读取二进制日志，生成(时间戳, 类型名, 数据bytes)"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是RS485二进制日志：{path}")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            timestamp, code, length = RECORD_HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return  # 最后一条记录未写完整（程序异常退出）
+            yield timestamp, RECORD_TYPES[code], data
+
+
+def format_record(timestamp, kind, data):
+    """格式化为原文本日志的行格式"""
+    seconds, millis = divmod(int(round(timestamp * 1000)), 1000)
+    text_time = f"{time.strftime('%H:%M:%S', time.localtime(seconds))}.{millis:03d}"
+    if kind in ('RX', 'TX'):
+        return f"| {text_time} | {kind} | {len(data)} bytes |  {format_hex(data)} |"
+    return f" | {text_time} | {kind} | {data.decode('utf-8', errors='replace')} |"
+
+
+def export_hex(path, out):
+    """导出为可读的十六进制文本，返回记录条数"""
+    count = 0
+    lines = []
+    for record in iter_records(path):
+        lines.append(format_record(*record))
+        count += 1
+        if len(lines) >= 10000:
+            out.write("\n".join(lines) + "\n")
+            lines = []
+    if lines:
+        out.write("\n".join(lines) + "\n")
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RS485二进制日志导出为十六进制文本")
+    parser.add_argument("logs", nargs='+', help="二进制日志文件（*.bin）")
+    parser.add_argument("-o", "--output", default="", help="输出文件，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for path in args.logs:
+            count = export_hex(path, out)
+            print(f"{path}: {count} 条记录", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"导出失败：{str(e)}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
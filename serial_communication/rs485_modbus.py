@@ -0,0 +1,563 @@
+"""Modbus RTU 主站轮询
+
+在RS485Terminal上按表轮询多个从站的线圈/寄存器：相邻地址合并为尽量少的读请求，
+按到期时间调度，收到应答后立即发下一帧（只保留帧间3.5字符静默），
+连续超时的从站暂时退避，不拖慢其他从站。统计每个从站的往返延迟和超时。
+
+轮询点写法（逗号分隔）：从站:功能码:起始地址[-结束地址]，功能码可省略（默认3）
+    1:3:0-9,1:3:20,2:4:100-103,3:0-1
+
+示例：
+    python rs485_modbus.py --port COM3 --baud 9600 --points "1:3:0-9,2:3:100-103"
+    python rs485_modbus.py --simulate --points "1:3:0-9,2:4:0-3" --duration 5
+"""
+import os
+import sys
+import time
+import heapq
+import select
+import random
+import argparse
+import threading
+import collections
+from rs485_codec import format_hex
+
+# 每种读功能码单次请求的最大数量（线圈/离散输入按位，寄存器按16位字）
+READ_FUNCTIONS = {1: 2000, 2: 2000, 3: 125, 4: 125}
+
+EXCEPTION_CODES = {
+    1: "非法功能码",
+    2: "非法数据地址",
+    3: "非法数据值",
+    4: "从站设备故障",
+    5: "确认",
+    6: "从站设备忙",
+    8: "存储奇偶性差错",
+    10: "网关路径不可用",
+    11: "网关目标设备无响应"
+}
+
+
+def _make_crc_table():
+    table = []
+    for value in range(256):
+        crc = value
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _make_crc_table()
+
+
+def crc16(data):
+    """Modbus CRC16（查表法），返回整数，帧中按低字节在前发送"""
+    crc = 0xFFFF
+    table = CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def append_crc(frame):
+    return bytes(frame) + crc16(frame).to_bytes(2, 'little')
+
+
+def check_crc(frame):
+    return len(frame) >= 4 and crc16(frame[:-2]) == int.from_bytes(frame[-2:], 'little')
+
+
+def read_request(slave, function, address, count):
+    """读请求帧（含CRC）"""
+    return append_crc(bytes((slave, function)) + address.to_bytes(2, 'big') + count.to_bytes(2, 'big'))
+
+
+def response_length(function, count):
+    """正常应答的总长度：地址 + 功能码 + 字节数 + 数据 + CRC"""
+    data_bytes = (count + 7) // 8 if function in (1, 2) else count * 2
+    return 5 + data_bytes
+
+
+def decode_values(function, payload, count):
+    """应答数据 → 值列表（线圈为0/1，寄存器为无符号16位）"""
+    if function in (1, 2):
+        return [(payload[i >> 3] >> (i & 7)) & 1 for i in range(count)]
+    return [int.from_bytes(payload[i:i + 2], 'big') for i in range(0, count * 2, 2)]
+
+
+class ModbusReplyFramer:
+    """Modbus RTU 应答分帧：按字节数字段确定读应答长度，异常应答固定5字节
+
+    指定slave/function时，缓冲区开头不是该从站地址和功能码（噪声、上一从站的迟到应答）
+    会逐字节丢弃重新同步；一帧之后多出的字节保留，参与下一帧分帧。
+    """
+    poll_interval = 0.05
+    max_byte_count = 250  # 读应答字节数字段的上限（RTU帧最长256字节）
+
+    def __init__(self, slave=None, function=None):
+        self.slave = slave
+        self.function = function
+        self.buffer = bytearray()
+        self.start = 0.0
+        self.discarded = 0  # 重新同步时丢弃的字节数
+
+    def feed(self, data, now):
+        if not self.buffer:
+            self.start = now
+        self.buffer += data
+        frames = []
+        while True:
+            self._resync()
+            if len(self.buffer) < 3:
+                break
+            if self.buffer[1] & 0x80:
+                length = 5
+            elif self.buffer[2] > self.max_byte_count:
+                # 字节数字段明显错误，丢弃一个字节后重新同步
+                self.discarded += 1
+                del self.buffer[:1]
+                continue
+            else:
+                length = 5 + self.buffer[2]
+            if len(self.buffer) < length:
+                break
+            frames.append((bytes(self.buffer[:length]), self.start))
+            del self.buffer[:length]
+            self.start = now
+        return frames
+
+    def _resync(self):
+        """丢弃开头不属于期望从站/功能码的字节"""
+        while self.buffer and not self._expected_start():
+            self.discarded += 1
+            del self.buffer[:1]
+
+    def _expected_start(self):
+        if self.slave is not None and self.buffer[0] != self.slave:
+            return False
+        if self.function is not None and len(self.buffer) > 1 and self.buffer[1] & 0x7F != self.function:
+            return False
+        return True
+
+    def poll(self, now):
+        return []
+
+    def reset(self):
+        self.buffer.clear()
+
+
+class ModbusError(Exception):
+    """从站返回异常应答"""
+    def __init__(self, code):
+        self.code = code
+        super().__init__(f"异常码 {code}（{EXCEPTION_CODES.get(code, '未知')}）")
+
+
+Point = collections.namedtuple('Point', ['slave', 'function', 'address'])
+
+
+class ReadBlock:
+    """一次读请求覆盖的地址范围"""
+    def __init__(self, slave, function, start, count, addresses):
+        self.slave = slave
+        self.function = function
+        self.start = start
+        self.count = count
+        self.addresses = addresses  # 实际需要的地址（合并时跨过的空隙不上报）
+        self.request = read_request(slave, function, start, count)
+        self.response_length = response_length(function, count)
+
+    def __repr__(self):
+        return f"ReadBlock(从站{self.slave}, 功能码{self.function}, {self.start}+{self.count})"
+
+
+def parse_points(text):
+    """解析轮询点，返回Point列表"""
+    points = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        fields = item.split(':')
+        if len(fields) == 2:
+            fields.insert(1, '3')
+        if len(fields) != 3:
+            raise ValueError(f"轮询点格式错误：{item}")
+        slave, function = int(fields[0]), int(fields[1])
+        if not 1 <= slave <= 247:
+            raise ValueError(f"从站地址超出范围(1-247)：{item}")
+        if function not in READ_FUNCTIONS:
+            raise ValueError(f"不支持的功能码：{item}")
+        first, _, last = fields[2].partition('-')
+        first = int(first, 0)
+        last = int(last, 0) if last else first
+        if not 0 <= first <= last <= 0xFFFF:
+            raise ValueError(f"地址范围错误：{item}")
+        points.extend(Point(slave, function, address) for address in range(first, last + 1))
+    return points
+
+
+def coalesce(points, max_gap=4):
+    """把同一从站、同一功能码的地址合并为尽量少的读请求
+
+    相邻地址间的空隙不超过max_gap时一并读取（多读几个寄存器比多一次往返便宜），
+    单次请求不超过功能码允许的最大数量。个别设备读未定义地址会返回异常，此时用max_gap=0。
+    """
+    groups = collections.defaultdict(set)
+    for point in points:
+        groups[(point.slave, point.function)].add(point.address)
+    blocks = []
+    for (slave, function), addresses in sorted(groups.items()):
+        limit = READ_FUNCTIONS[function]
+        current = []
+        for address in sorted(addresses):
+            if current and (address - current[-1] - 1 > max_gap or address - current[0] + 1 > limit):
+                blocks.append(ReadBlock(slave, function, current[0], current[-1] - current[0] + 1, current))
+                current = []
+            current.append(address)
+        if current:
+            blocks.append(ReadBlock(slave, function, current[0], current[-1] - current[0] + 1, current))
+    return blocks
+
+
+class DeviceStats:
+    """单个从站的轮询统计"""
+    def __init__(self, slave):
+        self.slave = slave
+        self.requests = 0
+        self.responses = 0
+        self.timeouts = 0
+        self.errors = 0       # CRC错误/应答不匹配
+        self.exceptions = 0   # 异常应答
+        self.failures = 0     # 连续失败次数
+        self.skip_until = 0.0
+        self.latency_sum = 0.0
+        self.latency_min = None
+        self.latency_max = 0.0
+        self.latency_last = 0.0
+        self.last_error = ""
+
+    def add_latency(self, latency):
+        self.latency_last = latency
+        self.latency_sum += latency
+        if self.latency_min is None or latency < self.latency_min:
+            self.latency_min = latency
+        if latency > self.latency_max:
+            self.latency_max = latency
+
+    def as_dict(self):
+        answered = self.responses + self.exceptions
+        return {
+            'slave': self.slave,
+            'requests': self.requests,
+            'responses': self.responses,
+            'timeouts': self.timeouts,
+            'errors': self.errors,
+            'exceptions': self.exceptions,
+            'latency_avg_ms': round(self.latency_sum * 1000 / answered, 2) if answered else 0.0,
+            'latency_min_ms': round((self.latency_min or 0.0) * 1000, 2),
+            'latency_max_ms': round(self.latency_max * 1000, 2),
+            'latency_last_ms': round(self.latency_last * 1000, 2),
+            'last_error': self.last_error
+        }
+
+
+class ModbusPoller:
+    """Modbus RTU 轮询引擎
+
+    工作在已连接的RS485Terminal上，每次读取是一次terminal.transact事务（帧间静默、
+    应答匹配由事务层保证，显示、日志不变）。每个读请求按interval周期轮询，
+    到期的请求按时间先后依次发送；一个从站连续max_failures次超时后退避backoff秒。
+    value_callback(slave, function, {地址: 值}, timestamp) 在轮询线程中调用。
+    """
+    def __init__(self, terminal, blocks, interval=1.0, timeout=0.2, value_callback=None,
+                 max_failures=3, backoff=5.0):
+        self.terminal = terminal
+        self.blocks = blocks
+        self.interval = interval
+        self.timeout = timeout
+        self.value_callback = value_callback
+        self.max_failures = max_failures
+        self.backoff = backoff
+        self.devices = {}
+        for block in blocks:
+            self.devices.setdefault(block.slave, DeviceStats(block.slave))
+        self.running = False
+        self.thread = None
+        self.wakeup = threading.Event()
+        self.char_time = 0.0
+        self.polls = 0
+        self.busy_time = 0.0
+        self.started = 0.0
+
+    def start(self):
+        if not self.terminal.ser or not self.terminal.ser.is_open:
+            raise RuntimeError("未连接到串口")
+        self.char_time = 11 / self.terminal.ser.baudrate
+        self.running = True
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        self.running = False
+        self.wakeup.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=timeout)
+
+    def _run(self):
+        # (到期时间, 序号)；序号保证同时到期时按表顺序轮流
+        schedule = [(self.started, i) for i in range(len(self.blocks))]
+        heapq.heapify(schedule)
+        while self.running and schedule:
+            due, i = schedule[0]
+            now = time.perf_counter()
+            if due > now:
+                self.wakeup.wait(due - now)
+                continue
+            heapq.heappop(schedule)
+            block = self.blocks[i]
+            device = self.devices[block.slave]
+            if device.skip_until > now:
+                heapq.heappush(schedule, (device.skip_until, i))
+                continue
+            begin = time.perf_counter()
+            self._poll(block, device)
+            self.busy_time += time.perf_counter() - begin
+            self.polls += 1
+            # 轮询跟不上时不补发错过的周期
+            heapq.heappush(schedule, (max(due + self.interval, time.perf_counter()), i))
+
+    def _poll(self, block, device):
+        device.requests += 1
+        try:
+            values, latency = self._exchange(block)
+        except TimeoutError as e:
+            if not self.running:
+                device.requests -= 1  # 停止轮询打断的请求不计入统计
+                return
+            device.timeouts += 1
+            self._fail(device, str(e))
+            return
+        except ModbusError as e:
+            device.exceptions += 1
+            device.last_error = str(e)
+            device.failures = 0
+            return
+        except ValueError as e:
+            device.errors += 1
+            self._fail(device, str(e))
+            return
+        device.responses += 1
+        device.failures = 0
+        device.add_latency(latency)
+        if self.value_callback:
+            offset = block.start
+            self.value_callback(block.slave, block.function,
+                                {address: values[address - offset] for address in block.addresses}, time.time())
+
+    def _fail(self, device, message):
+        device.last_error = message
+        device.failures += 1
+        if device.failures >= self.max_failures:
+            device.skip_until = time.perf_counter() + self.backoff
+
+    def _exchange(self, block):
+        """发送读请求并等待应答，返回(值列表, 往返时间)"""
+        # 超时从请求发完、应答按最大长度传完之后算起
+        timeout = block.response_length * self.char_time + self.timeout
+        try:
+            reply = self.terminal.transact(block.request, ModbusReplyFramer(block.slave, block.function), timeout)
+        except TimeoutError:
+            raise TimeoutError(f"从站{block.slave}应答超时")
+        data = reply.data
+        if data[0] != block.slave or data[1] & 0x7F != block.function:
+            raise ValueError(f"从站{block.slave}应答不匹配: {format_hex(data[:8])}")
+        if not check_crc(data):
+            raise ValueError(f"从站{block.slave}应答CRC错误")
+        if data[1] & 0x80:
+            self.devices[block.slave].add_latency(reply.latency)
+            raise ModbusError(data[2])
+        if len(data) != block.response_length:
+            raise ValueError(f"从站{block.slave}应答字节数错误")
+        return decode_values(block.function, data[3:-2], block.count), reply.latency
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started if self.started else 0.0
+        return {
+            'polls': self.polls,
+            'polls_per_s': round(self.polls / elapsed, 1) if elapsed else 0.0,
+            'requests': len(self.blocks),
+            'bus_busy_pct': round(self.busy_time * 100 / elapsed, 1) if elapsed else 0.0,
+            'devices': [self.devices[slave].as_dict() for slave in sorted(self.devices)]
+        }
+
+
+class SimulatedSlave:
+    """基于伪终端的模拟从站（测试用），在fd上应答读请求
+
+    registers: {从站地址: {地址: 值}}，未定义的地址读为0；delay为应答前的处理时间。
+    """
+    def __init__(self, fd, registers, delay=0.0, drop_rate=0.0):
+        self.fd = fd
+        self.registers = registers
+        self.delay = delay
+        self.drop_rate = drop_rate  # 随机不应答的比例，用于测试超时
+        self.running = False
+        self.thread = None
+        self.requests = 0
+        self.close_fds = ()  # stop时关闭的伪终端fd
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=1.0)
+        for fd in self.close_fds:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _run(self):
+        buffer = bytearray()
+        while self.running:
+            try:
+                if not select.select([self.fd], [], [], 0.1)[0]:
+                    continue
+                buffer += os.read(self.fd, 4096)
+            except OSError:
+                break
+            while len(buffer) >= 8:
+                request = bytes(buffer[:8])
+                if not check_crc(request):
+                    del buffer[:1]  # 重新同步
+                    continue
+                del buffer[:8]
+                self.requests += 1
+                reply = self.reply(request)
+                if reply is None or random.random() < self.drop_rate:
+                    continue
+                if self.delay:
+                    time.sleep(self.delay)
+                os.write(self.fd, reply)
+
+    def reply(self, request):
+        slave, function = request[0], request[1]
+        if slave not in self.registers:
+            return None
+        address = int.from_bytes(request[2:4], 'big')
+        count = int.from_bytes(request[4:6], 'big')
+        if function not in READ_FUNCTIONS:
+            return append_crc(bytes((slave, function | 0x80, 1)))
+        if not 1 <= count <= READ_FUNCTIONS[function]:
+            return append_crc(bytes((slave, function | 0x80, 3)))
+        table = self.registers[slave]
+        values = [table.get(a, 0) for a in range(address, address + count)]
+        if function in (1, 2):
+            payload = bytearray((count + 7) // 8)
+            for i, value in enumerate(values):
+                if value:
+                    payload[i >> 3] |= 1 << (i & 7)
+        else:
+            payload = b"".join((value & 0xFFFF).to_bytes(2, 'big') for value in values)
+        return append_crc(bytes((slave, function, len(payload))) + bytes(payload))
+
+
+def open_simulator(points, delay=0.0, drop_rate=0.0):
+    """创建伪终端和模拟从站，返回(从站对象, 主站端设备名)"""
+    from rs485_pty import open_pty
+    master, port, slave_fd = open_pty()
+    registers = collections.defaultdict(dict)
+    for point in points:
+        registers[point.slave][point.address] = (point.slave << 8) | (point.address & 0xFF)
+    simulator = SimulatedSlave(master, dict(registers), delay, drop_rate)
+    simulator.close_fds = (master, slave_fd)
+    simulator.start()
+    return simulator, port
+
+
+def format_stats(stats):
+    lines = [f"{stats['requests']} 个读请求，共轮询 {stats['polls']} 次（{stats['polls_per_s']} 次/秒），"
+             f"总线占用 {stats['bus_busy_pct']}%"]
+    for device in stats['devices']:
+        lines.append(
+            f"从站{device['slave']:>3}: 请求 {device['requests']}，应答 {device['responses']}，"
+            f"超时 {device['timeouts']}，错误 {device['errors']}，异常 {device['exceptions']}，"
+            f"延迟 平均 {device['latency_avg_ms']} ms / 最小 {device['latency_min_ms']} ms / "
+            f"最大 {device['latency_max_ms']} ms"
+            + (f"，最近错误：{device['last_error']}" if device['last_error'] else "")
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modbus RTU 主站轮询")
+    parser.add_argument("--port", default="", help="串口，如 COM3 或 /dev/ttyUSB0")
+    parser.add_argument("--baud", type=int, default=9600, help="波特率")
+    parser.add_argument("--points", required=True, help="轮询点，如 \"1:3:0-9,2:4:100-103\"")
+    parser.add_argument("--interval", type=float, default=1.0, help="轮询周期（秒），0表示连续轮询")
+    parser.add_argument("--timeout", type=float, default=0.2, help="应答超时（秒，不含发送时间）")
+    parser.add_argument("--max-gap", type=int, default=4, help="合并读取时允许跨过的空地址数")
+    parser.add_argument("--duration", type=float, default=0, help="运行时间（秒），0表示直到Ctrl+C")
+    parser.add_argument("--quiet", action="store_true", help="不输出读到的值，只输出统计")
+    parser.add_argument("--simulate", action="store_true", help="使用伪终端模拟从站（仅Linux/macOS）")
+    parser.add_argument("--sim-delay", type=float, default=0.0, help="模拟从站的应答延迟（秒）")
+    parser.add_argument("--sim-drop", type=float, default=0.0, help="模拟从站随机不应答的比例")
+    args = parser.parse_args(argv)
+
+    try:
+        points = parse_points(args.points)
+    except ValueError as e:
+        print(f"参数错误：{str(e)}", file=sys.stderr)
+        return 1
+    blocks = coalesce(points, args.max_gap)
+    print(f"{len(points)} 个轮询点合并为 {len(blocks)} 个读请求", file=sys.stderr)
+
+    from rs485_terminal import RS485Terminal
+
+    port = args.port
+    simulator = None
+    if args.simulate:
+        simulator, port = open_simulator(points, args.sim_delay, args.sim_drop)
+    elif not port:
+        print("请指定 --port 或 --simulate", file=sys.stderr)
+        return 1
+
+    terminal = RS485Terminal(log_enabled=not args.simulate)
+    ok, message = terminal.connect(port, args.baud)
+    print(message, file=sys.stderr)
+    if not ok:
+        return 1
+
+    def print_values(slave, function, values, timestamp):
+        text = " ".join(f"{address}={value}" for address, value in values.items())
+        print(f"[{time.strftime('%H:%M:%S', time.localtime(timestamp))}] 从站{slave} 功能码{function}: {text}")
+
+    poller = ModbusPoller(terminal, blocks, args.interval, args.timeout,
+                          None if args.quiet else print_values)
+    poller.start()
+    try:
+        if args.duration:
+            time.sleep(args.duration)
+        else:
+            while True:
+                time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        poller.stop()
+        terminal.close()
+        if simulator:
+            simulator.stop()
+    print(format_stats(poller.stats()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""多串口同时监视（Linux/macOS）
+
+所有串口由一个线程中的selectors事件循环读取（串口fd为非阻塞，数据到达才读），
+不为每个串口开线程。各串口分别分帧后按时间戳合并为一个带端口列的数据流。
+
+端口写法（逗号分隔）：[名称=]设备[@波特率]，未写名称时用设备名
+    A=/dev/ttyUSB0,B=/dev/ttyUSB1@19200,/dev/ttyUSB2
+
+示例：
+    python rs485_cli.py monitor --ports "A=/dev/ttyUSB0,B=/dev/ttyUSB1" --baud 9600
+"""
+import os
+import time
+import heapq
+import selectors
+import threading
+import collections
+import serial
+from rs485_codec import format_hex
+from rs485_framing import SilenceFramer, make_framer
+from rs485_log import BinaryLogWriter
+from rs485_terminal import format_time
+
+# 合并流中的一帧：port为端口名称
+PortFrame = collections.namedtuple('PortFrame', ['port', 'data', 'timestamp'])
+
+
+def parse_ports(text, baudrate=9600):
+    """解析端口列表，返回[(名称, 设备, 波特率)]"""
+    ports = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, device = item.rpartition('=')
+        device, _, baud = device.partition('@')
+        device = device.strip()
+        if not device:
+            raise ValueError(f"端口格式错误：{item}")
+        ports.append((name.strip() or os.path.basename(device), device, int(baud) if baud else baudrate))
+    names = [name for name, _, _ in ports]
+    if len(set(names)) != len(names):
+        raise ValueError("端口名称重复")
+    return ports
+
+
+class PortState:
+    """单个串口的状态和统计"""
+    def __init__(self, name, device, baudrate, framer):
+        self.name = name
+        self.device = device
+        self.baudrate = baudrate
+        self.framer = framer
+        self.ser = None
+        self.log_writer = None
+        self.bytes = 0
+        self.frames = 0
+        self.reads = 0
+        self.error = ""
+
+
+class MultiPortMonitor:
+    """多串口监视
+
+    frame_callback(frames) 在事件循环线程中整批调用，frames为按时间戳排序的PortFrame列表。
+    不同串口的帧在完成分帧后最多保留merge_delay秒再输出，用于把稍晚完成的帧排到正确位置。
+    log_dir不为空时每个串口写各自的二进制日志（{日期}_rs485_{名称}.bin）。
+    """
+    def __init__(self, ports, frame_callback, framing='silence', delimiter=b'\r\n', merge_delay=0.05,
+                 log_dir=None, error_callback=None):
+        if os.name == 'nt':
+            raise RuntimeError("多串口监视使用select等待串口fd，仅支持Linux/macOS")
+        self.states = [PortState(name, device, baudrate, make_framer(framing, baudrate, delimiter))
+                       for name, device, baudrate in ports]
+        self.frame_callback = frame_callback
+        self.error_callback = error_callback
+        self.merge_delay = merge_delay
+        self.log_dir = log_dir
+        self.selector = None
+        self.running = False
+        self.thread = None
+        self.pending = []  # 等待合并输出的帧：(开始时间, 序号, 端口, 数据)
+        self.sequence = 0
+
+        # 统计
+        self.loops = 0
+        self.max_batch = 0
+
+    def open(self):
+        """打开全部串口，任一失败时关闭已打开的并抛出异常"""
+        self.selector = selectors.DefaultSelector()
+        try:
+            for state in self.states:
+                # pyserial在POSIX上以O_NONBLOCK打开，fd可直接交给selector
+                state.ser = serial.Serial(state.device, state.baudrate, timeout=0)
+                self.selector.register(state.ser.fileno(), selectors.EVENT_READ, state)
+                if self.log_dir:
+                    state.log_writer = BinaryLogWriter(self.log_dir, name=f"rs485_{state.name}")
+                    state.log_writer.start()
+        except Exception:
+            self.close()
+            raise
+
+    def start(self):
+        if self.selector is None:
+            self.open()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.running = False
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        for state in self.states:
+            if state.ser and state.ser.is_open:
+                state.ser.close()
+            if state.log_writer:
+                state.log_writer.close()
+                state.log_writer = None
+        if self.selector:
+            self.selector.close()
+            self.selector = None
+
+    def _run(self):
+        wall_offset = time.time() - time.perf_counter()
+        selector = self.selector
+        pending = self.pending
+        # 静默分帧的串口有未完成帧时，按静默时间醒来检查
+        pollers = [state for state in self.states if isinstance(state.framer, SilenceFramer)]
+        while self.running:
+            timeout = 0.2
+            for state in pollers:
+                if state.framer.buffer:
+                    timeout = min(timeout, state.framer.gap)
+            if pending:
+                timeout = min(timeout, max(0.0, pending[0][0] + self.merge_delay - time.perf_counter()))
+            events = selector.select(timeout)
+            now = time.perf_counter()
+            self.loops += 1
+            for key, _ in events:
+                state = key.data
+                try:
+                    data = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    self._port_error(state, e)
+                    continue
+                if not data:
+                    continue
+                state.reads += 1
+                state.bytes += len(data)
+                self._queue(state, state.framer.feed(data, now))
+            for state in pollers:
+                if state.framer.buffer:
+                    self._queue(state, state.framer.poll(now))
+            if pending:
+                self._release(now, wall_offset)
+        self._release(float('inf'), wall_offset)
+
+    def _queue(self, state, frames):
+        for data, start in frames:
+            state.frames += 1
+            heapq.heappush(self.pending, (start, self.sequence, state, data))
+            self.sequence += 1
+
+    def _release(self, now, wall_offset):
+        limit = now - self.merge_delay
+        pending = self.pending
+        batch = []
+        while pending and pending[0][0] <= limit:
+            start, _, state, data = heapq.heappop(pending)
+            timestamp = start + wall_offset
+            batch.append(PortFrame(state.name, data, timestamp))
+            if state.log_writer:
+                state.log_writer.write('RX', data, timestamp)
+        if batch:
+            if len(batch) > self.max_batch:
+                self.max_batch = len(batch)
+            self.frame_callback(batch)
+
+    def _port_error(self, state, error):
+        """读串口出错（如USB转串口被拔出）：停止监视该串口，其他串口继续"""
+        state.error = str(error)
+        try:
+            self.selector.unregister(state.ser.fileno())
+        except (KeyError, ValueError):
+            pass
+        if state.log_writer:
+            state.log_writer.write('ERROR', f"接收错误: {state.error}")
+        if self.error_callback:
+            self.error_callback(state.name, error)
+
+    def write(self, name, data):
+        """向指定串口发送数据"""
+        for state in self.states:
+            if state.name == name:
+                state.ser.write(data)
+                if state.log_writer:
+                    state.log_writer.write('TX', data)
+                return
+        raise KeyError(f"未知端口：{name}")
+
+    def stats(self):
+        return {
+            'loops': self.loops,
+            'max_batch': self.max_batch,
+            'ports': [{'port': state.name, 'device': state.device, 'bytes': state.bytes,
+                       'frames': state.frames, 'reads': state.reads, 'error': state.error}
+                      for state in self.states]
+        }
+
+
+def format_frame(frame, width):
+    """合并流的一行：时间 | 端口 | 长度 | 数据"""
+    return (f"[{format_time(frame.timestamp)}] {frame.port:<{width}} | "
+            f"{len(frame.data):>4} bytes | {format_hex(frame.data)}")
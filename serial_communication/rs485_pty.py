@@ -0,0 +1,62 @@
+"""伪终端虚拟串口（仅Linux/macOS），用于无硬件测试
+
+open_pty()          一个伪终端：主端fd + 设备名 + 从端fd（用串口打开设备名，另一端用主端fd直接读写）
+VirtualSerialPair   两个互相转发的伪终端，相当于
+                    socat pty,raw,echo=0 pty,raw,echo=0
+"""
+import os
+import pty
+import tty
+import select
+import threading
+
+
+def open_pty():
+    """返回(主端fd, 从端设备名, 从端fd)，两端均为raw模式，从端fd由调用方在用完后关闭"""
+    master, slave = pty.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    name = os.ttyname(slave)
+    # 从端保持打开，否则串口关闭后主端读到EIO
+    return master, name, slave
+
+
+class VirtualSerialPair:
+    """虚拟串口对：写入ports[0]的数据从ports[1]读出，反之亦然"""
+    def __init__(self):
+        self.master_a, port_a, self.slave_a = open_pty()
+        self.master_b, port_b, self.slave_b = open_pty()
+        self.ports = (port_a, port_b)
+        self.running = True
+        self.bytes = 0
+        self.thread = threading.Thread(target=self._relay, daemon=True)
+        self.thread.start()
+
+    def _relay(self):
+        peer = {self.master_a: self.master_b, self.master_b: self.master_a}
+        while self.running:
+            try:
+                readable, _, _ = select.select(list(peer), [], [], 0.1)
+                for fd in readable:
+                    data = os.read(fd, 65536)
+                    self.bytes += len(data)
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(peer[fd], view):]
+            except OSError:
+                break
+
+    def close(self):
+        self.running = False
+        self.thread.join(timeout=1.0)
+        for fd in (self.master_a, self.master_b, self.slave_a, self.slave_b):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
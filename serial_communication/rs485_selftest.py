@@ -0,0 +1,343 @@
+"""用伪终端虚拟串口自检（仅Linux/macOS，不需要硬件）
+
+    python rs485_cli.py selftest [--verbose]
+
+每项检查在独立的虚拟串口上运行：采集与二进制日志、请求/应答事务与脚本、
+Modbus轮询、序列发送、TCP桥接、TCP/UDP转发、多串口监视。全部通过时返回0。
+"""
+import os
+import sys
+import time
+import select
+import socket
+import tempfile
+from rs485_pty import VirtualSerialPair
+from rs485_terminal import RS485Terminal
+
+
+def wait_until(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def check_capture():
+    """对端发送的帧按分隔符分帧，写入二进制日志后能完整读回"""
+    from rs485_log import iter_records
+
+    frames = [f"frame {i:04d}\r\n".encode('ascii') for i in range(500)]
+    with tempfile.TemporaryDirectory() as log_dir, VirtualSerialPair() as pair:
+        receiver = RS485Terminal(log_dir=log_dir)
+        receiver.framing = 'delimiter'
+        sender = RS485Terminal(log_enabled=False)
+        try:
+            for terminal, port in ((receiver, pair.ports[0]), (sender, pair.ports[1])):
+                ok, message = terminal.connect(port, 115200)
+                if not ok:
+                    return False, message
+            sender.ser.write(b"".join(frames))
+            wait_until(lambda: receiver.engine.frames >= len(frames))
+        finally:
+            receiver.close()
+            sender.close()
+        received = [data for path in sorted(os.listdir(log_dir))
+                    for _, kind, data in iter_records(os.path.join(log_dir, path)) if kind == 'RX']
+    if received != frames:
+        return False, f"日志中 {len(received)} 帧，期望 {len(frames)} 帧"
+    return True, f"{len(frames)} 帧写入并读回"
+
+
+def check_transact():
+    """模拟从站上的请求/应答事务和脚本"""
+    from rs485_modbus import open_simulator, parse_points, read_request, check_crc
+    from rs485_transact import parse_script, run_script
+    from rs485_framing import LengthFramer
+
+    simulator, port = open_simulator(parse_points("1:3:0-9"))
+    terminal = RS485Terminal(log_enabled=False)
+    try:
+        ok, message = terminal.connect(port, 115200)
+        if not ok:
+            return False, message
+        reply = terminal.transact(read_request(1, 3, 0, 2), LengthFramer(9), timeout=0.5)
+        if reply.data[:7] != bytes.fromhex("01 03 04 01 00 01 01") or not check_crc(reply.data):
+            return False, f"应答错误：{reply.data.hex(' ')}"
+        try:
+            terminal.transact(read_request(9, 3, 0, 1), LengthFramer(7), timeout=0.05)
+            return False, "不存在的从站不应有应答"
+        except TimeoutError:
+            pass
+        script = "01 03 00 00 00 02 C4 0B => 01 03 04 01 00 01 01 XX XX\n01 03 00 00 00 02 C4 0B => len 9\n"
+        passed, failed = run_script(terminal.transactor, parse_script(script), timeout=0.5, repeat=100)
+    finally:
+        terminal.close()
+        simulator.stop()
+    if failed:
+        return False, f"脚本失败 {failed} 次"
+    return True, f"脚本通过 {passed} 次，延迟 {terminal.transactor.histogram.summary()}"
+
+
+def check_modbus():
+    """Modbus轮询：合并读请求，连续轮询无超时和错误"""
+    from rs485_modbus import open_simulator, parse_points, coalesce, ModbusPoller
+
+    points = parse_points("1:3:0-9,1:3:12,2:4:0-3,3:1:0-15")
+    blocks = coalesce(points)
+    if len(blocks) != 3:
+        return False, f"合并结果为 {len(blocks)} 个读请求，期望3个"
+    values = {}
+    simulator, port = open_simulator(points)
+    terminal = RS485Terminal(log_enabled=False)
+    try:
+        ok, message = terminal.connect(port, 115200)
+        if not ok:
+            return False, message
+        poller = ModbusPoller(terminal, blocks, interval=0, timeout=0.2,
+                              value_callback=lambda slave, function, data, ts: values.update(
+                                  {(slave, function, address): value for address, value in data.items()}))
+        poller.start()
+        time.sleep(0.5)
+        poller.stop()
+    finally:
+        terminal.close()
+        simulator.stop()
+    stats = poller.stats()
+    failures = sum(device['timeouts'] + device['errors'] + device['exceptions'] for device in stats['devices'])
+    if failures or not stats['polls']:
+        return False, f"轮询 {stats['polls']} 次，失败 {failures} 次"
+    if values.get((1, 3, 12)) != 0x010C or values.get((2, 4, 3)) != 0x0203 or values.get((3, 1, 15)) != 1:
+        return False, "读到的值不正确"
+    return True, f"轮询 {stats['polls']} 次（{stats['polls_per_s']} 次/秒）"
+
+
+def check_sequence():
+    """序列发送：动态字段和CRC正确，按间隔定时发送"""
+    from rs485_pty import open_pty
+    from rs485_modbus import check_crc
+    from rs485_sequence import parse_sequence, SequenceSender
+
+    steps = parse_sequence("interval 1\n01 06 00 01 {inc16:100} {crc} x 200\n"
+                           "interval 0\n02 10 {rand:4} {crc} x 200\n")
+    master, port, slave = open_pty()
+    terminal = RS485Terminal(log_enabled=False)
+    try:
+        ok, message = terminal.connect(port, 115200)
+        if not ok:
+            return False, message
+        sender = SequenceSender(terminal, steps)
+        sender.start()
+        received = bytearray()
+        end = time.monotonic() + 2.0
+        while len(received) < 400 * 8 and time.monotonic() < end:
+            if select.select([master], [], [], 0.1)[0]:
+                received += os.read(master, 65536)
+        sender.stop()
+    finally:
+        terminal.close()
+        os.close(master)
+        os.close(slave)
+    frames = [bytes(received[i:i + 8]) for i in range(0, len(received), 8)]
+    if len(frames) != 400 or not all(check_crc(frame) for frame in frames):
+        return False, f"收到 {len(frames)} 帧，CRC正确 {sum(check_crc(frame) for frame in frames)} 帧"
+    if [int.from_bytes(frame[4:6], 'big') for frame in frames[:200]] != list(range(100, 300)):
+        return False, "递增字段不正确"
+    stats = sender.stats()
+    if stats['elapsed'] < 0.199:
+        return False, f"200帧按1毫秒间隔只用了 {stats['elapsed']} 秒"
+    return True, f"{stats['frames']} 帧，发送时刻延迟 {stats['jitter']}"
+
+
+def check_bridge():
+    """TCP桥接双向转发"""
+    from rs485_cli import SerialBridge
+
+    with VirtualSerialPair() as pair:
+        serial_side = RS485Terminal(log_enabled=False)
+        serial_side.framing = 'raw'
+        device = RS485Terminal(log_enabled=False)
+        bridge = None
+        try:
+            for terminal, port in ((serial_side, pair.ports[0]), (device, pair.ports[1])):
+                ok, message = terminal.connect(port, 115200)
+                if not ok:
+                    return False, message
+            bridge = SerialBridge(serial_side, '127.0.0.1', 0)
+            received = bytearray()
+            device.add_frame_listener(lambda frames: received.extend(b"".join(f.data for f in frames)))
+            with socket.create_connection(bridge.address, timeout=2.0) as client:
+                wait_until(lambda: bridge.client is not None)
+                client.sendall(b"\x01\x02\x03 to serial")
+                if not wait_until(lambda: bytes(received) == b"\x01\x02\x03 to serial"):
+                    return False, f"串口端收到 {bytes(received)!r}"
+                device.ser.write(b"to tcp \xff")
+                data = b""
+                while len(data) < 8:
+                    chunk = client.recv(64)
+                    if not chunk:
+                        break
+                    data += chunk
+                if data != b"to tcp \xff":
+                    return False, f"TCP端收到 {data!r}"
+        finally:
+            if bridge:
+                bridge.close()
+            serial_side.close()
+            device.close()
+    return True, "双向转发正常"
+
+
+def check_stream(clients=4):
+    """TCP/UDP转发：每个客户端收到完整数据，不读数据的客户端被断开而不影响其他客户端"""
+    from rs485_stream import StreamServer
+
+    frames = [f"frame {i:04d}\r\n".encode('ascii') for i in range(5000)]
+    expected = b"".join(frames)
+    with VirtualSerialPair() as pair:
+        serial_side = RS485Terminal(log_enabled=False)
+        serial_side.framing = 'delimiter'
+        device = RS485Terminal(log_enabled=False)
+        device.framing = 'raw'
+        udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp.bind(('127.0.0.1', 0))
+        udp.settimeout(0.5)
+        server = None
+        sockets = []
+        try:
+            for terminal, port in ((serial_side, pair.ports[0]), (device, pair.ports[1])):
+                ok, message = terminal.connect(port, 115200)
+                if not ok:
+                    return False, message
+            server = StreamServer(serial_side, '127.0.0.1', 0, max_buffer=16 * 1024,
+                                  udp_targets=[udp.getsockname()])
+            server.start()
+            for _ in range(clients):
+                sockets.append(socket.create_connection(server.address, timeout=2.0))
+            # 最后一个客户端从不读取；缩小两端的socket缓冲，让它很快积压到上限
+            stalled = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            stalled.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            stalled.connect(server.address)
+            sockets.append(stalled)
+            if not wait_until(lambda: len(server.clients) == clients + 1):
+                return False, f"已连接 {len(server.clients)} 个客户端"
+            server.clients[-1].sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            readers = sockets[:clients]
+            received = [bytearray() for _ in readers]
+            datagrams = bytearray()
+            for i in range(0, len(frames), 100):
+                device.ser.write(b"".join(frames[i:i + 100]))
+                for sock, data in zip(readers, received):
+                    sock.setblocking(False)
+                    try:
+                        while True:
+                            chunk = sock.recv(65536)
+                            if not chunk:
+                                break
+                            data += chunk
+                    except BlockingIOError:
+                        pass
+                time.sleep(0.005)
+            for sock, data in zip(readers, received):
+                sock.settimeout(1.0)
+                while len(data) < len(expected):
+                    chunk = sock.recv(65536)
+                    if not chunk:
+                        break
+                    data += chunk
+            try:
+                while len(datagrams) < len(expected):
+                    datagrams += udp.recv(65536)
+            except socket.timeout:
+                pass
+            if any(bytes(data) != expected for data in received):
+                return False, f"客户端收到 {[len(data) for data in received]} 字节，期望 {len(expected)} 字节"
+            if bytes(datagrams) != expected:
+                return False, f"UDP收到 {len(datagrams)} 字节，期望 {len(expected)} 字节"
+            if server.dropped_clients != 1:
+                return False, f"断开慢客户端 {server.dropped_clients} 个，期望1个"
+            echo = bytearray()
+            device.add_frame_listener(lambda frames: echo.extend(b"".join(f.data for f in frames)))
+            sockets[0].sendall(b"to serial")
+            if not wait_until(lambda: bytes(echo) == b"to serial"):
+                return False, f"串口端收到 {bytes(echo)!r}"
+            stats = server.stats()
+        finally:
+            for sock in sockets:
+                sock.close()
+            udp.close()
+            if server:
+                server.close()
+            serial_side.close()
+            device.close()
+    return True, f"{clients} 个客户端各收到 {stats['frames']} 帧，延迟 {stats['latency']}"
+
+
+def check_multiport(count=16):
+    """多串口监视：一个事件循环读取全部串口，合并流按时间排序且各端口的帧完整"""
+    from rs485_pty import open_pty
+    from rs485_multiport import MultiPortMonitor
+
+    fds = []
+    received = []
+    try:
+        ports = []
+        for i in range(count):
+            master, port, slave = open_pty()
+            fds.extend((master, slave))
+            ports.append((f"P{i:02d}", port, 115200))
+        monitor = MultiPortMonitor(ports, received.extend, framing='delimiter', delimiter=b'\n', merge_delay=0.02)
+        monitor.start()
+        try:
+            rounds = 50
+            for n in range(rounds):
+                for i in range(count):
+                    os.write(fds[i * 2], f"{i:02d}:{n:03d}\n".encode('ascii'))
+            wait_until(lambda: len(received) >= rounds * count)
+        finally:
+            monitor.close()
+    finally:
+        for fd in fds:
+            os.close(fd)
+    if len(received) != rounds * count:
+        return False, f"收到 {len(received)} 帧，期望 {rounds * count} 帧"
+    if any(a.timestamp > b.timestamp for a, b in zip(received, received[1:])):
+        return False, "合并流时间戳未排序"
+    for i in range(count):
+        frames = [frame.data for frame in received if frame.port == f"P{i:02d}"]
+        if frames != [f"{i:02d}:{n:03d}\n".encode('ascii') for n in range(rounds)]:
+            return False, f"端口P{i:02d}的帧不完整或乱序"
+    return True, f"{count} 个串口共 {len(received)} 帧，事件循环 {monitor.loops} 次"
+
+
+CHECKS = [
+    ("采集与二进制日志", check_capture),
+    ("请求/应答事务", check_transact),
+    ("Modbus轮询", check_modbus),
+    ("序列发送", check_sequence),
+    ("TCP桥接", check_bridge),
+    ("TCP/UDP转发", check_stream),
+    ("多串口监视", check_multiport),
+]
+
+
+def run_all(verbose=False):
+    if sys.platform.startswith('win'):
+        print("自检需要伪终端，仅支持Linux/macOS", file=sys.stderr)
+        return 1
+    failed = 0
+    for name, check in CHECKS:
+        start = time.perf_counter()
+        try:
+            ok, detail = check()
+        except Exception as e:
+            ok, detail = False, f"{type(e).__name__}: {str(e)}"
+        elapsed = (time.perf_counter() - start) * 1000
+        failed += not ok
+        line = f"[{'通过' if ok else '失败'}] {name}（{elapsed:.0f} ms）"
+        if verbose or not ok:
+            line += f"：{detail}"
+        print(line)
+    print(f"{len(CHECKS) - failed}/{len(CHECKS)} 项通过")
+    return 1 if failed else 0
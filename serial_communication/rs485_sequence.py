@@ -0,0 +1,364 @@
+"""RS485 序列发送（压力测试）
+
+按序列文件连续发送帧，不等应答。发送时刻由调度器按绝对时间计算：先sleep到目标时刻前
+spin秒，剩下的时间忙等，间隔精度不受time.sleep粒度影响，前一帧晚了也不会累积误差。
+统计实际发送速率、线路占用率和每帧相对计划时刻的延迟（抖动）。
+
+序列文件每行一条，# 开头为注释：
+    interval 5                          之后的帧按5毫秒间隔发送，0为尽快发送
+    interval line                       按帧在线路上的传输时间 + 3.5字符间隔发送（线速）
+    rate 200                            之后的帧按每秒200帧发送
+    01 06 00 01 {inc16} {crc} x 1000    发送1000次，x N为重复次数
+    delay 100                           等待100毫秒
+    01 10 00 00 00 04 08 {rand:8} {crc}
+
+帧中的动态字段：
+    {inc} {inc16} {inc32}     每次发送加1的1/2/4字节计数（高字节在前），
+                              可写初值和步长 {inc16:100:2}
+    {rand} {rand16} {rand:N}  1/2/N字节随机数
+    {crc}                     Modbus CRC16（字段之前的全部字节，低字节在前）
+
+示例：
+    python rs485_sequence.py --port /dev/ttyUSB0 --baud 115200 --file load.txt --repeat 10
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+import collections
+from rs485_codec import parse_hex
+from rs485_modbus import crc16
+from rs485_transact import LatencyHistogram
+
+# Windows的time.sleep粒度约15ms，其他系统约0.1ms
+SPIN = 0.016 if os.name == 'nt' else 0.002
+
+FIELD = re.compile(r'\{([^{}]*)\}')
+REPEAT = re.compile(r'\s+[xX]\s*(\d+)\s*$')
+INT_SIZES = {'inc': 1, 'inc16': 2, 'inc32': 4}
+
+
+class JitterHistogram(LatencyHistogram):
+    """发送时刻延迟通常在毫秒以下，用更细的分桶"""
+    BOUNDS_MS = (0.01, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 50, 100)
+
+
+class Counter:
+    """递增字段"""
+    def __init__(self, size, start=0, step=1):
+        self.size = size
+        self.start = start
+        self.step = step
+        self.value = start
+
+    def reset(self):
+        self.value = self.start
+
+    def render(self, frame):
+        data = (self.value % (1 << (8 * self.size))).to_bytes(self.size, 'big')
+        self.value += self.step
+        return data
+
+
+class Random:
+    """随机字段"""
+    def __init__(self, size):
+        self.size = size
+
+    def reset(self):
+        pass
+
+    def render(self, frame):
+        return random.getrandbits(8 * self.size).to_bytes(self.size, 'big')
+
+
+class Crc:
+    """Modbus CRC16，计算已生成的全部字节"""
+    size = 2
+
+    def reset(self):
+        pass
+
+    def render(self, frame):
+        return crc16(frame).to_bytes(2, 'little')
+
+
+def parse_field(text):
+    name, *args = [part.strip() for part in text.split(':')]
+    name = name.lower()
+    try:
+        values = [int(arg, 0) for arg in args]
+    except ValueError:
+        raise ValueError(f"字段参数错误：{{{text}}}")
+    if name in INT_SIZES and len(values) <= 2:
+        return Counter(INT_SIZES[name], *values)
+    if name == 'rand' and len(values) <= 1:
+        return Random(values[0] if values else 1)
+    if name == 'rand16' and not values:
+        return Random(2)
+    if name == 'crc' and not values:
+        return Crc()
+    raise ValueError(f"未知字段：{{{text}}}")
+
+
+class Template:
+    """一帧的模板：固定字节和动态字段，没有动态字段时只生成一次"""
+    def __init__(self, text):
+        self.parts = []
+        position = 0
+        for match in FIELD.finditer(text):
+            constant = parse_hex(text[position:match.start()])
+            if constant:
+                self.parts.append(constant)
+            self.parts.append(parse_field(match.group(1)))
+            position = match.end()
+        if '{' in text[position:] or '}' in text[position:]:
+            raise ValueError("字段的括号不完整")
+        constant = parse_hex(text[position:])
+        if constant:
+            self.parts.append(constant)
+        if not self.parts:
+            raise ValueError("帧为空")
+        self.static = None
+        if all(isinstance(part, bytes) for part in self.parts):
+            self.static = b"".join(self.parts)
+        elif all(isinstance(part, (bytes, Crc)) for part in self.parts):
+            self.static = self._render()
+        self.size = sum(len(part) if isinstance(part, bytes) else part.size for part in self.parts)
+
+    def reset(self):
+        for part in self.parts:
+            if not isinstance(part, bytes):
+                part.reset()
+
+    def render(self):
+        return self.static if self.static is not None else self._render()
+
+    def _render(self):
+        frame = bytearray()
+        for part in self.parts:
+            frame += part if isinstance(part, bytes) else part.render(frame)
+        return bytes(frame)
+
+
+# 序列中的一步：template为None时只延时；interval为发送间隔（秒），'line'表示按线速
+Step = collections.namedtuple('Step', ['line', 'template', 'count', 'interval', 'delay'])
+
+
+def parse_interval(text):
+    text = text.strip().lower()
+    if text == 'line':
+        return 'line'
+    interval = float(text) / 1000
+    if interval < 0:
+        raise ValueError("间隔不能为负数")
+    return interval
+
+
+def parse_sequence(text, interval=0.0):
+    """解析序列文件，返回Step列表；interval为文件中未指定时的发送间隔（秒）"""
+    steps = []
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        keyword, _, value = line.partition(' ')
+        keyword = keyword.lower()
+        try:
+            if keyword == 'interval':
+                interval = parse_interval(value)
+            elif keyword == 'rate':
+                rate = float(value)
+                if rate <= 0:
+                    raise ValueError("速率必须大于0")
+                interval = 1 / rate
+            elif keyword == 'delay':
+                steps.append(Step(number, None, 1, interval, float(value) / 1000))
+            else:
+                count = 1
+                match = REPEAT.search(line)
+                if match:
+                    count = int(match.group(1))
+                    line = line[:match.start()]
+                steps.append(Step(number, Template(line), count, interval, 0.0))
+        except ValueError as e:
+            raise ValueError(f"第{number}行：{str(e)}")
+    if not any(step.template for step in steps):
+        raise ValueError("序列中没有要发送的帧")
+    return steps
+
+
+def sleep_until(deadline, stopped, spin=SPIN):
+    """等到perf_counter()到达deadline：先睡到deadline前spin秒，再忙等；停止时返回False"""
+    remaining = deadline - time.perf_counter()
+    if remaining > spin and stopped.wait(remaining - spin):
+        return False
+    while time.perf_counter() < deadline:
+        pass
+    return not stopped.is_set()
+
+
+class SequenceSender:
+    """按序列发送帧，repeat为整个序列的重复次数（0为一直重复到stop）
+
+    done_callback(stats) 在发送线程结束时调用。
+    """
+    def __init__(self, terminal, steps, repeat=1, spin=SPIN, done_callback=None):
+        self.terminal = terminal
+        self.steps = steps
+        self.repeat = repeat
+        self.spin = spin
+        self.done_callback = done_callback
+        self.stopped = threading.Event()
+        self.thread = None
+        self.jitter = JitterHistogram()  # 实际发送时刻相对计划时刻的延迟
+
+        # 统计
+        self.frames = 0
+        self.bytes = 0
+        self.overruns = 0  # 落后超过一个间隔而重新对齐计划的次数
+        self.elapsed = 0.0
+        self.char_time = 0.0  # 每字符在线路上的时间，用于计算线路占用率
+        self.error = ""
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread and self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2.0)
+
+    @property
+    def running(self):
+        return bool(self.thread and self.thread.is_alive())
+
+    def run(self):
+        """在当前线程中发送，直到序列完成或stop()"""
+        ser = self.terminal.ser
+        if not ser or not ser.is_open:
+            raise RuntimeError("未连接到串口")
+        char_time = self.char_time = (1 + ser.bytesize + (ser.parity != 'N') + ser.stopbits) / ser.baudrate
+        gap = 3.5 * char_time
+        log_data = self.terminal.log_data
+        jitter = self.jitter.add
+        stopped = self.stopped
+        spin = self.spin
+        for step in self.steps:
+            if step.template:
+                step.template.reset()
+
+        begin = deadline = time.perf_counter()
+        cycle = 0
+        try:
+            while not stopped.is_set() and (not self.repeat or cycle < self.repeat):
+                cycle += 1
+                for step in self.steps:
+                    if step.template is None:
+                        deadline += step.delay
+                        if not sleep_until(deadline, stopped, spin):
+                            return
+                        continue
+                    template = step.template
+                    interval = step.interval
+                    if interval == 'line':
+                        interval = template.size * char_time + gap
+                    for _ in range(step.count):
+                        data = template.render()
+                        if interval:
+                            if not sleep_until(deadline, stopped, spin):
+                                return
+                            now = time.perf_counter()
+                            late = now - deadline
+                            jitter(late)
+                            if late > interval:
+                                # 写串口阻塞或系统调度导致落后太多时，从现在重新计划，不连续补发
+                                self.overruns += 1
+                                deadline = now
+                            deadline += interval
+                        elif stopped.is_set():
+                            return
+                        ser.write(data)
+                        log_data('TX', data)
+                        self.frames += 1
+                        self.bytes += len(data)
+                    if not interval:
+                        deadline = time.perf_counter()
+        except Exception as e:
+            self.error = str(e)
+            log_data('ERROR', f"序列发送错误: {self.error}")
+        finally:
+            self.elapsed = time.perf_counter() - begin
+            if self.done_callback:
+                self.done_callback(self.stats())
+
+    def stats(self):
+        elapsed = self.elapsed or 1e-9
+        return {
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'elapsed': round(self.elapsed, 3),
+            'frames_per_s': round(self.frames / elapsed, 1),
+            'bytes_per_s': round(self.bytes / elapsed, 1),
+            'line_pct': round(self.bytes * self.char_time / elapsed * 100, 1),
+            'overruns': self.overruns,
+            'jitter': self.jitter.summary(),
+            'error': self.error
+        }
+
+
+def format_stats(stats):
+    text = (f"已发送 {stats['frames']} 帧 / {stats['bytes']} 字节，耗时 {stats['elapsed']:.2f} 秒，"
+            f"{stats['frames_per_s']} 帧/秒，{stats['bytes_per_s']} 字节/秒，线路占用 {stats['line_pct']}%\n"
+            f"发送时刻延迟：{stats['jitter']}，重新对齐 {stats['overruns']} 次")
+    if stats['error']:
+        text += f"\n错误：{stats['error']}"
+    return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RS485 序列发送（压力测试）")
+    parser.add_argument("--port", required=True, help="串口，如 COM3 或 /dev/ttyUSB0")
+    parser.add_argument("--baud", type=int, default=9600, help="波特率")
+    parser.add_argument("--file", required=True, help="序列文件")
+    parser.add_argument("--repeat", type=int, default=1, help="整个序列的重复次数，0表示直到Ctrl+C")
+    parser.add_argument("--interval", default="0", help="序列文件未指定时的发送间隔（毫秒），line表示按线速")
+    parser.add_argument("--spin", type=float, default=SPIN * 1000, help="发送前忙等的时间（毫秒）")
+    parser.add_argument("--no-log", action="store_true", help="不记录日志")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.file, encoding='utf-8') as f:
+            steps = parse_sequence(f.read(), parse_interval(args.interval))
+    except (OSError, ValueError) as e:
+        print(f"序列错误：{str(e)}", file=sys.stderr)
+        return 1
+
+    from rs485_terminal import RS485Terminal
+
+    terminal = RS485Terminal(log_enabled=not args.no_log)
+    ok, message = terminal.connect(args.port, args.baud)
+    print(message, file=sys.stderr)
+    if not ok:
+        return 1
+    sender = SequenceSender(terminal, steps, args.repeat, args.spin / 1000)
+    try:
+        sender.run()
+        terminal.ser.flush()
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+    finally:
+        terminal.close()
+    print(format_stats(sender.stats()), file=sys.stderr)
+    # 分布图的第一行与统计中的延迟摘要相同
+    print("\n".join(sender.jitter.format().splitlines()[1:]), file=sys.stderr)
+    return 1 if sender.error else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
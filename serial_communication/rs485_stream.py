@@ -0,0 +1,257 @@
+"""串口数据TCP/UDP转发服务
+
+把RS485Terminal收到的帧实时转发给多个TCP客户端（以及可选的UDP目标），
+客户端发来的数据写入串口。所有客户端由一个selectors线程处理：接收线程只把数据
+追加到各客户端的发送缓冲区，缓冲区超过上限的客户端（处理太慢）直接断开，
+不会拖慢串口接收和其他客户端。
+
+输出格式：
+    raw      原始字节流（与桥接相同）
+    record   每帧一条记录，与二进制日志相同：<d 时间戳><B 类型=0><I 长度><数据>
+
+示例：
+    python rs485_cli.py serve --port /dev/ttyUSB0 --baud 9600 --listen 0.0.0.0:4002 --format record
+"""
+import time
+import socket
+import selectors
+import threading
+import collections
+from rs485_log import RECORD_HEADER, TYPE_CODES
+from rs485_transact import LatencyHistogram
+
+FORMATS = ('raw', 'record')
+
+
+class StreamClient:
+    """一个TCP客户端的发送缓冲和统计"""
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.buffer = bytearray()
+        self.marks = collections.deque()  # (累计字节数, 帧到达时间)，用于计算转发延迟
+        self.queued = 0
+        self.sent = 0
+        self.received = 0
+        self.overflow = False
+        self.writing = False  # 是否已注册可写事件
+
+    @property
+    def name(self):
+        return f"{self.address[0]}:{self.address[1]}"
+
+
+class StreamServer:
+    """TCP/UDP转发服务
+
+    max_buffer为每个客户端未发出数据的上限（字节），超过时断开该客户端；
+    accept_writes为False时忽略客户端发来的数据。延迟统计为帧首字节从串口读到
+    到该帧最后一个字节交给socket发送的时间。
+    """
+    def __init__(self, terminal, host='0.0.0.0', port=4002, format='raw', max_buffer=1024 * 1024,
+                 accept_writes=True, udp_targets=(), event_callback=None):
+        if format not in FORMATS:
+            raise ValueError(f"未知的输出格式: {format}")
+        self.terminal = terminal
+        self.format = format
+        self.max_buffer = max_buffer
+        self.accept_writes = accept_writes
+        self.udp_targets = list(udp_targets)
+        self.event_callback = event_callback  # 客户端连接/断开时调用，参数为文本
+        self.clients = []
+        self.lock = threading.Lock()
+        self.histogram = LatencyHistogram()
+        self.running = False
+        self.thread = None
+
+        self.server = socket.create_server((host, port))
+        self.server.setblocking(False)
+        self.address = self.server.getsockname()
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) if self.udp_targets else None
+        # 接收线程通过socketpair唤醒事件循环
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.wake_w.setblocking(False)
+        self.wake_pending = False
+
+        # 统计
+        self.frames = 0
+        self.bytes = 0
+        self.dropped_clients = 0
+        self.udp_errors = 0
+
+    def start(self):
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ, 'accept')
+        self.selector.register(self.wake_r, selectors.EVENT_READ, 'wake')
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.terminal.add_frame_listener(self.publish)
+
+    def close(self):
+        self.terminal.remove_frame_listener(self.publish)
+        self.running = False
+        self._wake()
+        if self.thread and self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+        with self.lock:
+            for client in self.clients:
+                client.sock.close()
+            self.clients = []
+        for sock in (self.server, self.wake_r, self.wake_w, self.udp):
+            if sock:
+                sock.close()
+
+    def encode(self, frames):
+        if self.format == 'record':
+            pack = RECORD_HEADER.pack
+            code = TYPE_CODES['RX']
+            return b"".join(pack(frame.timestamp, code, len(frame.data)) + frame.data for frame in frames)
+        return b"".join(frame.data for frame in frames)
+
+    def publish(self, frames):
+        """接收线程回调：追加到各客户端的发送缓冲并唤醒事件循环"""
+        payload = self.encode(frames)
+        stamp = frames[0].timestamp
+        self.frames += len(frames)
+        self.bytes += len(payload)
+        for target in self.udp_targets:
+            try:
+                self.udp.sendto(payload, target)
+            except OSError:
+                self.udp_errors += 1
+        with self.lock:
+            for client in self.clients:
+                if client.overflow:
+                    continue
+                if len(client.buffer) + len(payload) > self.max_buffer:
+                    client.overflow = True
+                    continue
+                client.buffer += payload
+                client.queued += len(payload)
+                client.marks.append((client.queued, stamp))
+        self._wake()
+
+    def _wake(self):
+        if not self.wake_pending:
+            self.wake_pending = True
+            try:
+                self.wake_w.send(b'\0')
+            except OSError:
+                pass
+
+    def _run(self):
+        selector = self.selector
+        while self.running:
+            for key, mask in selector.select(0.5):
+                if key.data == 'accept':
+                    self._accept()
+                elif key.data == 'wake':
+                    # 先取空唤醒字节再清标志：清标志之后publish()发出的唤醒字节保留到下一轮，
+                    # 取空与清标志之间追加的数据由本轮的_flush()发出
+                    try:
+                        while self.wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    self.wake_pending = False
+                else:
+                    client = key.data
+                    if mask & selectors.EVENT_READ:
+                        self._read(client)
+            self._flush()
+        selector.close()
+
+    def _accept(self):
+        try:
+            sock, address = self.server.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client = StreamClient(sock, address)
+        with self.lock:
+            self.clients.append(client)
+        self.selector.register(sock, selectors.EVENT_READ, client)
+        self._event(f"客户端已连接：{client.name}（共 {len(self.clients)} 个）")
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(client, "断开")
+            return
+        client.received += len(data)
+        if self.accept_writes and self.terminal.ser and self.terminal.ser.is_open:
+            self.terminal.ser.write(data)
+            self.terminal.log_data('TX', data)
+
+    def _flush(self):
+        """发送各客户端缓冲中的数据，缓冲溢出的客户端断开"""
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            if client.overflow:
+                self.dropped_clients += 1
+                self._drop(client, f"发送缓冲超过 {self.max_buffer} 字节，已断开")
+                continue
+            sent = 0
+            with self.lock:
+                if client.buffer:
+                    try:
+                        sent = client.sock.send(client.buffer)
+                    except BlockingIOError:
+                        sent = 0
+                    except OSError:
+                        sent = -1
+                    if sent > 0:
+                        del client.buffer[:sent]
+                        client.sent += sent
+                        now = time.time()
+                        marks = client.marks
+                        while marks and marks[0][0] <= client.sent:
+                            self.histogram.add(now - marks.popleft()[1])
+                pending = bool(client.buffer)
+            if sent < 0:
+                self._drop(client, "发送失败")
+                continue
+            if pending != client.writing:
+                # 发不完时等可写事件再发
+                client.writing = pending
+                events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+                self.selector.modify(client.sock, events, client)
+
+    def _drop(self, client, reason):
+        with self.lock:
+            if client not in self.clients:
+                return
+            self.clients.remove(client)
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        self._event(f"客户端 {client.name} {reason}")
+
+    def _event(self, text):
+        if self.event_callback:
+            self.event_callback(text)
+
+    def stats(self):
+        with self.lock:
+            clients = [{'client': client.name, 'sent': client.sent, 'received': client.received,
+                        'buffered': len(client.buffer)} for client in self.clients]
+        return {
+            'address': f"{self.address[0]}:{self.address[1]}",
+            'frames': self.frames,
+            'bytes': self.bytes,
+            'clients': clients,
+            'dropped_clients': self.dropped_clients,
+            'udp_errors': self.udp_errors,
+            'latency': self.histogram.summary()
+        }
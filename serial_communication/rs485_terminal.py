@@ -0,0 +1,269 @@
+"""RS485终端核心（不依赖tkinter，图形界面和命令行共用）"""
+import serial
+import serial.tools.list_ports
+import time
+import os
+import datetime
+import functools
+from rs485_codec import encode, decode
+from rs485_framing import ReceiveEngine, make_framer
+from rs485_log import BinaryLogWriter
+from rs485_transact import Transactor
+
+# 界面上的分帧方式名称 → make_framer的参数
+FRAMING_MODES = {"静默超时": 'silence', "分隔符": 'delimiter', "不分帧": 'raw'}
+
+
+@functools.lru_cache(maxsize=16)
+def _format_second(seconds):
+    return time.strftime('%H:%M:%S', time.localtime(seconds))
+
+
+def format_time(timestamp):
+    """墙钟时间戳 → HH:MM:SS.mmm（同一秒内的帧复用格式化好的时分秒）"""
+    seconds, millis = divmod(int(round(timestamp * 1000)), 1000)
+    return f"{_format_second(seconds)}.{millis:03d}"
+
+
+class RS485Terminal:
+    def __init__(self, gui_callback=None, log_dir=None, log_enabled=True):
+        self.ser = None
+        self.running = False
+        self.receive_thread = None
+        self.engine = None  # 接收引擎（按块读取 + 分帧）
+        self.framing = 'silence'  # 分帧方式：silence（3.5字符静默）/ delimiter / raw
+        self.delimiter = b'\r\n'
+        self.echo = True  # 是否回显发送的数据
+        self.hex_mode = True  # 默认使用十六进制模式
+        self.gui_callback = gui_callback  # 用于更新GUI的回调函数
+        self.frame_listeners = []  # 接收帧的附加回调（TCP桥接/转发等，在接收线程中调用）
+        self.transactor = Transactor(self)  # 请求/应答事务（Modbus轮询、脚本测试）
+        self.stream_server = None  # TCP/UDP转发服务
+        self.log_enabled = log_enabled  # 是否启用日志记录
+        self.log_writer = None  # 二进制日志写线程
+        # 日志目录，默认为程序目录下的log
+        self.log_dir = log_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")
+        self.log_max_bytes = 100 * 1024 * 1024  # 单个日志文件上限，超过后同一天分段
+        if self.log_enabled:
+            self.init_log()
+    
+    def init_log(self):
+        """初始化日志记录（二进制格式，后台线程写入，按日期和大小滚动）"""
+        try:
+            if self.log_writer:
+                self.log_writer.close()
+            self.log_writer = BinaryLogWriter(self.log_dir, max_bytes=self.log_max_bytes)
+            self.log_writer.error_callback = self.handle_log_error
+            self.log_writer.start()
+            
+            # 写入日志开始标记
+            start_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.log_writer.write('MARK', f"===== RS485通信日志开始 [{start_time}] =====")
+            return True
+        except Exception as e:
+            print(f"初始化日志失败: {str(e)}")
+            self.log_writer = None
+            self.log_enabled = False
+            return False
+    
+    def close_log(self):
+        """写入结束标记，等待写线程写完剩余记录后关闭"""
+        if self.log_writer:
+            end_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self.log_writer.write('MARK', f"===== RS485通信日志结束 [{end_time}] =====")
+            self.log_writer.close()
+            self.log_writer = None
+    
+    def log_data(self, data_type, data, timestamp=None):
+        """记录数据到日志文件（只放入写线程的队列，不阻塞接收线程）
+        data_type: 'RX' (接收) / 'TX' (发送) / 'ERROR'
+        data: 原始数据bytes或文本
+        timestamp: 可选的墙钟时间戳（time.time()），如果不提供则使用当前时间
+        """
+        if not self.log_enabled or not self.log_writer:
+            return False
+        return self.log_writer.write(data_type, data, timestamp)
+    
+    def handle_log_error(self, message):
+        """日志写线程出错（在写线程中）"""
+        print(message)
+        if self.gui_callback:
+            self.gui_callback(f"[{time.strftime('%H:%M:%S')}] {message}\n", is_error=True)
+    
+    def toggle_log(self):
+        """切换日志记录状态"""
+        self.log_enabled = not self.log_enabled
+        if self.log_enabled and not self.log_writer:
+            self.init_log()
+        return self.log_enabled
+        
+    def list_ports(self):
+        """列出所有可用的串口 - 跨平台支持"""
+        ports = serial.tools.list_ports.comports()
+        port_list = []
+        
+        for port in ports:
+            # 提供更详细的端口信息，方便识别
+            port_info = f"{port.device}"
+            if port.description and port.description != port.device:
+                port_info += f" - {port.description}"
+            port_list.append(port_info)
+        
+        # 如果没有找到端口，返回空列表
+        return port_list if port_list else []
+    
+    def connect(self, port, baudrate=9600, parity=serial.PARITY_NONE, 
+                stopbits=serial.STOPBITS_ONE, bytesize=serial.EIGHTBITS, timeout=0.1):
+        """连接到指定的串口"""
+        try:
+            # 提取实际端口名（去除描述信息）
+            actual_port = port.split(' - ')[0] if ' - ' in port else port
+            
+            self.ser = serial.Serial(
+                port=actual_port,
+                baudrate=baudrate,
+                parity=parity,
+                stopbits=stopbits,
+                bytesize=bytesize,
+                timeout=timeout,
+                rtscts=False,
+                dsrdtr=False
+            )
+            
+            if self.ser.is_open:
+                self.running = True
+                if self.log_enabled and not self.log_writer:
+                    self.init_log()
+                self.start_receive_thread()
+                return True, f"已连接到 {actual_port}，波特率: {baudrate}"
+            return False, "无法打开串口"
+        except Exception as e:
+            return False, f"连接失败: {str(e)}"
+    
+    def start_receive_thread(self):
+        """启动接收引擎（按块读取，由分帧器拆出完整帧）"""
+        framer = make_framer(self.framing, self.ser.baudrate, self.delimiter)
+        self.engine = ReceiveEngine(self.ser, framer, self.handle_frames, self.handle_receive_error,
+                                    raw_callback=self.transactor.on_data)
+        self.engine.start()
+        self.receive_thread = self.engine.thread
+    
+    def set_framing(self, framing, delimiter=None):
+        """设置分帧方式，已连接时立即生效"""
+        framer = make_framer(framing, self.ser.baudrate if self.ser else 9600, delimiter or self.delimiter)
+        self.framing = framing
+        if delimiter:
+            self.delimiter = delimiter
+        if self.engine:
+            self.engine.set_framer(framer)
+    
+    def handle_frames(self, frames):
+        """接收引擎回调（在接收线程中）：记录日志并显示完整帧"""
+        for listener in self.frame_listeners:
+            listener(frames)
+        for frame in frames:
+            data = frame.data
+            
+            # 记录接收的数据到日志
+            self.log_data('RX', data, frame.timestamp)
+            
+            # 无界面时（命令行采集）不格式化显示文本
+            if not self.gui_callback:
+                continue
+            
+            display_text = self.format_frame(data, frame.timestamp, "收到")
+            
+            # 通过回调更新GUI
+            self.gui_callback(display_text, is_received=True)
+    
+    def add_frame_listener(self, listener):
+        """注册接收帧回调listener(frames)"""
+        self.frame_listeners = self.frame_listeners + [listener]
+    
+    def remove_frame_listener(self, listener):
+        self.frame_listeners = [item for item in self.frame_listeners if item != listener]
+    
+    def start_stream(self, host='0.0.0.0', port=4002, **options):
+        """启动TCP/UDP转发服务，把收到的帧转发给网络客户端，options见StreamServer"""
+        from rs485_stream import StreamServer
+
+        self.stop_stream()
+        self.stream_server = StreamServer(self, host, port, **options)
+        self.stream_server.start()
+        return self.stream_server
+
+    def stop_stream(self):
+        if self.stream_server:
+            self.stream_server.close()
+            self.stream_server = None
+
+    def transact(self, request, expected_framer=None, timeout=1.0, match=None):
+        """发送请求并等待应答（半双工），返回Reply(data, latency, timestamp)，超时抛TimeoutError
+        expected_framer: 判断应答完整的分帧器（如LengthFramer），默认按静默超时分帧
+        match: 可选的应答匹配函数，不匹配的帧被丢弃
+        """
+        return self.transactor.transact(request, expected_framer, timeout, match)
+    
+    def handle_receive_error(self, e):
+        """接收引擎读串口出错（在接收线程中），引擎随后退出"""
+        error_msg = f"[{time.strftime('%H:%M:%S')}] 接收错误: {str(e)}\n"
+        # 记录错误到日志
+        self.log_data('ERROR', str(e))
+        if self.gui_callback:
+            self.gui_callback(error_msg, is_error=True)
+    
+    def encode_send(self, text):
+        """按当前模式把输入文本转为要发送的bytes，十六进制格式错误时抛ValueError"""
+        return encode(text, self.hex_mode)
+    
+    def format_frame(self, data, timestamp, direction):
+        """显示行：每帧只格式化一次，接收显示和发送回显共用"""
+        return f"[{format_time(timestamp)}] {direction}: [{len(data)} bytes] {decode(data, self.hex_mode)}\n"
+    
+    def send_data(self, data):
+        """发送数据，data为输入文本（按当前模式解析）或bytes
+        返回 (True, 发送的bytes) 或 (False, 错误信息)
+        """
+        if not self.ser or not self.ser.is_open:
+            return False, "未连接到串口"
+        
+        try:
+            send_bytes = data if isinstance(data, bytes) else self.encode_send(data)
+        except ValueError as e:
+            return False, f"十六进制格式错误: {str(e)}"
+        
+        try:
+            # 记录发送的数据到日志
+            self.log_data('TX', send_bytes)
+            
+            self.ser.write(send_bytes)
+            return True, send_bytes
+        except Exception as e:
+            # 记录发送错误到日志
+            self.log_data('ERROR', f"发送错误: {str(e)}")
+            return False, f"发送错误: {str(e)}"
+    
+    def close(self):
+        """关闭连接"""
+        self.running = False
+        self.stop_stream()
+        if self.engine:
+            self.engine.stop()
+            self.engine = None
+        if self.ser and self.ser.is_open:
+            self.ser.close()
+            
+        # 关闭日志文件
+        self.close_log()
+                
+        return True, "已关闭串口连接"
+    
+    def toggle_hex_mode(self):
+        """切换十六进制模式"""
+        self.hex_mode = not self.hex_mode
+        return self.hex_mode
+    
+    def toggle_echo(self):
+        """切换回显模式"""
+        self.echo = not self.echo
+        return self.echo
@@ -0,0 +1,351 @@
+"""RS485 请求/应答事务
+
+半双工总线上一次只能有一个请求在等待应答：Transactor保证帧间静默（3.5字符 + 可配置的
+收发切换时间），发送请求后用指定的分帧器从接收数据中取出应答，可选地滤掉适配器回显的
+发送数据，按匹配函数丢弃迟到的旧应答，并统计延迟分布。
+
+脚本文件每行一个事务，# 开头为注释：
+    01 03 00 00 00 0A C5 CD => len 25        应答为25字节
+    01 06 00 01 00 03 98 0B => 01 06 00 01 00 03 98 0B   应答须完全一致，XX为任意字节
+    02 03 00 00 00 01 84 39                  任意应答（按静默超时分帧）
+    00 06 00 01 00 03 99 DA => none          广播，不应有应答
+    delay 10                                 等待10毫秒
+
+示例：
+    python rs485_transact.py --port COM3 --baud 9600 --script test.txt --repeat 100
+"""
+import sys
+import time
+import bisect
+import argparse
+import threading
+import collections
+from rs485_codec import parse_hex, format_hex
+from rs485_framing import SilenceFramer, LengthFramer
+
+# 一次事务的应答：data为应答数据，latency为从开始发送到应答最后一个字节到达的时间（秒）
+Reply = collections.namedtuple('Reply', ['data', 'latency', 'timestamp'])
+
+
+class LatencyHistogram:
+    """延迟分布（按毫秒分桶）"""
+    BOUNDS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+
+    def add(self, latency):
+        ms = latency * 1000
+        self.counts[bisect.bisect_left(self.BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if self.min is None or ms < self.min:
+            self.min = ms
+        if ms > self.max:
+            self.max = ms
+
+    def percentile(self, p):
+        """近似百分位（毫秒）：所在桶的上界，最后一个桶用最大值"""
+        if not self.count:
+            return 0.0
+        target = self.count * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self.BOUNDS_MS[i], self.max) if i < len(self.BOUNDS_MS) else self.max
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return "无数据"
+        return (f"{self.count} 次，平均 {self.total / self.count:.2f} ms，最小 {self.min:.2f} ms，"
+                f"P50≤{self.percentile(50):.3g} ms，P99≤{self.percentile(99):.3g} ms，最大 {self.max:.2f} ms")
+
+    def format(self, width=40):
+        """文本直方图"""
+        lines = [self.summary()]
+        peak = max(self.counts) or 1
+        labels = [f"≤{bound:g} ms" for bound in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]:g} ms"]
+        for label, count in zip(labels, self.counts):
+            if count:
+                lines.append(f"{label:>10} | {'#' * max(1, count * width // peak):<{width}} {count}")
+        return "\n".join(lines)
+
+
+class Transactor:
+    """半双工请求/应答
+
+    接收数据来自终端接收引擎的raw_callback（在接收线程中调用on_data），与显示、日志的分帧无关。
+    turnaround为收到上一帧后到再次发送前额外等待的时间（从站收发切换较慢时使用），
+    local_echo为True时丢弃适配器回显的发送数据。
+    """
+    def __init__(self, terminal, turnaround=0.0, local_echo=False):
+        self.terminal = terminal
+        self.turnaround = turnaround
+        self.local_echo = local_echo
+        self.lock = threading.Lock()  # 同一时间只进行一个事务
+        self.cond = threading.Condition()
+        self.chunks = collections.deque()
+        self.active = False
+        self.last_rx = 0.0
+        self.last_tx = 0.0
+        self.histogram = LatencyHistogram()
+        self.wall_offset = time.time() - time.perf_counter()
+
+        # 统计
+        self.transactions = 0
+        self.timeouts = 0
+        self.discarded = 0  # 不匹配而丢弃的应答
+
+    def on_data(self, data, now):
+        with self.cond:
+            self.last_rx = now
+            if self.active:
+                self.chunks.append((data, now))
+                self.cond.notify()
+
+    def transact(self, request, expected_framer=None, timeout=1.0, match=None):
+        """发送请求并等待应答，返回Reply；超时抛TimeoutError
+
+        expected_framer决定应答何时完整（默认按静默超时分帧），match(data)返回False的帧
+        （如上一次超时请求的迟到应答）被丢弃后继续等待。timeout从请求发送完毕算起。
+        """
+        ser = self.terminal.ser
+        if not ser or not ser.is_open:
+            raise RuntimeError("未连接到串口")
+        char_time = 11 / ser.baudrate
+        gap = 0.00175 if ser.baudrate > 19200 else 3.5 * char_time
+        framer = expected_framer or SilenceFramer(ser.baudrate)
+        framer.reset()
+        request = bytes(request)
+        with self.lock:
+            with self.cond:
+                # 帧间静默：上一帧（无论收发）结束后至少3.5字符
+                while True:
+                    wait = max(self.last_rx, self.last_tx) + gap + self.turnaround - time.perf_counter()
+                    if wait <= 0:
+                        break
+                    self.cond.wait(wait)
+                self.chunks.clear()
+                self.active = True
+            try:
+                start = time.perf_counter()
+                ser.write(request)
+                self.terminal.log_data('TX', request)
+                sent = start + len(request) * char_time
+                self.last_tx = sent
+                reply = self._wait_reply(request, framer, sent + timeout, match)
+            finally:
+                with self.cond:
+                    self.active = False
+            self.transactions += 1
+            if reply is None:
+                self.timeouts += 1
+                raise TimeoutError(f"应答超时（{timeout * 1000:g} ms）")
+            data, end = reply
+            latency = end - start
+            self.histogram.add(latency)
+            return Reply(data, latency, end + self.wall_offset)
+
+    def _wait_reply(self, request, framer, deadline, match):
+        echo = request if self.local_echo else b""
+        last = 0.0
+        with self.cond:
+            while True:
+                if self.chunks:
+                    data, last = self.chunks.popleft()
+                    if echo:
+                        # 回显可能分多次到达，逐段比较去掉
+                        size = min(len(echo), len(data))
+                        if data[:size] == echo[:size]:
+                            echo = echo[size:]
+                            data = data[size:]
+                        else:
+                            echo = b""
+                        if not data:
+                            continue
+                    frames = framer.feed(data, last)
+                else:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        return None
+                    self.cond.wait(min(remaining, framer.poll_interval))
+                    if self.chunks:
+                        continue
+                    frames = framer.poll(time.perf_counter())
+                for frame, _ in frames:
+                    if match is None or match(frame):
+                        return frame, last
+                    self.discarded += 1
+
+    def stats(self):
+        return {
+            'transactions': self.transactions,
+            'timeouts': self.timeouts,
+            'discarded': self.discarded,
+            'latency': self.histogram.summary()
+        }
+
+
+def parse_expect(text):
+    """期望应答：(值, 掩码)，XX为任意字节"""
+    digits = "".join(text.split())
+    if len(digits) % 2:
+        raise ValueError(f"十六进制位数为奇数：{text}")
+    value = bytearray()
+    mask = bytearray()
+    for i in range(0, len(digits), 2):
+        byte = digits[i:i + 2]
+        if byte.upper() == 'XX':
+            value.append(0)
+            mask.append(0)
+        else:
+            value.append(int(byte, 16))
+            mask.append(0xFF)
+    return bytes(value), bytes(mask)
+
+
+# 脚本中的一步：request为None时只延时；expect为'any'/'none'/('len', n)/(值, 掩码)
+Step = collections.namedtuple('Step', ['line', 'request', 'expect', 'delay'])
+
+
+def parse_script(text):
+    """解析事务脚本，返回Step列表（在运行前全部解析好，运行时不再有解析开销）"""
+    steps = []
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.split('#', 1)[0].strip()
+        if not line:
+            continue
+        try:
+            if line.lower().startswith('delay'):
+                steps.append(Step(number, None, None, float(line[5:]) / 1000))
+                continue
+            request_text, _, expect_text = line.partition('=>')
+            request = parse_hex(request_text)
+            if not request:
+                raise ValueError("请求为空")
+            expect_text = expect_text.strip()
+            if not expect_text or expect_text == '*':
+                expect = 'any'
+            elif expect_text.lower() == 'none':
+                expect = 'none'
+            elif expect_text.lower().startswith('len'):
+                expect = ('len', int(expect_text[3:]))
+            else:
+                expect = parse_expect(expect_text)
+            steps.append(Step(number, request, expect, 0.0))
+        except ValueError as e:
+            raise ValueError(f"第{number}行：{str(e)}")
+    return steps
+
+
+StepResult = collections.namedtuple('StepResult', ['step', 'ok', 'reply', 'message'])
+
+
+def run_script(transactor, steps, timeout=1.0, repeat=1, stop_on_fail=False, result_callback=None):
+    """依次执行脚本（应答到达后立即发下一条），返回(通过数, 失败数)"""
+    passed = failed = 0
+    for _ in range(repeat):
+        for step in steps:
+            if step.request is None:
+                time.sleep(step.delay)
+                continue
+            result = run_step(transactor, step, timeout)
+            if result.ok:
+                passed += 1
+            else:
+                failed += 1
+            if result_callback:
+                result_callback(result)
+            if stop_on_fail and not result.ok:
+                return passed, failed
+    return passed, failed
+
+
+def run_step(transactor, step, timeout):
+    expect = step.expect
+    if isinstance(expect, tuple) and expect[0] == 'len':
+        framer = LengthFramer(expect[1])
+    elif isinstance(expect, tuple):
+        framer = LengthFramer(len(expect[0]))
+    else:
+        framer = None
+    try:
+        reply = transactor.transact(step.request, framer, timeout)
+    except TimeoutError as e:
+        if expect == 'none':
+            return StepResult(step, True, None, "无应答")
+        return StepResult(step, False, None, str(e))
+    if expect == 'none':
+        return StepResult(step, False, reply, "不应有应答")
+    if isinstance(expect, tuple) and expect[0] != 'len':
+        value, mask = expect
+        if any((a & m) != (b & m) for a, b, m in zip(reply.data, value, mask)):
+            return StepResult(step, False, reply, "应答不一致")
+    return StepResult(step, True, reply, "")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RS485 请求/应答脚本")
+    parser.add_argument("--port", required=True, help="串口，如 COM3 或 /dev/ttyUSB0")
+    parser.add_argument("--baud", type=int, default=9600, help="波特率")
+    parser.add_argument("--script", required=True, help="事务脚本文件")
+    parser.add_argument("--repeat", type=int, default=1, help="重复执行次数")
+    parser.add_argument("--timeout", type=float, default=0.5, help="应答超时（秒）")
+    parser.add_argument("--turnaround", type=float, default=0.0, help="收发切换额外等待（毫秒）")
+    parser.add_argument("--echo", action="store_true", help="适配器回显发送数据时使用")
+    parser.add_argument("--stop-on-fail", action="store_true", help="遇到失败立即停止")
+    parser.add_argument("--quiet", action="store_true", help="只输出失败的事务和统计")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.script, encoding='utf-8') as f:
+            steps = parse_script(f.read())
+    except (OSError, ValueError) as e:
+        print(f"脚本错误：{str(e)}", file=sys.stderr)
+        return 1
+
+    from rs485_terminal import RS485Terminal
+
+    terminal = RS485Terminal()
+    ok, message = terminal.connect(args.port, args.baud)
+    print(message, file=sys.stderr)
+    if not ok:
+        return 1
+    transactor = terminal.transactor
+    transactor.turnaround = args.turnaround / 1000
+    transactor.local_echo = args.echo
+
+    counts = collections.Counter()
+
+    def report(result):
+        counts[result.ok] += 1
+        if result.ok and args.quiet:
+            return
+        reply = format_hex(result.reply.data) if result.reply else "-"
+        latency = f"{result.reply.latency * 1000:.2f} ms" if result.reply else ""
+        status = "通过" if result.ok else "失败"
+        print(f"第{result.step.line}行 {status} {latency} 应答: {reply} {result.message}")
+
+    begin = time.perf_counter()
+    try:
+        run_script(transactor, steps, args.timeout, args.repeat, args.stop_on_fail, report)
+    except KeyboardInterrupt:
+        print("已中断", file=sys.stderr)
+    finally:
+        terminal.close()
+    elapsed = time.perf_counter() - begin
+    passed, failed = counts[True], counts[False]
+    print(f"通过 {passed}，失败 {failed}，耗时 {elapsed:.2f} 秒（{(passed + failed) / elapsed:.1f} 事务/秒）",
+          file=sys.stderr)
+    print(transactor.histogram.format(), file=sys.stderr)
+    return 2 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,236 +1,24 @@
 import serial
-import serial.tools.list_ports
-import threading
 import time
 import sys
 import platform
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox
+from tkinter import ttk, scrolledtext, messagebox, filedialog
 import os
-import datetime
-
-class RS485Terminal:
-    def __init__(self, gui_callback=None):
-        self.ser = None
-        self.running = False
-        self.receive_thread = None
-        self.echo = True  # 是否回显发送的数据
-        self.hex_mode = True  # 默认使用十六进制模式
-        self.gui_callback = gui_callback  # 用于更新GUI的回调函数
-        self.log_enabled = True  # 是否启用日志记录
-        self.log_file = None  # 日志文件对象
-        self.log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "log")
-        self.init_log()
-    
-    def init_log(self):
-        """初始化日志记录"""
-        try:
-            # 确保log目录存在
-            if not os.path.exists(self.log_dir):
-                os.makedirs(self.log_dir)
-            
-            # 创建以日期命名的日志文件
-            today = datetime.datetime.now().strftime("%Y%m%d")
-            log_filename = os.path.join(self.log_dir, f"{today}_rs485_received.log")
-            
-            # 如果日志文件已打开，先关闭
-            if self.log_file:
-                self.log_file.close()
-            
-            # 打开新的日志文件（追加模式，UTF-8编码）
-            self.log_file = open(log_filename, 'a', encoding='utf-8')
-            
-            # 写入日志开始标记
-            start_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.log_file.write(f"\n\n===== RS485通信日志开始 [{start_time}] =====\n")
-            self.log_file.flush()
-            
-            return True
-        except Exception as e:
-            print(f"初始化日志失败: {str(e)}")
-            self.log_enabled = False
-            return False
-    
-    def log_data(self, data_type, data, timestamp=None):
-        """记录数据到日志文件
-        data_type: 'RX' (接收) 或 'TX' (发送)
-        data: 原始数据或十六进制字符串
-        timestamp: 可选的时间戳，如果不提供则使用当前时间
-        """
-        if not self.log_enabled or not self.log_file:
-            return False
-        
-        try:
-            if timestamp is None:
-                timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]  # 精确到毫秒
-            
-            # 记录数据
-            if isinstance(data, bytes):
-                hex_str = ' '.join(f'{b:02X}' for b in data)
-                log_entry = f"| {timestamp} | {data_type} | {len(data)} bytes |  {hex_str} |\n"
-            else:
-                log_entry = f" | {timestamp} | {data_type} | {data} |\n"
-            
-            self.log_file.write(log_entry)
-            self.log_file.flush()
-            return True
-        except Exception as e:
-            print(f"写入日志失败: {str(e)}")
-            return False
-    
-    def toggle_log(self):
-        """切换日志记录状态"""
-        self.log_enabled = not self.log_enabled
-        if self.log_enabled and not self.log_file:
-            self.init_log()
-        return self.log_enabled
-        
-    def list_ports(self):
-        """列出所有可用的串口 - 跨平台支持"""
-        ports = serial.tools.list_ports.comports()
-        port_list = []
-        
-        for port in ports:
-            # 提供更详细的端口信息，方便识别
-            port_info = f"{port.device}"
-            if port.description and port.description != port.device:
-                port_info += f" - {port.description}"
-            port_list.append(port_info)
-        
-        # 如果没有找到端口，返回空列表
-        return port_list if port_list else []
-    
-    def connect(self, port, baudrate=9600, parity=serial.PARITY_NONE, 
-                stopbits=serial.STOPBITS_ONE, bytesize=serial.EIGHTBITS, timeout=0.1):
-        """连接到指定的串口"""
-        try:
-            # 提取实际端口名（去除描述信息）
-            actual_port = port.split(' - ')[0] if ' - ' in port else port
-            
-            self.ser = serial.Serial(
-                port=actual_port,
-                baudrate=baudrate,
-                parity=parity,
-                stopbits=stopbits,
-                bytesize=bytesize,
-                timeout=timeout,
-                rtscts=False,
-                dsrdtr=False
-            )
-            
-            if self.ser.is_open:
-                self.running = True
-                self.start_receive_thread()
-                return True, f"已连接到 {actual_port}，波特率: {baudrate}"
-            return False, "无法打开串口"
-        except Exception as e:
-            return False, f"连接失败: {str(e)}"
-    
-    def start_receive_thread(self):
-        """启动接收数据的线程"""
-        self.receive_thread = threading.Thread(target=self.receive_data, daemon=True)
-        self.receive_thread.start()
-    
-    def receive_data(self):
-        """接收数据的线程函数"""
-        while self.running and self.ser and self.ser.is_open:
-            try:
-                data = self.ser.read(1)
-                if data:
-                    # 继续读取可能剩余的数据
-                    while self.ser.in_waiting:
-                        data += self.ser.read(self.ser.in_waiting)
-                    
-                    timestamp = time.strftime("%H:%M:%S")
-                    
-                    # 记录接收的数据到日志
-                    self.log_data('RX', data)
-                    
-                    if self.hex_mode:
-                        # 以十六进制显示
-                        hex_str = ' '.join(f'{b:02X}' for b in data)
-                        display_text = f"[{timestamp}] 收到: [{len(data)} bytes] {hex_str}\n"
-                    else:
-                        # 尝试以ASCII显示
-                        try:
-                            str_data = data.decode('utf-8', errors='replace')
-                            display_text = f"[{timestamp}] 收到: [{len(data)} bytes] {str_data}\n"
-                        except:
-                            hex_str = ' '.join(f'{b:02X}' for b in data)
-                            display_text = f"[{timestamp}] 收到: [{len(data)} bytes] (非ASCII) {hex_str}\n"
-                    
-                    # 通过回调更新GUI
-                    if self.gui_callback:
-                        self.gui_callback(display_text, is_received=True)
-            except Exception as e:
-                error_msg = f"[{time.strftime('%H:%M:%S')}] 接收错误: {str(e)}\n"
-                # 记录错误到日志
-                self.log_data('ERROR', str(e))
-                if self.gui_callback:
-                    self.gui_callback(error_msg, is_error=True)
-                break
-            time.sleep(0.01)
-    
-    def send_data(self, data):
-        """发送数据"""
-        if not self.ser or not self.ser.is_open:
-            return False, "未连接到串口"
-        
-        try:
-            if self.hex_mode:
-                # 处理十六进制数据
-                data = data.replace(' ', '')
-                if len(data) % 2 != 0:
-                    data += '0'  # 补全为偶数长度
-                send_bytes = bytes.fromhex(data)
-            else:
-                # 处理字符串数据
-                send_bytes = data.encode('utf-8')
-            
-            # 记录发送的数据到日志
-            self.log_data('TX', send_bytes)
-            
-            self.ser.write(send_bytes)
-            return True
-        except Exception as e:
-            # 记录发送错误到日志
-            self.log_data('ERROR', f"发送错误: {str(e)}")
-            return False, f"发送错误: {str(e)}"
-    
-    def close(self):
-        """关闭连接"""
-        self.running = False
-        if self.receive_thread:
-            self.receive_thread.join(timeout=1.0)
-        if self.ser and self.ser.is_open:
-            self.ser.close()
-            
-        # 关闭日志文件
-        if self.log_file:
-            try:
-                # 写入日志结束标记
-                end_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.log_file.write(f"===== RS485通信日志结束 [{end_time}] =====\n\n")
-                self.log_file.flush()
-                self.log_file.close()
-                self.log_file = None
-            except:
-                pass
-                
-        return True, "已关闭串口连接"
-    
-    def toggle_hex_mode(self):
-        """切换十六进制模式"""
-        self.hex_mode = not self.hex_mode
-        return self.hex_mode
-    
-    def toggle_echo(self):
-        """切换回显模式"""
-        self.echo = not self.echo
-        return self.echo
+import queue
+import collections
+from rs485_terminal import RS485Terminal, FRAMING_MODES, format_time
+from rs485_log import export_hex
+from rs485_codec import parse_hex
+from rs485_modbus import ModbusPoller, parse_points, coalesce, format_stats
+from rs485_sequence import SequenceSender, parse_sequence, format_stats as format_sequence_stats
 
 
 class RS485GUITerminal(tk.Tk):
+    MAX_DISPLAY_LINES = 5000   # 数据显示区最多保留的行数
+    DISPLAY_INTERVAL = 50      # 显示刷新间隔（毫秒）
+    DISPLAY_BATCH = 2000       # 每次刷新最多取出的条数
+    
     def __init__(self):
         super().__init__()
         self.title("RS485 终端")
@@ -247,8 +35,16 @@ class RS485GUITerminal(tk.Tk):
         # 自动最大化窗口
         self.maximize_window()
         
+        # 接收线程只把显示内容放入队列，由Tk主循环定时批量取出显示
+        self.display_queue = queue.Queue(maxsize=20000)
+        self.display_dropped = 0  # 显示队列满时丢弃的条数（日志仍完整）
+        self.display_paused = False
+        self.paused_items = collections.deque(maxlen=self.MAX_DISPLAY_LINES)  # 暂停期间只保留最新的内容
+        
         # 创建终端核心实例
         self.terminal = RS485Terminal(gui_callback=self.update_display)
+        self.poller = None  # Modbus轮询
+        self.sequence_sender = None  # 序列发送
         
         # 设置中文字体支持（在创建组件之前）
         self.setup_fonts()
@@ -258,6 +54,8 @@ class RS485GUITerminal(tk.Tk):
         
         # 初始化端口列表
         self.refresh_port_list()
+        
+        self.after(self.DISPLAY_INTERVAL, self.drain_display)
     
     def get_system_info(self):
         """获取系统信息用于调试"""
@@ -422,10 +220,38 @@ class RS485GUITerminal(tk.Tk):
                                         command=self.toggle_log)
         self.log_check.pack(side=tk.LEFT, padx=10)
         
+        # 分帧方式
+        ttk.Label(control_frame, text="分帧:").pack(side=tk.LEFT, padx=(10, 0))
+        self.framing_var = tk.StringVar(value="静默超时")
+        self.framing_combo = ttk.Combobox(control_frame, textvariable=self.framing_var,
+                                          values=list(FRAMING_MODES), width=8, state='readonly')
+        self.framing_combo.pack(side=tk.LEFT, padx=5)
+        self.framing_combo.bind("<<ComboboxSelected>>", lambda event: self.apply_framing())
+        ttk.Label(control_frame, text="分隔符(HEX):").pack(side=tk.LEFT)
+        self.delimiter_var = tk.StringVar(value="0D 0A")
+        delimiter_entry = ttk.Entry(control_frame, textvariable=self.delimiter_var, width=8)
+        delimiter_entry.pack(side=tk.LEFT, padx=5)
+        delimiter_entry.bind("<Return>", lambda event: self.apply_framing())
+        
+        # 暂停显示复选框（暂停期间继续接收和记录日志）
+        self.pause_var = tk.BooleanVar(value=False)
+        self.pause_check = ttk.Checkbutton(control_frame, text="暂停显示",
+                                          variable=self.pause_var,
+                                          command=self.toggle_pause)
+        self.pause_check.pack(side=tk.LEFT, padx=10)
+        
         # 清除显示按钮
         self.clear_btn = ttk.Button(control_frame, text="清除显示", command=self.clear_display)
         self.clear_btn.pack(side=tk.RIGHT, padx=10)
         
+        # Modbus轮询按钮
+        self.modbus_btn = ttk.Button(control_frame, text="Modbus轮询", command=self.show_modbus_poll)
+        self.modbus_btn.pack(side=tk.RIGHT, padx=5)
+        
+        # 导出日志按钮（二进制日志 → 十六进制文本）
+        self.export_btn = ttk.Button(control_frame, text="导出日志", command=self.export_log)
+        self.export_btn.pack(side=tk.RIGHT, padx=5)
+        
         # 数据发送区域
         send_frame = ttk.LabelFrame(main_frame, text="发送数据", padding="5")
         send_frame.pack(fill=tk.BOTH, expand=False)
@@ -438,6 +264,10 @@ class RS485GUITerminal(tk.Tk):
         self.send_btn = ttk.Button(send_frame, text="发送", command=self.send_data)
         self.send_btn.pack(side=tk.RIGHT, padx=5, pady=5, ipady=20)
         
+        # 序列发送按钮（按序列文件定时发送，再次点击停止）
+        self.sequence_btn = ttk.Button(send_frame, text="发送序列", command=self.toggle_sequence)
+        self.sequence_btn.pack(side=tk.RIGHT, padx=5, pady=5, ipady=20)
+        
         # 绑定Enter键发送数据
         self.send_entry.bind("<Return>", lambda event: self.send_data())
         
@@ -476,6 +306,8 @@ class RS485GUITerminal(tk.Tk):
         """切换连接状态（连接/断开）"""
         if self.terminal.ser and self.terminal.ser.is_open:
             # 断开连接
+            self.stop_modbus_poll()
+            self.stop_sequence()
             success, msg = self.terminal.close()
             self.status_var.set(msg)
             self.connect_btn.config(text="连接")
@@ -542,6 +374,17 @@ class RS485GUITerminal(tk.Tk):
         mode_text = "十六进制" if new_mode else "ASCII"
         self.update_status(f"已切换到{mode_text}模式", "info")
     
+    def apply_framing(self):
+        """应用界面选择的分帧方式"""
+        mode = self.framing_var.get()
+        try:
+            delimiter = parse_hex(self.delimiter_var.get())
+            self.terminal.set_framing(FRAMING_MODES[mode], delimiter or None)
+        except ValueError as e:
+            self.update_status(f"分帧设置错误: {str(e)}", "error")
+            return
+        self.update_status(f"分帧方式：{mode}", "info")
+    
     def toggle_echo(self):
         """切换回显模式"""
         new_mode = self.terminal.toggle_echo()
@@ -556,25 +399,204 @@ class RS485GUITerminal(tk.Tk):
         mode_text = "开启" if new_mode else "关闭"
         self.update_status(f"日志记录已{mode_text}", "info")
     
+    def show_modbus_poll(self):
+        """Modbus轮询设置与统计窗口"""
+        dialog = tk.Toplevel(self)
+        dialog.title("Modbus RTU 轮询")
+        dialog.transient(self)
+        
+        frame = ttk.Frame(dialog, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(frame, text="轮询点:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        points_var = tk.StringVar(value=getattr(self, 'modbus_points', "1:3:0-9"))
+        ttk.Entry(frame, textvariable=points_var, width=40).grid(row=0, column=1, columnspan=3, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(frame, text="从站:功能码:起始[-结束]，逗号分隔，如 1:3:0-9,2:4:100-103",
+                  foreground="gray").grid(row=1, column=0, columnspan=4, padx=5, sticky=tk.W)
+        
+        ttk.Label(frame, text="周期(秒):").grid(row=2, column=0, padx=5, pady=5, sticky=tk.W)
+        interval_var = tk.StringVar(value="1.0")
+        ttk.Entry(frame, textvariable=interval_var, width=8).grid(row=2, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Label(frame, text="超时(秒):").grid(row=2, column=2, padx=5, pady=5, sticky=tk.W)
+        timeout_var = tk.StringVar(value="0.2")
+        ttk.Entry(frame, textvariable=timeout_var, width=8).grid(row=2, column=3, padx=5, pady=5, sticky=tk.W)
+        
+        stats_var = tk.StringVar(value="未启动")
+        ttk.Label(frame, textvariable=stats_var, justify=tk.LEFT).grid(row=3, column=0, columnspan=4, padx=5, pady=10, sticky=tk.W)
+        
+        def start():
+            if not self.terminal.ser or not self.terminal.ser.is_open:
+                messagebox.showerror("错误", "请先连接串口", parent=dialog)
+                return
+            try:
+                points = parse_points(points_var.get())
+                interval = float(interval_var.get())
+                timeout = float(timeout_var.get())
+            except ValueError as e:
+                messagebox.showerror("参数错误", str(e), parent=dialog)
+                return
+            if not points:
+                messagebox.showerror("参数错误", "请输入轮询点", parent=dialog)
+                return
+            self.stop_modbus_poll()
+            self.modbus_points = points_var.get()
+            blocks = coalesce(points)
+            self.poller = ModbusPoller(self.terminal, blocks, interval, timeout, self.show_modbus_values)
+            self.poller.start()
+            self.update_status(f"Modbus轮询已启动：{len(points)} 个点合并为 {len(blocks)} 个读请求", "success")
+        
+        def stop():
+            self.stop_modbus_poll()
+        
+        button_frame = ttk.Frame(frame)
+        button_frame.grid(row=4, column=0, columnspan=4, pady=5)
+        ttk.Button(button_frame, text="启动", command=start).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="停止", command=stop).pack(side=tk.LEFT, padx=5)
+        
+        def refresh():
+            if not dialog.winfo_exists():
+                return
+            if self.poller:
+                stats_var.set(format_stats(self.poller.stats()))
+            dialog.after(500, refresh)
+        refresh()
+    
+    def show_modbus_values(self, slave, function, values, timestamp):
+        """轮询到的值（在轮询线程中调用）"""
+        text = " ".join(f"{address}={value}" for address, value in values.items())
+        self.update_display(f"[{format_time(timestamp)}] 从站{slave} 功能码{function}: {text}\n", is_received=True)
+    
+    def stop_modbus_poll(self):
+        if self.poller:
+            self.poller.stop()
+            self.update_status("Modbus轮询已停止\n" + format_stats(self.poller.stats()), "info")
+            self.poller = None
+    
+    def toggle_sequence(self):
+        """选择序列文件开始发送，发送中再次点击则停止"""
+        if self.sequence_sender and self.sequence_sender.running:
+            self.stop_sequence()
+            return
+        if not self.terminal.ser or not self.terminal.ser.is_open:
+            messagebox.showerror("错误", "请先连接串口")
+            return
+        path = filedialog.askopenfilename(title="选择序列文件",
+                                          filetypes=[("序列文件", "*.txt"), ("所有文件", "*.*")])
+        if not path:
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                steps = parse_sequence(f.read())
+        except (OSError, ValueError) as e:
+            messagebox.showerror("序列错误", str(e))
+            return
+        self.sequence_sender = SequenceSender(self.terminal, steps, done_callback=self.sequence_done)
+        self.sequence_sender.start()
+        self.sequence_btn.config(text="停止序列")
+        self.update_status(f"正在发送序列：{os.path.basename(path)}", "info")
+        self.check_sequence()
+    
+    def sequence_done(self, stats):
+        """序列发送结束（在发送线程中调用）"""
+        self.update_display(f"[{time.strftime('%H:%M:%S')}] 序列发送结束：{format_sequence_stats(stats)}\n")
+    
+    def check_sequence(self):
+        """发送线程结束后恢复按钮"""
+        if self.sequence_sender and self.sequence_sender.running:
+            self.after(200, self.check_sequence)
+        else:
+            self.sequence_btn.config(text="发送序列")
+    
+    def stop_sequence(self):
+        if self.sequence_sender:
+            self.sequence_sender.stop()
+            self.sequence_sender = None
+    
+    def export_log(self):
+        """把选择的二进制日志导出为同名的十六进制文本（.log）"""
+        path = filedialog.askopenfilename(initialdir=self.terminal.log_dir, title="选择要导出的日志",
+                                          filetypes=[("RS485日志", "*.bin"), ("所有文件", "*.*")])
+        if not path:
+            return
+        out_path = os.path.splitext(path)[0] + ".log"
+        try:
+            with open(out_path, 'w', encoding='utf-8') as out:
+                count = export_hex(path, out)
+        except (OSError, ValueError) as e:
+            messagebox.showerror("导出失败", str(e))
+            return
+        self.update_status(f"已导出 {count} 条记录到 {out_path}", "success")
+    
     def update_display(self, text, is_received=False, is_error=False):
-        """更新数据显示区域内容（仅显示收发数据）"""
-        self.display_text.config(state=tk.NORMAL)
-        
-        # 根据数据类型添加颜色标签
+        """放入显示队列（线程安全，接收线程直接调用），由drain_display在主循环中显示"""
         if is_received:
-            self.display_text.insert(tk.END, text, "received")
+            tag = "received"
         elif is_error:
+            tag = "error"
+        else:
+            tag = "sent"
+        try:
+            self.display_queue.put_nowait((text, tag))
+        except queue.Full:
+            self.display_dropped += 1
+    
+    def drain_display(self):
+        """定时从显示队列取出一批内容，一次insert显示"""
+        items = []
+        try:
+            while len(items) < self.DISPLAY_BATCH:
+                items.append(self.display_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if items:
             # 错误信息显示到状态栏，不显示在数据区
-            self.update_status(text, "error")
-            self.display_text.config(state=tk.DISABLED)
+            for text, tag in items:
+                if tag == "error":
+                    self.update_status(text, "error")
+            items = [item for item in items if item[1] != "error"]
+            if self.display_paused:
+                self.paused_items.extend(items)
+            else:
+                self.render_display(items)
+        
+        # 队列积压时立即再取一次，否则按固定间隔刷新
+        delay = 1 if self.display_queue.qsize() >= self.DISPLAY_BATCH else self.DISPLAY_INTERVAL
+        self.after(delay, self.drain_display)
+    
+    def render_display(self, items):
+        """把一批(文本, 标签)一次性插入数据显示区，并裁剪超出上限的旧行"""
+        if not items:
             return
-        else:
-            self.display_text.insert(tk.END, text, "sent")
+        # 只显示最新的MAX_DISPLAY_LINES条，更早的插入后也会被裁掉
+        items = items[-self.MAX_DISPLAY_LINES:]
+        args = []
+        for text, tag in items:
+            args.extend((text, tag))
+        self.display_text.config(state=tk.NORMAL)
+        self.display_text.insert(tk.END, *args)
+        lines = int(self.display_text.index('end-1c').split('.')[0])
+        if lines > self.MAX_DISPLAY_LINES:
+            self.display_text.delete('1.0', f"{lines - self.MAX_DISPLAY_LINES + 1}.0")
         
         # 自动滚动到底部
         self.display_text.see(tk.END)
         self.display_text.config(state=tk.DISABLED)
     
+    def toggle_pause(self):
+        """暂停/恢复显示；恢复时显示暂停期间最新的内容"""
+        self.display_paused = self.pause_var.get()
+        if self.display_paused:
+            self.update_status("显示已暂停（继续接收和记录日志）", "info")
+        else:
+            items = list(self.paused_items)
+            self.paused_items.clear()
+            self.render_display(items)
+            msg = f"显示已恢复，暂停期间 {len(items)} 条"
+            if self.display_dropped:
+                msg += f"，显示队列溢出丢弃 {self.display_dropped} 条"
+            self.update_status(msg, "info")
+    
     def update_status(self, text, msg_type="info"):
         """更新状态显示区域
         msg_type: info, success, error, warning
@@ -596,6 +618,7 @@ class RS485GUITerminal(tk.Tk):
         self.display_text.config(state=tk.NORMAL)
         self.display_text.delete(1.0, tk.END)
         self.display_text.config(state=tk.DISABLED)
+        self.paused_items.clear()
         self.update_status("数据显示已清除", "info")
     
     def send_data(self):
@@ -607,35 +630,27 @@ class RS485GUITerminal(tk.Tk):
         # 清空输入框
         #self.send_entry.delete(1.0, tk.END)
         
-        result = self.terminal.send_data(data)
+        ok, result = self.terminal.send_data(data)
         
         # 如果发送失败，显示错误信息
-        if isinstance(result, tuple) and not result[0]:
-            self.update_status(f"发送失败: {result[1]}", "error")
+        if not ok:
+            self.update_status(f"发送失败: {result}", "error")
             return
         
-        # 如果回显模式开启，显示发送的数据
+        # 如果回显模式开启，显示发送的数据（用发送时解析好的bytes，不再重新解析输入）
         if self.terminal.echo:
-            if self.terminal.hex_mode:
-                data_clean = data.replace(' ', '')
-                if len(data_clean) % 2 != 0:
-                    data_clean += '0'
-                try:
-                    send_bytes = bytes.fromhex(data_clean)
-                    hex_str = ' '.join(f'{b:02X}' for b in send_bytes)
-                    self.update_display(f"[{time.strftime('%H:%M:%S')}] 发送: [{len(send_bytes)} bytes] {hex_str}\n")
-                    self.update_status(f"发送 {len(send_bytes)} 字节数据", "success")
-                except ValueError as e:
-                    self.update_status(f"十六进制格式错误: {str(e)}", "error")
-            else:
-                self.update_display(f"[{time.strftime('%H:%M:%S')}] 发送: {data}\n")
-                self.update_status(f"发送 {len(data.encode('utf-8'))} 字节数据", "success")
+            self.update_display(self.terminal.format_frame(result, time.time(), "发送"))
+            self.update_status(f"发送 {len(result)} 字节数据", "success")
     
     def on_closing(self):
         """窗口关闭时的处理"""
+        self.stop_modbus_poll()
+        self.stop_sequence()
         if self.terminal.ser and self.terminal.ser.is_open:
             self.terminal.close()
             self.update_status("程序正在关闭...", "info")
+        else:
+            self.terminal.close_log()
         self.destroy()
 
 